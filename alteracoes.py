@@ -0,0 +1,98 @@
+"""
+Sistema de Bioprospecção de Cogumelos Nativos
+Registro de alterações para sincronização incremental (/api/changes).
+Triggers mantêm em `alteracao` uma linha por registro alterado, com o id
+(AUTOINCREMENT) da última alteração; exclusões ficam como marcas
+(excluido = 1). O cursor do cliente é o maior id já recebido.
+"""
+
+from datetime import date, datetime
+
+from sqlalchemy import text
+
+# Tabelas sincronizadas com os clientes de campo
+TABELAS_SINCRONIZADAS = ('coleta', 'imagem_coleta', 'isolado', 'imagem_isolado', 'repique', 'experimento')
+
+# Alterações por resposta (padrão e máximo)
+LIMITE_PADRAO = 500
+LIMITE_MAXIMO = 5000
+
+
+def _ddl(tabela):
+    # INSERT OR REPLACE remove a alteração anterior do registro (UNIQUE) e
+    # grava uma nova com id maior: o registro sai uma vez só por sincronização
+    registrar = ('INSERT OR REPLACE INTO alteracao (tabela, registro_id, excluido) '
+                 "VALUES ('{tabela}', {linha}.id, {excluido})")
+    return [
+        f'CREATE TRIGGER IF NOT EXISTS {tabela}_alt_ai AFTER INSERT ON {tabela} BEGIN '
+        f"{registrar.format(tabela=tabela, linha='new', excluido=0)}; END",
+        f'CREATE TRIGGER IF NOT EXISTS {tabela}_alt_au AFTER UPDATE ON {tabela} BEGIN '
+        f"{registrar.format(tabela=tabela, linha='new', excluido=0)}; END",
+        # Também dispara para as linhas removidas pelo ON DELETE CASCADE
+        f'CREATE TRIGGER IF NOT EXISTS {tabela}_alt_ad AFTER DELETE ON {tabela} BEGIN '
+        f"{registrar.format(tabela=tabela, linha='old', excluido=1)}; END",
+    ]
+
+
+def criar_triggers_alteracoes(conexao, reconstruir=True):
+    """Cria os triggers (idempotente); na primeira vez registra as linhas existentes"""
+    if conexao.dialect.name != 'sqlite':
+        return
+    existiam = conexao.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'coleta_alt_ai'")).first() is not None
+    for tabela in TABELAS_SINCRONIZADAS:
+        for comando in _ddl(tabela):
+            conexao.execute(text(comando))
+    if reconstruir and not existiam:
+        registrar_existentes(conexao)
+
+
+def registrar_existentes(conexao):
+    """Registra todas as linhas atuais: base para a primeira sincronização"""
+    for tabela in TABELAS_SINCRONIZADAS:
+        conexao.execute(text(
+            'INSERT OR REPLACE INTO alteracao (tabela, registro_id, excluido) '
+            f"SELECT '{tabela}', id, 0 FROM {tabela} ORDER BY id"))
+
+
+def _valor(valor):
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    return valor
+
+
+def alteracoes_desde(conexao, metadata, cursor, limite):
+    """
+    Até `limite` alterações depois de `cursor`, agrupadas por tabela:
+    {tabela: {'colunas': [...], 'linhas': [[...]], 'excluidos': [ids]}}.
+    Retorna (alterações, novo cursor, há mais). Os registros são lidos na
+    mesma transação que o registro de alterações.
+    """
+    linhas = conexao.execute(
+        text('SELECT id, tabela, registro_id, excluido FROM alteracao '
+             'WHERE id > :cursor ORDER BY id LIMIT :limite'),
+        {'cursor': cursor, 'limite': limite + 1}).all()
+    ha_mais = len(linhas) > limite
+    linhas = linhas[:limite]
+
+    gravados, excluidos = {}, {}
+    for _, tabela, registro_id, excluido in linhas:
+        (excluidos if excluido else gravados).setdefault(tabela, []).append(registro_id)
+
+    resultado = {}
+    for nome in TABELAS_SINCRONIZADAS:
+        if nome not in gravados and nome not in excluidos:
+            continue
+        tabela = metadata.tables[nome]
+        colunas = [coluna.name for coluna in tabela.columns]
+        registros = []
+        ids = gravados.get(nome, [])
+        for inicio in range(0, len(ids), 500):
+            consulta = tabela.select().where(tabela.c.id.in_(ids[inicio:inicio + 500])).order_by(tabela.c.id)
+            registros.extend([_valor(valor) for valor in linha] for linha in conexao.execute(consulta))
+        resultado[nome] = {'colunas': colunas, 'linhas': registros,
+                           'excluidos': excluidos.get(nome, [])}
+
+    novo_cursor = linhas[-1].id if linhas else cursor
+    return resultado, novo_cursor, ha_mais
+
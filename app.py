@@ -1,48 +1,124 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_from_directory
+from flask import (Flask, render_template, request, redirect, url_for, flash, jsonify, send_from_directory, send_file,
+                   abort, make_response, stream_with_context)
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
-from datetime import datetime
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, date, timedelta
 import os
+import signal
+from concurrent.futures import ProcessPoolExecutor
+from functools import wraps
+import click
 from werkzeug.utils import secure_filename
-from PIL import Image
+from PIL import Image, UnidentifiedImageError
 import io
+from config import get_config, configurar_sqlite, criar_engine_leitura, pragmas_sqlite, SessaoRoteada
+from imagens import RENDICOES, obter_rendicao, remover_rendicoes
+from busca_indice import criar_indice, reconstruir_indice, subconsulta_busca, subconsulta_sugestao
+from paginacao import paginar, total_em_cache, invalidar_totais, codificar_cursor
+from exportacao import FORMATOS, selecionar_campos, resposta_exportacao
+from compactacao import zip_em_stream
+from darwin_core import entradas_dwca
+from pacote_imagens import entradas_imagens
+from metadados_exif import COLUNAS_EXIF, ler_exif
+from importacao import MAXIMO_ERROS, em_lotes, formato_do_arquivo, ler_planilha
+from planos_consulta import capturar_consultas, verificar
+from armazenamento import (salvar_upload, descartar_nao_registrados,
+                           liberar_arquivos, remover_do_disco, limpar_temporarios,
+                           criar_triggers_referencias, salvar_stream, TABELAS_IMAGEM, TEMPORARIO_EXPIRACAO)
+from upload_retomavel import (TAMANHO_PARTE_MINIMO, concluir_parcial, criar_parcial, descartar_parcial,
+                              gravar_parte, novo_identificador, tamanho_da_parte, total_partes)
+from tarefas import ESTADOS, Trabalhador
+import estatisticas
+from cascata import descendentes_da_sessao
+from facetas import Faceta, aplicar_filtros, contar_facetas, invalidar_facetas
+from cache import CacheLRU
+from cache_paginas import CachePaginas, chaves_alteradas, chaves_em_cascata, registrar_carga
+import condicional
+from alteracoes import (LIMITE_MAXIMO, LIMITE_PADRAO, TABELAS_SINCRONIZADAS, alteracoes_desde,
+                        criar_triggers_alteracoes)
+from geo import (RAIO_MAXIMO_KM, ZOOM_MAXIMO, Regiao, agrupar, criar_indice_geo, interpretar_coordenadas,
+                 pontos, reconstruir_indice_geo)
 
 app = Flask(__name__)
-app.config['SECRET_KEY'] = 'sua_chave_secreta_aqui'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///cogumelos.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['UPLOAD_FOLDER'] = 'uploads'
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+app.config.from_object(get_config())
 
-# Criar pasta de uploads se não existir
-if not os.path.exists(app.config['UPLOAD_FOLDER']):
-    os.makedirs(app.config['UPLOAD_FOLDER'])
+# Criar pastas de uploads e renditions se não existirem
+for pasta in (app.config['UPLOAD_FOLDER'], app.config['RENDITION_FOLDER']):
+    if not os.path.exists(pasta):
+        os.makedirs(pasta)
 
-db = SQLAlchemy(app)
+db = SQLAlchemy(app, session_options={'class_': SessaoRoteada})
 migrate = Migrate(app, db)
 
+# PRAGMAs em toda conexão e pool separado, somente leitura, para GET/HEAD
+with app.app_context():
+    configurar_sqlite(db.engine, app.config)
+    app.extensions['engine_leitura'] = criar_engine_leitura(db.engine, app.config)
+
+# Arquivo enviado, endereçado pelo SHA-256 do conteúdo. Várias imagens podem
+# apontar para o mesmo arquivo; `referencias` é mantido por triggers.
+class ArquivoUpload(db.Model):
+    caminho = db.Column(db.String(255), primary_key=True)
+    sha256 = db.Column(db.String(64))
+    tamanho = db.Column(db.Integer)
+    referencias = db.Column(db.Integer, nullable=False, default=0)
+    data_criacao = db.Column(db.DateTime, default=datetime.utcnow)
+
 # Modelo para múltiplas imagens por coleta
 class ImagemColeta(db.Model):
+    __table_args__ = (
+        db.Index('ix_imagem_coleta_coleta_id', 'coleta_id', 'id'),
+        db.Index('ix_imagem_coleta_exif_data_hora', 'exif_data_hora'),
+        db.Index('ix_imagem_coleta_exif_gps', 'id', sqlite_where=db.text('exif_latitude IS NOT NULL')),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
-    coleta_id = db.Column(db.Integer, db.ForeignKey('coleta.id'), nullable=False)
+    coleta_id = db.Column(db.Integer, db.ForeignKey('coleta.id', ondelete='CASCADE'), nullable=False)
     nome_arquivo = db.Column(db.String(255), nullable=False)
+    nome_original = db.Column(db.String(255))
     descricao = db.Column(db.String(500))
     data_upload = db.Column(db.DateTime, default=datetime.utcnow)
+    # Metadados EXIF lidos em segundo plano pela tarefa 'exif' (ver metadados_exif.py)
+    exif_lido = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    exif_data_hora = db.Column(db.DateTime)
+    exif_latitude = db.Column(db.Float)
+    exif_longitude = db.Column(db.Float)
+    exif_camera = db.Column(db.String(100))
     
     # Relacionamento com Coleta
     coleta = db.relationship('Coleta', back_populates='imagens')
 
 
 class ImagemIsolado(db.Model):
+    __table_args__ = (
+        db.Index('ix_imagem_isolado_isolado_id', 'isolado_id', 'id'),
+        db.Index('ix_imagem_isolado_exif_data_hora', 'exif_data_hora'),
+        db.Index('ix_imagem_isolado_exif_gps', 'id', sqlite_where=db.text('exif_latitude IS NOT NULL')),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
-    isolado_id = db.Column(db.Integer, db.ForeignKey('isolado.id'), nullable=False)
+    isolado_id = db.Column(db.Integer, db.ForeignKey('isolado.id', ondelete='CASCADE'), nullable=False)
     nome_arquivo = db.Column(db.String(255), nullable=False)
+    nome_original = db.Column(db.String(255))
     descricao = db.Column(db.String(500))
     data_upload = db.Column(db.DateTime, default=datetime.utcnow)
+    # Metadados EXIF lidos em segundo plano pela tarefa 'exif' (ver metadados_exif.py)
+    exif_lido = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    exif_data_hora = db.Column(db.DateTime)
+    exif_latitude = db.Column(db.Float)
+    exif_longitude = db.Column(db.Float)
+    exif_camera = db.Column(db.String(100))
 
     isolado = db.relationship('Isolado', back_populates='imagens')
 
 class Coleta(db.Model):
+    __table_args__ = (
+        db.Index('ix_coleta_data_cadastro', 'data_cadastro', 'id'),
+        db.Index('ix_coleta_substrato', 'substrato', 'data_cadastro', 'id'),
+        db.Index('ix_coleta_coletor', 'coletor'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     codigo = db.Column(db.String(50), unique=True, nullable=False)
     nome_cientifico = db.Column(db.String(200))
@@ -50,20 +126,44 @@ class Coleta(db.Model):
     data_coleta = db.Column(db.Date, nullable=False)
     local_coleta = db.Column(db.String(500))
     coordenadas = db.Column(db.String(100))
+    # Extraídas de `coordenadas`; indexadas na tabela R*Tree coleta_geo
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
     substrato = db.Column(db.String(200))
     coletor = db.Column(db.String(200))
     observacoes = db.Column(db.Text)
     data_cadastro = db.Column(db.DateTime, default=datetime.utcnow)
     
-    # Relacionamentos
-    isolados = db.relationship('Isolado', backref='coleta', lazy=True, cascade='all, delete-orphan')
-    experimentos = db.relationship('Experimento', backref='coleta', lazy=True, cascade='all, delete-orphan')
-    imagens = db.relationship('ImagemColeta', back_populates='coleta', lazy=True, cascade='all, delete-orphan')
+    # Relacionamentos (os filhos são excluídos pelo banco: ON DELETE CASCADE)
+    isolados = db.relationship('Isolado', backref='coleta', lazy=True,
+                               cascade='all, delete-orphan', passive_deletes=True)
+    experimentos = db.relationship('Experimento', backref='coleta', lazy=True,
+                                   cascade='all, delete-orphan', passive_deletes=True)
+    imagens = db.relationship('ImagemColeta', back_populates='coleta', lazy=True,
+                              cascade='all, delete-orphan', passive_deletes=True)
+
+    # Preenchidos apenas nas listagens (ver opcoes_listagem_coletas)
+    total_imagens = db.query_expression()
+    total_isolados = db.query_expression()
+    total_experimentos = db.query_expression()
+    primeira_imagem = db.query_expression()
+
+    @db.validates('coordenadas')
+    def _interpretar_coordenadas(self, chave, valor):
+        self.latitude, self.longitude = interpretar_coordenadas(valor) or (None, None)
+        return valor
 
 class Isolado(db.Model):
+    __table_args__ = (
+        db.Index('ix_isolado_data_cadastro', 'data_cadastro', 'id'),
+        db.Index('ix_isolado_coleta_id', 'coleta_id'),
+        db.Index('ix_isolado_meio_cultura', 'meio_cultura'),
+        db.Index('ix_isolado_origem_tipo', 'origem_tipo'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     codigo = db.Column(db.String(50), unique=True, nullable=False)
-    coleta_id = db.Column(db.Integer, db.ForeignKey('coleta.id'), nullable=True)
+    coleta_id = db.Column(db.Integer, db.ForeignKey('coleta.id', ondelete='CASCADE'), nullable=True)
     origem_tipo = db.Column(db.String(20), nullable=False, default='coleta')
     origem_instituicao = db.Column(db.String(255))
     especie_nome_cientifico = db.Column(db.String(200))
@@ -73,14 +173,25 @@ class Isolado(db.Model):
     observacoes = db.Column(db.Text)
     data_cadastro = db.Column(db.DateTime, default=datetime.utcnow)
     
-    # Relacionamentos
-    repiques = db.relationship('Repique', backref='isolado', lazy=True, cascade='all, delete-orphan')
-    experimentos = db.relationship('Experimento', backref='isolado', lazy=True, cascade='all, delete-orphan')
-    imagens = db.relationship('ImagemIsolado', back_populates='isolado', lazy=True, cascade='all, delete-orphan')
+    # Relacionamentos (os filhos são excluídos pelo banco: ON DELETE CASCADE)
+    repiques = db.relationship('Repique', backref='isolado', lazy=True,
+                               cascade='all, delete-orphan', passive_deletes=True)
+    experimentos = db.relationship('Experimento', backref='isolado', lazy=True,
+                                   cascade='all, delete-orphan', passive_deletes=True)
+    imagens = db.relationship('ImagemIsolado', back_populates='isolado', lazy=True,
+                              cascade='all, delete-orphan', passive_deletes=True)
+
+    # Preenchidos apenas nas listagens (ver opcoes_listagem_isolados)
+    total_repiques = db.query_expression()
+    total_experimentos = db.query_expression()
 
 class Repique(db.Model):
+    __table_args__ = (
+        db.Index('ix_repique_isolado_id', 'isolado_id', 'data_repique'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
-    isolado_id = db.Column(db.Integer, db.ForeignKey('isolado.id'), nullable=False)
+    isolado_id = db.Column(db.Integer, db.ForeignKey('isolado.id', ondelete='CASCADE'), nullable=False)
     data_repique = db.Column(db.Date, nullable=False)
     numero_placas = db.Column(db.Integer, default=1)
     meio_cultura = db.Column(db.String(100))
@@ -88,10 +199,16 @@ class Repique(db.Model):
     data_cadastro = db.Column(db.DateTime, default=datetime.utcnow)
 
 class Experimento(db.Model):
+    __table_args__ = (
+        db.Index('ix_experimento_data_cadastro', 'data_cadastro', 'id'),
+        db.Index('ix_experimento_coleta_id', 'coleta_id'),
+        db.Index('ix_experimento_isolado_id', 'isolado_id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     titulo = db.Column(db.String(200), nullable=False)
-    coleta_id = db.Column(db.Integer, db.ForeignKey('coleta.id'))
-    isolado_id = db.Column(db.Integer, db.ForeignKey('isolado.id'))
+    coleta_id = db.Column(db.Integer, db.ForeignKey('coleta.id', ondelete='CASCADE'))
+    isolado_id = db.Column(db.Integer, db.ForeignKey('isolado.id', ondelete='CASCADE'))
     data_inicio = db.Column(db.Date)
     data_fim = db.Column(db.Date)
     objetivo = db.Column(db.Text)
@@ -102,15 +219,391 @@ class Experimento(db.Model):
     status = db.Column(db.String(50), default='Em andamento')
     data_cadastro = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # Preenchido apenas nas listagens (ver opcoes_listagem_experimentos)
+    resumo_objetivo = db.query_expression()
+
+# Totais e séries mensais agregados, atualizados a cada flush (ver estatisticas.py)
+class Estatistica(db.Model):
+    __table_args__ = (
+        db.Index('ix_estatistica_metrica', 'metrica', 'periodo'),
+    )
+
+    periodo = db.Column(db.String(7), primary_key=True, default='')  # AAAA-MM ou '' (global)
+    metrica = db.Column(db.String(50), primary_key=True)
+    dimensao = db.Column(db.String(200), primary_key=True, default='')
+    valor = db.Column(db.Integer, nullable=False, default=0)
+
+# Versão de cada tabela, incrementada na transação de toda escrita pela
+# sessão; base das ETags da API (ver condicional.py)
+class VersaoTabela(db.Model):
+    tabela = db.Column(db.String(50), primary_key=True)
+    versao = db.Column(db.Integer, nullable=False, default=0)
+
+# Última alteração de cada registro sincronizado com os clientes de campo,
+# mantida por triggers (ver alteracoes.py e /api/changes)
+class Alteracao(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint('tabela', 'registro_id', name='uq_alteracao_registro'),
+        {'sqlite_autoincrement': True},
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    tabela = db.Column(db.String(50), nullable=False)
+    registro_id = db.Column(db.Integer, nullable=False)
+    excluido = db.Column(db.Boolean, nullable=False, default=False)
+
+# Uploads retomáveis em andamento e as partes já recebidas (ver upload_retomavel.py)
+class SessaoUpload(db.Model):
+    id = db.Column(db.String(32), primary_key=True)
+    nome_original = db.Column(db.String(255), nullable=False)
+    tamanho = db.Column(db.BigInteger, nullable=False)
+    tamanho_parte = db.Column(db.Integer, nullable=False)
+    sha256 = db.Column(db.String(64))
+    data_criacao = db.Column(db.DateTime, default=datetime.utcnow)
+    data_atualizacao = db.Column(db.DateTime, default=datetime.utcnow)
+
+class ParteUpload(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint('sessao_id', 'indice', name='uq_parte_upload_indice'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    sessao_id = db.Column(db.String(32), db.ForeignKey('sessao_upload.id', ondelete='CASCADE'), nullable=False)
+    indice = db.Column(db.Integer, nullable=False)
+    sha256 = db.Column(db.String(64), nullable=False)
+
+# Fila de tarefas em segundo plano (ver tarefas.py e `flask processar-tarefas`)
+class Tarefa(db.Model):
+    __table_args__ = (
+        db.Index('ix_tarefa_estado', 'estado', 'disponivel_em', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    tipo = db.Column(db.String(50), nullable=False)
+    parametros = db.Column(db.JSON)
+    estado = db.Column(db.String(20), nullable=False, default='pendente')
+    tentativas = db.Column(db.Integer, nullable=False, default=0)
+    max_tentativas = db.Column(db.Integer, nullable=False, default=3)
+    erro = db.Column(db.Text)
+    resultado = db.Column(db.JSON)
+    disponivel_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    data_cadastro = db.Column(db.DateTime, default=datetime.utcnow)
+    data_inicio = db.Column(db.DateTime)
+    data_fim = db.Column(db.DateTime)
+
+def enfileirar(tipo, **parametros):
+    """Adiciona uma tarefa na transação atual; o trabalhador a vê após o commit"""
+    tarefa = Tarefa(tipo=tipo, parametros=parametros,
+                    max_tentativas=app.config['JOB_MAX_ATTEMPTS'])
+    db.session.add(tarefa)
+    return tarefa
+
+# Facetas das listagens: contagem de valores considerando os demais filtros
+FACETAS_COLETA = [
+    Faceta('substrato', Coleta.substrato, 'Substrato'),
+    Faceta('coletor', Coleta.coletor, 'Coletor', lambda coluna, valor: coluna.contains(valor)),
+]
+FACETAS_ISOLADO = [
+    Faceta('meio_cultura', Isolado.meio_cultura, 'Meio de cultura'),
+    Faceta('origem_tipo', Isolado.origem_tipo, 'Origem'),
+]
+
+# Projeções das listagens: contagens e primeira imagem calculadas por
+# subconsultas correlacionadas na mesma consulta, sem carregar os filhos.
+# Colunas de texto longo ficam de fora (só as páginas de detalhe as leem).
+def _contar(coluna_fk, coluna_pai):
+    return db.select(db.func.count()).where(coluna_fk == coluna_pai).scalar_subquery()
+
+def _sem_textos(*colunas):
+    return [db.defer(coluna) for coluna in colunas]
+
+def _resumo(coluna, tamanho):
+    """Início do texto cortado no banco; um caractere a mais indica que há continuação"""
+    return db.func.substr(coluna, 1, tamanho + 1, type_=db.Text)
+
+TEXTOS_COLETA = (Coleta.observacoes,)
+TEXTOS_ISOLADO = (Isolado.observacoes,)
+TEXTOS_EXPERIMENTO = (Experimento.objetivo, Experimento.materiais_metodos, Experimento.resultados,
+                      Experimento.discussao, Experimento.conclusoes)
+
+def opcoes_listagem_coletas():
+    primeira_imagem = (db.select(ImagemColeta.nome_arquivo)
+                       .where(ImagemColeta.coleta_id == Coleta.id)
+                       .order_by(ImagemColeta.id)
+                       .limit(1)
+                       .scalar_subquery())
+    return [
+        *_sem_textos(*TEXTOS_COLETA),
+        db.with_expression(Coleta.total_imagens, _contar(ImagemColeta.coleta_id, Coleta.id)),
+        db.with_expression(Coleta.total_isolados, _contar(Isolado.coleta_id, Coleta.id)),
+        db.with_expression(Coleta.total_experimentos, _contar(Experimento.coleta_id, Coleta.id)),
+        db.with_expression(Coleta.primeira_imagem, primeira_imagem),
+    ]
+
+def opcoes_resumo_isolados():
+    """Isolados com a coleta de origem, sem os textos longos de ambos"""
+    return [
+        db.joinedload(Isolado.coleta).options(*_sem_textos(*TEXTOS_COLETA)),
+        *_sem_textos(*TEXTOS_ISOLADO),
+    ]
+
+def opcoes_listagem_isolados():
+    return [
+        *opcoes_resumo_isolados(),
+        db.with_expression(Isolado.total_repiques, _contar(Repique.isolado_id, Isolado.id)),
+        db.with_expression(Isolado.total_experimentos, _contar(Experimento.isolado_id, Isolado.id)),
+    ]
+
+def opcoes_listagem_experimentos():
+    return [
+        db.joinedload(Experimento.coleta).options(*_sem_textos(*TEXTOS_COLETA)),
+        db.joinedload(Experimento.isolado).options(*_sem_textos(*TEXTOS_ISOLADO)),
+        *_sem_textos(*TEXTOS_EXPERIMENTO),
+        db.with_expression(Experimento.resumo_objetivo, _resumo(Experimento.objetivo, 100)),
+    ]
+
+# Índice de busca textual criado junto com as tabelas (db.create_all)
+@db.event.listens_for(db.metadata, 'after_create')
+def _criar_indice_busca(target, connection, **kw):
+    criar_indice(connection)
+    criar_indice_geo(connection)
+    criar_triggers_referencias(connection)
+    criar_triggers_alteracoes(connection)
+
+# Totais em cache das listagens ficam inválidos a cada escrita; os totais
+# agregados (tabela estatistica) são atualizados na mesma transação
+@db.event.listens_for(db.session, 'before_flush')
+def _preparar_estatisticas(session, flush_context, instances):
+    cascata = descendentes_da_sessao(session)
+    estatisticas.preparar(session, cascata)
+    _registrar_cascata(session, cascata)
+    gravadas = {type(objeto).__tablename__ for objeto in session.new | session.dirty | session.deleted}
+    _registrar_versoes_banco(session, condicional.avancar_versoes(session.connection(), gravadas | set(cascata)))
+
+def _registrar_versoes_banco(session, novas):
+    """Versões de versao_tabela produzidas pela transação (ver Versoes.registrar_locais)"""
+    session.info.setdefault('versoes_banco', []).extend(novas.items())
+
+def _registrar_cascata(session, cascata):
+    """
+    Linhas que o banco remove em cascata também alteram suas tabelas; os
+    arquivos das imagens removidas (em cascata ou pela sessão) ficam em
+    session.info['arquivos_excluidos'] para _remover_arquivos_liberados
+    """
+    session.info.setdefault('tabelas_alteradas', set()).update(cascata)
+    session.info.setdefault('versoes_alteradas', set()).update(chaves_em_cascata(cascata))
+    caminhos = {objeto.nome_arquivo for objeto in session.deleted
+                if isinstance(objeto, (ImagemColeta, ImagemIsolado))}
+    for nome in TABELAS_IMAGEM:
+        if nome in cascata:
+            tabela, condicao = cascata[nome]
+            caminhos.update(session.execute(
+                db.select(tabela.c.nome_arquivo).where(condicao).distinct()).scalars())
+    if caminhos:
+        session.info.setdefault('arquivos_excluidos', set()).update(caminhos)
+
+@db.event.listens_for(db.session, 'after_flush')
+def _invalidar_totais(session, flush_context):
+    if session.new or session.deleted:
+        invalidar_totais()
+    estatisticas.aplicar(session)
+    gravados = session.new | session.dirty | session.deleted
+    session.info.setdefault('tabelas_alteradas', set()).update(
+        type(objeto).__tablename__ for objeto in gravados)
+    session.info.setdefault('versoes_alteradas', set()).update(chaves_alteradas(gravados))
+
+# Páginas renderizadas em cache, validadas pelas versões das tabelas e dos
+# registros exibidos (ver cache_paginas.py)
+paginas = CachePaginas(app.config['PAGE_CACHE_SIZE'], app.config['PAGE_CACHE_TTL'],
+                       lambda tabelas: condicional.versoes(db.session.connection(), tabelas))
+
+@db.event.listens_for(db.Model, 'load', propagate=True)
+def _registrar_carga(objeto, contexto):
+    registrar_carga(objeto)
+
+# Contagens das facetas e sugestões em cache são descartadas (e as versões das
+# páginas avançam) quando a escrita é confirmada; antes disso o pool de
+# leitura ainda veria os valores antigos
+@db.event.listens_for(db.session, 'after_commit')
+def _invalidar_caches(session):
+    alteradas = session.info.pop('tabelas_alteradas', None)
+    if alteradas:
+        invalidar_facetas(alteradas)
+        _cache_sugestoes.invalidar(alteradas)
+    versoes = session.info.pop('versoes_alteradas', None)
+    if versoes:
+        paginas.versoes.avancar(versoes)
+    versoes_banco = session.info.pop('versoes_banco', None)
+    if versoes_banco:
+        paginas.versoes.registrar_locais(versoes_banco)
+
+@db.event.listens_for(db.session, 'after_soft_rollback')
+def _descartar_tabelas_alteradas(session, previous_transaction):
+    session.info.pop('tabelas_alteradas', None)
+    session.info.pop('arquivos_excluidos', None)
+    session.info.pop('versoes_alteradas', None)
+    session.info.pop('versoes_banco', None)
+
+def _atualizacao_exif(tabela):
+    """UPDATE das colunas exif_* de uma imagem (parâmetros _id e _<coluna>)"""
+    return (tabela.update().where(tabela.c.id == db.bindparam('_id'))
+            .values(exif_lido=True, **{coluna: db.bindparam(f'_{coluna}') for coluna in COLUNAS_EXIF}))
+
+def _enfileirar_exif(imagens):
+    """Leitura do EXIF em segundo plano, uma tarefa por imagem (precisa dos ids: flush)"""
+    db.session.flush()
+    for imagem in imagens:
+        enfileirar('exif', nome_arquivo=imagem.nome_arquivo, tabela=imagem.__tablename__, id=imagem.id)
+
+def _gravar_exif(conexao, resultado, nome_arquivo, tabela, id):
+    """Tarefa 'exif' concluída (no trabalhador): grava as colunas na imagem"""
+    tabela = db.metadata.tables[tabela]
+    valores = {f'_{coluna}': valor for coluna, valor in resultado.items()}
+    if valores['_exif_data_hora']:
+        valores['_exif_data_hora'] = datetime.fromisoformat(valores['_exif_data_hora'])
+    if conexao.execute(_atualizacao_exif(tabela), {'_id': id, **valores}).rowcount:
+        condicional.avancar_versoes(conexao, [tabela.name])
+
+def _salvar_imagens(salvos, campo, modelo, descricao, **vinculo):
+    """
+    Grava os arquivos do campo `campo` do formulário no armazenamento por
+    conteúdo e adiciona uma imagem `modelo` para cada um. Os arquivos
+    gravados vão para `salvos` (para descarte em caso de rollback).
+    """
+    imagens = []
+    for file in request.files.getlist(campo):
+        if file and file.filename != '':
+            salvo = salvar_upload(db.session, file, app.config['UPLOAD_FOLDER'])
+            salvos.append(salvo)
+            imagem = modelo(nome_arquivo=salvo.caminho, nome_original=secure_filename(file.filename),
+                            descricao=descricao, **vinculo)
+            db.session.add(imagem)
+            imagens.append(imagem)
+            # Processamento das imagens fica para o trabalhador em segundo plano
+            if salvo.novo:
+                enfileirar('rendicoes', nome_arquivo=salvo.caminho)
+    if imagens:
+        _enfileirar_exif(imagens)
+
+def _remover_arquivos_liberados(caminhos=None):
+    """Apaga do disco (e das renditions) os arquivos que ficaram sem referência"""
+    liberados = liberar_arquivos(db.session, caminhos)
+    # Ainda na transação do DELETE (ver armazenamento.armazenar_temporario)
+    remover_do_disco(db.session, liberados, app.config['UPLOAD_FOLDER'],
+                     lambda caminho: remover_rendicoes(app.config['RENDITION_FOLDER'], caminho))
+    db.session.commit()
+    return liberados
+
+def _remover_arquivos_excluidos():
+    """Depois do commit: libera os arquivos das imagens excluídas na transação"""
+    return _remover_arquivos_liberados(db.session.info.pop('arquivos_excluidos', ()))
+
+def _pagina_por_cursor(query, modelo, chave_total, total=None):
+    """Página keyset de `query`; cursor inválido volta para a primeira página"""
+    cursor = request.args.get('cursor') or None
+    if total is None:
+        total = total_em_cache(chave_total, query, modelo)
+    try:
+        return paginar(query, modelo, cursor, 20, total)
+    except ValueError:
+        return paginar(query, modelo, None, 20, total)
+
+# Regras dos formulários de cadastro, compartilhadas com o cadastro em lote
+# (/api/lote). `dados` é o request.form ou um objeto JSON; ValueError
+# descreve o primeiro problema encontrado.
+def _campo_texto(dados, nome):
+    valor = dados.get(nome)
+    return None if valor is None else str(valor)
+
+def _campo_obrigatorio(dados, nome):
+    valor = _campo_texto(dados, nome)
+    if not valor or not valor.strip():
+        raise ValueError(f'Informe o campo {nome}.')
+    return valor
+
+def _campo_data(dados, nome):
+    return datetime.strptime(_campo_obrigatorio(dados, nome), '%Y-%m-%d').date()
+
+def _valores_coleta(dados):
+    return dict(
+        codigo=_campo_obrigatorio(dados, 'codigo'),
+        nome_cientifico=_campo_texto(dados, 'nome_cientifico'),
+        nome_popular=_campo_texto(dados, 'nome_popular'),
+        data_coleta=_campo_data(dados, 'data_coleta'),
+        local_coleta=_campo_texto(dados, 'local_coleta'),
+        coordenadas=_campo_texto(dados, 'coordenadas'),
+        substrato=_campo_texto(dados, 'substrato'),
+        coletor=_campo_texto(dados, 'coletor'),
+        observacoes=_campo_texto(dados, 'observacoes'),
+    )
+
+def _origem_isolado(dados, obter_coleta):
+    """
+    Origem do isolado: de uma coleta (a espécie vem da coleta) ou adquirido/
+    doado (instituição e espécie obrigatórias). `obter_coleta(id)` retorna a
+    Coleta ou None.
+    """
+    origem_tipo = dados.get('origem_tipo', 'coleta')
+    origem_instituicao = (_campo_texto(dados, 'origem_instituicao') or '').strip()
+    coleta_id_raw = dados.get('coleta_id')
+    especie_nome = (_campo_texto(dados, 'especie_nome_cientifico') or '').strip()
+
+    if origem_tipo not in ['coleta', 'adquirida', 'doada']:
+        origem_tipo = 'coleta'
+
+    if origem_tipo == 'coleta':
+        if not coleta_id_raw:
+            raise ValueError('Selecione a coleta de origem para isolados provenientes de coleta.')
+        coleta_id = int(coleta_id_raw)
+        coleta = obter_coleta(coleta_id)
+        if not coleta:
+            raise ValueError('Coleta selecionada não encontrada.')
+        especie_nome = (coleta.nome_cientifico or '').strip()
+        if not especie_nome:
+            raise ValueError('A coleta selecionada não possui nome científico cadastrado. Atualize a coleta antes de prosseguir.')
+        return dict(coleta_id=coleta_id, origem_tipo=origem_tipo, origem_instituicao=None,
+                    especie_nome_cientifico=especie_nome)
+
+    if not origem_instituicao:
+        raise ValueError('Informe a instituição responsável pela aquisição ou doação do isolado.')
+    if not especie_nome:
+        raise ValueError('Informe o nome científico da espécie para isolados adquiridos ou doados.')
+    return dict(coleta_id=None, origem_tipo=origem_tipo, origem_instituicao=origem_instituicao,
+                especie_nome_cientifico=especie_nome)
+
+def _valores_isolado(dados, obter_coleta):
+    temperatura = dados.get('temperatura_incubacao')
+    return dict(
+        codigo=_campo_obrigatorio(dados, 'codigo'),
+        data_isolamento=_campo_data(dados, 'data_isolamento'),
+        meio_cultura=_campo_texto(dados, 'meio_cultura'),
+        temperatura_incubacao=float(temperatura) if temperatura not in (None, '') else None,
+        observacoes=_campo_texto(dados, 'observacoes'),
+        **_origem_isolado(dados, obter_coleta),
+    )
+
+def _valores_repique(dados):
+    numero_placas = dados.get('numero_placas')
+    return dict(
+        data_repique=_campo_data(dados, 'data_repique'),
+        numero_placas=int(numero_placas) if numero_placas not in (None, '') else 1,
+        meio_cultura=_campo_texto(dados, 'meio_cultura'),
+        observacoes=_campo_texto(dados, 'observacoes'),
+    )
+
 # Rotas principais
 @app.route('/')
+@paginas.em_cache('coleta', 'isolado', 'experimento')
 def index():
-    total_coletas = Coleta.query.count()
-    total_isolados = Isolado.query.count()
-    total_experimentos = Experimento.query.count()
+    totais = estatisticas.valores(db.session.connection(), 'total')
+    total_coletas = totais.get('coleta', 0)
+    total_isolados = totais.get('isolado', 0)
+    total_experimentos = totais.get('experimento', 0)
     
-    coletas_recentes = Coleta.query.order_by(Coleta.data_cadastro.desc()).limit(5).all()
-    isolados_recentes = Isolado.query.order_by(Isolado.data_cadastro.desc()).limit(5).all()
+    coletas_recentes = (Coleta.query.options(*_sem_textos(*TEXTOS_COLETA))
+                        .order_by(Coleta.data_cadastro.desc()).limit(5).all())
+    isolados_recentes = (Isolado.query.options(*opcoes_resumo_isolados())
+                         .order_by(Isolado.data_cadastro.desc()).limit(5).all())
     
     return render_template('index.html', 
                          total_coletas=total_coletas,
@@ -120,48 +613,102 @@ def index():
                          isolados_recentes=isolados_recentes)
 
 # Rotas para Coletas
-@app.route('/coletas')
-def coletas():
-    page = request.args.get('page', 1, type=int)
-    search = request.args.get('search', '')
-    substrato = request.args.get('substrato', '')
-    coletor = request.args.get('coletor', '')
-    
-    query = Coleta.query
-    
+def _consulta_busca(modelo, search):
+    query = modelo.query
     if search:
-        query = query.filter(
-            db.or_(
-                Coleta.codigo.contains(search),
-                Coleta.nome_cientifico.contains(search),
-                Coleta.nome_popular.contains(search),
-                Coleta.local_coleta.contains(search)
-            )
-        )
-    
-    if substrato:
-        query = query.filter(Coleta.substrato == substrato)
+        encontrados = subconsulta_busca(modelo.__tablename__, search)
+        if encontrados is not None:
+            query = query.join(encontrados, encontrados.c.id == modelo.id)
+    return query
+
+def _consulta_filtrada(modelo, facetas):
+    """Registros da listagem com a busca e as facetas dos argumentos, sem as contagens"""
+    selecionados = {faceta.nome: request.args.get(faceta.nome, '') for faceta in facetas}
+    return aplicar_filtros(_consulta_busca(modelo, request.args.get('search', '')), facetas, selecionados)
+
+def _consulta_facetada(modelo, facetas):
+    """
+    Aplica a busca textual (`search`) e as facetas selecionadas nos argumentos.
+    Retorna (query filtrada, contagens das facetas, chave dos filtros, se há filtro).
+    """
+    search = request.args.get('search', '')
+    selecionados = {faceta.nome: request.args.get(faceta.nome, '') for faceta in facetas}
+    query = _consulta_busca(modelo, search)
     
-    if coletor:
-        query = query.filter(Coleta.coletor.contains(coletor))
+    contagens = contar_facetas(modelo.__tablename__, query, facetas, selecionados, (search,))
+    chave = (search, *sorted(selecionados.items()))
+    filtrado = bool(search or any(selecionados.values()))
+    return aplicar_filtros(query, facetas, selecionados), contagens, chave, filtrado
+
+@app.route('/coletas')
+@paginas.em_cache('coleta', 'imagem_coleta', 'isolado', 'experimento')
+def coletas():
+    query, facetas, chave, filtrado = _consulta_facetada(Coleta, FACETAS_COLETA)
     
-    coletas = query.order_by(Coleta.data_cadastro.desc()).paginate(
-        page=page, per_page=20, error_out=False)
+    # Sem filtros, o total vem da tabela de estatísticas
+    total = None
+    if not filtrado:
+        total = estatisticas.valores(db.session.connection(), 'total').get('coleta', 0)
+    coletas = _pagina_por_cursor(query.options(*opcoes_listagem_coletas()), Coleta,
+                                 ('coletas', *chave), total)
     
-    return render_template('coletas.html', coletas=coletas)
+    return render_template('coletas.html', coletas=coletas, facetas=facetas)
+
+AVISO_COORDENADAS = ('Coordenadas não reconhecidas (use, por exemplo, -25.4284, -49.2733); '
+                     'a coleta não aparecerá nas consultas por localização.')
+
+def _avisar_coordenadas(coleta):
+    if coleta.coordenadas and coleta.latitude is None:
+        flash(AVISO_COORDENADAS, 'warning')
+
+def _sugestao_exif(coleta):
+    """
+    Valores sugeridos pelo EXIF das fotos da coleta: coordenadas (média das
+    posições GPS) se a coleta não tem coordenadas reconhecidas, e a data da
+    primeira foto se for diferente da data informada.
+    """
+    fotos_gps, latitude, longitude, primeira = db.session.execute(
+        db.select(db.func.count(ImagemColeta.exif_latitude), db.func.avg(ImagemColeta.exif_latitude),
+                  db.func.avg(ImagemColeta.exif_longitude), db.func.min(ImagemColeta.exif_data_hora))
+        .where(ImagemColeta.coleta_id == coleta.id)).one()
+    sugestao = {}
+    if coleta.latitude is None and fotos_gps:
+        sugestao['coordenadas'] = f'{latitude:.5f}, {longitude:.5f}'
+        sugestao['fotos_gps'] = fotos_gps
+    if primeira is not None and primeira.date() != coleta.data_coleta:
+        sugestao['data_coleta'] = primeira.date()
+    return sugestao
 
 @app.route('/coleta/<int:id>')
+@paginas.em_cache(registro='coleta')
 def coleta_detalhe(id):
     coleta = Coleta.query.get_or_404(id)
-    return render_template('coleta_detalhe.html', coleta=coleta)
+    return render_template('coleta_detalhe.html', coleta=coleta, sugestao=_sugestao_exif(coleta))
+
+@app.route('/coleta/<int:id>/aplicar-exif', methods=['POST'])
+def aplicar_exif_coleta(id):
+    """Aplica uma das sugestões do EXIF (campo `campo`: coordenadas ou data_coleta)"""
+    coleta = Coleta.query.get_or_404(id)
+    campo = request.form.get('campo')
+    sugestao = _sugestao_exif(coleta)
+    if campo not in ('coordenadas', 'data_coleta') or campo not in sugestao:
+        flash('Não há sugestão das fotos para este campo.', 'warning')
+    else:
+        setattr(coleta, campo, sugestao[campo])
+        db.session.commit()
+        flash('Coordenadas preenchidas pelo GPS das fotos.' if campo == 'coordenadas'
+              else 'Data da coleta ajustada pela data das fotos.', 'success')
+    return redirect(url_for('coleta_detalhe', id=coleta.id))
 
 @app.route('/coleta/<int:id>/excluir', methods=['POST'])
 def excluir_coleta(id):
     coleta = Coleta.query.get_or_404(id)
     try:
-        # Excluir a coleta (cascade delete das imagens, isolados e experimentos)
+        # Imagens, isolados (com repiques e imagens) e experimentos são
+        # excluídos pelo banco (ON DELETE CASCADE), sem carregá-los
         db.session.delete(coleta)
         db.session.commit()
+        _remover_arquivos_excluidos()
         flash('Coleta excluída com sucesso!', 'success')
         return redirect(url_for('coletas'))
     except Exception as e:
@@ -174,105 +721,78 @@ def editar_coleta(id):
     coleta = Coleta.query.get_or_404(id)
     
     if request.method == 'POST':
+        salvos = []
         try:
             # Atualizar dados básicos da coleta
-            coleta.codigo = request.form['codigo']
-            coleta.nome_cientifico = request.form['nome_cientifico']
-            coleta.nome_popular = request.form['nome_popular']
-            coleta.data_coleta = datetime.strptime(request.form['data_coleta'], '%Y-%m-%d').date()
-            coleta.local_coleta = request.form['local_coleta']
-            coleta.coordenadas = request.form['coordenadas']
-            coleta.substrato = request.form['substrato']
-            coleta.coletor = request.form['coletor']
-            coleta.observacoes = request.form['observacoes']
+            for campo, valor in _valores_coleta(request.form).items():
+                setattr(coleta, campo, valor)
             
             # Processar novas imagens se fornecidas
-            if 'imagens' in request.files:
-                files = request.files.getlist('imagens')
-                for file in files:
-                    if file and file.filename != '':
-                        filename = secure_filename(file.filename)
-                        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                        filename = f"{timestamp}_{filename}"
-                        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                        file.save(filepath)
-                        
-                        # Criar registro da nova imagem
-                        imagem = ImagemColeta(
-                            coleta_id=coleta.id,
-                            nome_arquivo=filename,
-                            descricao=request.form.get('descricao_imagem', '')
-                        )
-                        db.session.add(imagem)
+            _salvar_imagens(salvos, 'imagens', ImagemColeta,
+                            request.form.get('descricao_imagem', ''), coleta_id=coleta.id)
             
             db.session.commit()
             flash('Coleta atualizada com sucesso!', 'success')
+            _avisar_coordenadas(coleta)
             return redirect(url_for('coleta_detalhe', id=coleta.id))
             
         except Exception as e:
             flash(f'Erro ao atualizar coleta: {str(e)}', 'error')
             db.session.rollback()
+            descartar_nao_registrados(db.session, salvos, app.config['UPLOAD_FOLDER'])
     
     return render_template('editar_coleta.html', coleta=coleta)
 
 @app.route('/coleta/nova', methods=['GET', 'POST'])
 def nova_coleta():
     if request.method == 'POST':
+        salvos = []
         try:
             # Criar nova coleta
-            coleta = Coleta(
-                codigo=request.form['codigo'],
-                nome_cientifico=request.form['nome_cientifico'],
-                nome_popular=request.form['nome_popular'],
-                data_coleta=datetime.strptime(request.form['data_coleta'], '%Y-%m-%d').date(),
-                local_coleta=request.form['local_coleta'],
-                coordenadas=request.form['coordenadas'],
-                substrato=request.form['substrato'],
-                coletor=request.form['coletor'],
-                observacoes=request.form['observacoes']
-            )
+            coleta = Coleta(**_valores_coleta(request.form))
             
             db.session.add(coleta)
             db.session.flush()  # Para obter o ID da coleta
             
             # Processar múltiplas imagens
-            if 'imagens' in request.files:
-                files = request.files.getlist('imagens')
-                for file in files:
-                    if file and file.filename != '':
-                        filename = secure_filename(file.filename)
-                        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                        filename = f"{timestamp}_{filename}"
-                        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                        file.save(filepath)
-                        
-                        # Criar registro da imagem
-                        imagem = ImagemColeta(
-                            coleta_id=coleta.id,
-                            nome_arquivo=filename,
-                            descricao=request.form.get('descricao_imagem', '')
-                        )
-                        db.session.add(imagem)
+            _salvar_imagens(salvos, 'imagens', ImagemColeta,
+                            request.form.get('descricao_imagem', ''), coleta_id=coleta.id)
             
             db.session.commit()
             flash('Coleta cadastrada com sucesso!', 'success')
+            _avisar_coordenadas(coleta)
             return redirect(url_for('coleta_detalhe', id=coleta.id))
             
         except Exception as e:
             flash(f'Erro ao cadastrar coleta: {str(e)}', 'error')
             db.session.rollback()
+            descartar_nao_registrados(db.session, salvos, app.config['UPLOAD_FOLDER'])
     
     return render_template('nova_coleta.html')
 
+def _opcao_selecionada(modelo, id):
+    """
+    Opções iniciais dos selects de coleta/isolado: só o registro já escolhido;
+    as demais vêm de /api/<tabela>/sugestoes conforme o usuário digita.
+    """
+    try:
+        registro = modelo.query.get(int(id)) if id else None
+    except (TypeError, ValueError):
+        registro = None
+    return [registro] if registro else []
+
 # Rotas para Isolados
 @app.route('/isolados')
 def isolados():
-    page = request.args.get('page', 1, type=int)
-    isolados = Isolado.query.order_by(Isolado.data_cadastro.desc()).paginate(
-        page=page, per_page=20, error_out=False)
-    return render_template('isolados.html', isolados=isolados)
+    query, facetas, chave, filtrado = _consulta_facetada(Isolado, FACETAS_ISOLADO)
+    resumo = estatisticas.resumo(db.session.connection())
+    total = None if filtrado else resumo.get('total', {}).get('isolado', 0)
+    isolados = _pagina_por_cursor(query.options(*opcoes_listagem_isolados()), Isolado,
+                                  ('isolados', *chave), total)
+    return render_template('isolados.html', isolados=isolados, estatisticas=resumo, facetas=facetas)
 
 @app.route('/isolado/<int:id>')
+@paginas.em_cache(registro='isolado')
 def isolado_detalhe(id):
     isolado = Isolado.query.get_or_404(id)
     return render_template('isolado_detalhe.html', isolado=isolado)
@@ -280,64 +800,15 @@ def isolado_detalhe(id):
 @app.route('/isolado/novo', methods=['GET', 'POST'])
 def novo_isolado():
     if request.method == 'POST':
+        salvos = []
         try:
-            origem_tipo = request.form.get('origem_tipo', 'coleta')
-            origem_instituicao = request.form.get('origem_instituicao', '').strip()
-            coleta_id_raw = request.form.get('coleta_id')
-            especie_nome = request.form.get('especie_nome_cientifico', '').strip()
-
-            if origem_tipo not in ['coleta', 'adquirida', 'doada']:
-                origem_tipo = 'coleta'
-
-            if origem_tipo == 'coleta':
-                if not coleta_id_raw:
-                    raise ValueError('Selecione a coleta de origem para isolados provenientes de coleta.')
-                coleta_id = int(coleta_id_raw)
-                origem_instituicao = None
-                coleta = Coleta.query.get(coleta_id)
-                if not coleta:
-                    raise ValueError('Coleta selecionada não encontrada.')
-                especie_nome = (coleta.nome_cientifico or '').strip()
-                if not especie_nome:
-                    raise ValueError('A coleta selecionada não possui nome científico cadastrado. Atualize a coleta antes de prosseguir.')
-            else:
-                coleta_id = None
-                if not origem_instituicao:
-                    raise ValueError('Informe a instituição responsável pela aquisição ou doação do isolado.')
-                if not especie_nome:
-                    raise ValueError('Informe o nome científico da espécie para isolados adquiridos ou doados.')
-
-            isolado = Isolado(
-                codigo=request.form['codigo'],
-                coleta_id=coleta_id,
-                origem_tipo=origem_tipo,
-                origem_instituicao=origem_instituicao if origem_instituicao else None,
-                especie_nome_cientifico=especie_nome if especie_nome else None,
-                data_isolamento=datetime.strptime(request.form['data_isolamento'], '%Y-%m-%d').date(),
-                meio_cultura=request.form['meio_cultura'],
-                temperatura_incubacao=float(request.form['temperatura_incubacao']) if request.form['temperatura_incubacao'] else None,
-                observacoes=request.form['observacoes']
-            )
+            isolado = Isolado(**_valores_isolado(request.form, lambda coleta_id: db.session.get(Coleta, coleta_id)))
             
             db.session.add(isolado)
             db.session.flush()
 
-            if 'imagens_isolado' in request.files:
-                files = request.files.getlist('imagens_isolado')
-                for file in files:
-                    if file and file.filename != '':
-                        filename = secure_filename(file.filename)
-                        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                        filename = f"{timestamp}_{filename}"
-                        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                        file.save(filepath)
-
-                        imagem = ImagemIsolado(
-                            isolado_id=isolado.id,
-                            nome_arquivo=filename,
-                            descricao=request.form.get('descricao_imagem_isolado', '')
-                        )
-                        db.session.add(imagem)
+            _salvar_imagens(salvos, 'imagens_isolado', ImagemIsolado,
+                            request.form.get('descricao_imagem_isolado', ''), isolado_id=isolado.id)
             db.session.commit()
             flash('Isolado cadastrado com sucesso!', 'success')
             return redirect(url_for('isolados'))
@@ -345,8 +816,9 @@ def novo_isolado():
         except Exception as e:
             flash(f'Erro ao cadastrar isolado: {str(e)}', 'error')
             db.session.rollback()
+            descartar_nao_registrados(db.session, salvos, app.config['UPLOAD_FOLDER'])
     
-    coletas = Coleta.query.all()
+    coletas = _opcao_selecionada(Coleta, request.form.get('coleta_id', request.args.get('coleta_id')))
     return render_template('novo_isolado.html', coletas=coletas)
 
 # Rotas para Repiques
@@ -356,13 +828,7 @@ def novo_repique(isolado_id):
     
     if request.method == 'POST':
         try:
-            repique = Repique(
-                isolado_id=isolado_id,
-                data_repique=datetime.strptime(request.form['data_repique'], '%Y-%m-%d').date(),
-                numero_placas=int(request.form['numero_placas']),
-                meio_cultura=request.form['meio_cultura'],
-                observacoes=request.form['observacoes']
-            )
+            repique = Repique(isolado_id=isolado_id, **_valores_repique(request.form))
             
             db.session.add(repique)
             db.session.commit()
@@ -394,11 +860,10 @@ def excluir_imagem_isolado(id):
     imagem = ImagemIsolado.query.get_or_404(id)
     isolado_id = imagem.isolado_id
     try:
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], imagem.nome_arquivo)
-        if os.path.exists(filepath):
-            os.remove(filepath)
         db.session.delete(imagem)
         db.session.commit()
+        # O arquivo só sai do disco se nenhuma outra imagem o usa
+        _remover_arquivos_excluidos()
         flash('Imagem do isolado removida com sucesso!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -408,10 +873,11 @@ def excluir_imagem_isolado(id):
 # Rotas para Experimentos
 @app.route('/experimentos')
 def experimentos():
-    page = request.args.get('page', 1, type=int)
-    experimentos = Experimento.query.order_by(Experimento.data_cadastro.desc()).paginate(
-        page=page, per_page=20, error_out=False)
-    return render_template('experimentos.html', experimentos=experimentos)
+    resumo = estatisticas.resumo(db.session.connection())
+    experimentos = _pagina_por_cursor(Experimento.query.options(*opcoes_listagem_experimentos()),
+                                      Experimento, ('experimentos',),
+                                      resumo.get('total', {}).get('experimento', 0))
+    return render_template('experimentos.html', experimentos=experimentos, estatisticas=resumo)
 
 @app.route('/experimento/<int:id>')
 def experimento_detalhe(id):
@@ -458,8 +924,8 @@ def novo_experimento():
             flash(f'Erro ao cadastrar experimento: {str(e)}', 'error')
             db.session.rollback()
     
-    coletas = Coleta.query.all()
-    isolados = Isolado.query.all()
+    coletas = _opcao_selecionada(Coleta, request.args.get('coleta_id'))
+    isolados = _opcao_selecionada(Isolado, request.args.get('isolado_id'))
     return render_template('novo_experimento.html', coletas=coletas, isolados=isolados)
 
 # Rotas para exclusão de isolados
@@ -467,9 +933,10 @@ def novo_experimento():
 def excluir_isolado(id):
     isolado = Isolado.query.get_or_404(id)
     try:
-        # Excluir o isolado (cascade delete dos repiques e experimentos relacionados)
+        # Repiques, imagens e experimentos são excluídos pelo banco (ON DELETE CASCADE)
         db.session.delete(isolado)
         db.session.commit()
+        _remover_arquivos_excluidos()
         flash('Isolado excluído com sucesso!', 'success')
         return redirect(url_for('isolados'))
     except Exception as e:
@@ -482,65 +949,19 @@ def editar_isolado(id):
     isolado = Isolado.query.get_or_404(id)
     
     if request.method == 'POST':
+        salvos = []
         try:
             # Atualizar dados do isolado
-            isolado.codigo = request.form['codigo']
-            isolado.data_isolamento = datetime.strptime(request.form['data_isolamento'], '%Y-%m-%d').date()
-            isolado.meio_cultura = request.form['meio_cultura']
-            temperatura = request.form.get('temperatura_incubacao')
-            isolado.temperatura_incubacao = float(temperatura) if temperatura else None
-            isolado.observacoes = request.form.get('observacoes', '')
-            especie_nome = request.form.get('especie_nome_cientifico', '').strip()
-
-            origem_tipo = request.form.get('origem_tipo', 'coleta')
-            origem_instituicao = request.form.get('origem_instituicao', '').strip()
-            coleta_id_raw = request.form.get('coleta_id')
-
-            if origem_tipo not in ['coleta', 'adquirida', 'doada']:
-                origem_tipo = 'coleta'
-
-            if origem_tipo == 'coleta':
-                if not coleta_id_raw:
-                    raise ValueError('Selecione a coleta de origem para isolados provenientes de coleta.')
-                isolado.coleta_id = int(coleta_id_raw)
-                isolado.origem_instituicao = None
-                coleta = Coleta.query.get(isolado.coleta_id)
-                if not coleta:
-                    raise ValueError('Coleta selecionada não encontrada.')
-                isolado.especie_nome_cientifico = (coleta.nome_cientifico or '').strip()
-                if not isolado.especie_nome_cientifico:
-                    raise ValueError('A coleta selecionada não possui nome científico cadastrado. Atualize a coleta antes de prosseguir.')
-            else:
-                isolado.coleta_id = None
-                if not origem_instituicao:
-                    raise ValueError('Informe a instituição responsável pela aquisição ou doação do isolado.')
-                isolado.origem_instituicao = origem_instituicao
-                if not especie_nome:
-                    raise ValueError('Informe o nome científico da espécie para isolados adquiridos ou doados.')
-                isolado.especie_nome_cientifico = especie_nome
-
-            isolado.origem_tipo = origem_tipo
+            valores = _valores_isolado(request.form, lambda coleta_id: db.session.get(Coleta, coleta_id))
+            for campo, valor in valores.items():
+                setattr(isolado, campo, valor)
             
             # Se meio_cultura for 'outros', usar o valor do campo outros_meios
             if isolado.meio_cultura == 'outros':
                 isolado.meio_cultura = request.form.get('outros_meios', '')
             
-            if 'imagens_isolado' in request.files:
-                files = request.files.getlist('imagens_isolado')
-                for file in files:
-                    if file and file.filename != '':
-                        filename = secure_filename(file.filename)
-                        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                        filename = f"{timestamp}_{filename}"
-                        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                        file.save(filepath)
-
-                        imagem = ImagemIsolado(
-                            isolado_id=isolado.id,
-                            nome_arquivo=filename,
-                            descricao=request.form.get('descricao_imagem_isolado', '')
-                        )
-                        db.session.add(imagem)
+            _salvar_imagens(salvos, 'imagens_isolado', ImagemIsolado,
+                            request.form.get('descricao_imagem_isolado', ''), isolado_id=isolado.id)
 
             db.session.commit()
             flash('Isolado atualizado com sucesso!', 'success')
@@ -549,9 +970,9 @@ def editar_isolado(id):
         except Exception as e:
             flash(f'Erro ao atualizar isolado: {str(e)}', 'error')
             db.session.rollback()
+            descartar_nao_registrados(db.session, salvos, app.config['UPLOAD_FOLDER'])
     
-    # Buscar todas as coletas para o select
-    coletas = Coleta.query.all()
+    coletas = _opcao_selecionada(Coleta, isolado.coleta_id)
     return render_template('editar_isolado.html', isolado=isolado, coletas=coletas)
 
 @app.route('/repique/<int:id>/editar', methods=['GET', 'POST'])
@@ -605,9 +1026,8 @@ def editar_experimento(id):
             flash(f'Erro ao atualizar experimento: {str(e)}', 'error')
             db.session.rollback()
     
-    # Buscar todas as coletas e isolados para os selects
-    coletas = Coleta.query.all()
-    isolados = Isolado.query.all()
+    coletas = _opcao_selecionada(Coleta, experimento.coleta_id)
+    isolados = _opcao_selecionada(Isolado, experimento.isolado_id)
     return render_template('editar_experimento.html', experimento=experimento, coletas=coletas, isolados=isolados)
 
 # Sistema de busca
@@ -619,65 +1039,1320 @@ def busca():
     resultados = {}
     
     if query:
-        if tipo in ['todos', 'coletas']:
-            coletas = Coleta.query.filter(
-                db.or_(
-                    Coleta.codigo.contains(query),
-                    Coleta.nome_cientifico.contains(query),
-                    Coleta.nome_popular.contains(query),
-                    Coleta.local_coleta.contains(query)
-                )
-            ).all()
-            resultados['coletas'] = coletas
-        
-        if tipo in ['todos', 'isolados']:
-            isolados = Isolado.query.filter(
-                db.or_(
-                    Isolado.codigo.contains(query),
-                    Isolado.meio_cultura.contains(query)
-                )
-            ).all()
-            resultados['isolados'] = isolados
-        
-        if tipo in ['todos', 'experimentos']:
-            experimentos = Experimento.query.filter(
-                db.or_(
-                    Experimento.titulo.contains(query),
-                    Experimento.objetivo.contains(query)
-                )
-            ).all()
-            resultados['experimentos'] = experimentos
+        # Cada tipo é ranqueado pelo índice FTS5 e paginado separadamente
+        buscas = [
+            ('coletas', 'coleta', Coleta, _sem_textos(*TEXTOS_COLETA)),
+            ('isolados', 'isolado', Isolado, opcoes_resumo_isolados()),
+            ('experimentos', 'experimento', Experimento, opcoes_listagem_experimentos()),
+        ]
+        for chave, tabela, modelo, opcoes in buscas:
+            if tipo not in ['todos', chave]:
+                continue
+            encontrados = subconsulta_busca(tabela, query)
+            if encontrados is None:
+                continue
+            pagina = request.args.get(f'pagina_{chave}', 1, type=int)
+            paginacao = (modelo.query
+                         .join(encontrados, encontrados.c.id == modelo.id)
+                         .options(*opcoes)
+                         .order_by(encontrados.c.rank, modelo.id.desc())
+                         .paginate(page=pagina, per_page=20, error_out=False))
+            if paginacao.total:
+                resultados[chave] = paginacao
     
     return render_template('busca.html', resultados=resultados, query=query, tipo=tipo)
 
-# Rota para servir imagens
-@app.route('/uploads/<filename>')
+# Rota para servir imagens. Arquivos novos ficam em subpastas (ab/cd/<sha256>.ext);
+# os enviados antes do armazenamento por conteúdo continuam na raiz.
+@app.route('/uploads/<path:filename>')
 def uploaded_file(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    sha256 = condicional.sha256_do_caminho(filename)
+    if sha256 is None:
+        return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    # Endereçado por conteúdo: ETag forte, cache imutável e Range (send_file)
+    resposta = send_from_directory(app.config['UPLOAD_FOLDER'], filename,
+                                   etag=sha256, max_age=condicional.UPLOAD_MAX_AGE)
+    resposta.cache_control.immutable = True
+    return resposta
+
+# Versões reduzidas (miniatura/média) das imagens, geradas sob demanda
+@app.route('/rendicoes/<tamanho>/<path:filename>')
+def imagem_rendicao(tamanho, filename):
+    if tamanho not in RENDICOES or any(parte != secure_filename(parte)
+                                       for parte in filename.split('/')):
+        abort(404)
+    try:
+        caminho = obter_rendicao(app.config['UPLOAD_FOLDER'], app.config['RENDITION_FOLDER'],
+                                 tamanho, filename)
+    except FileNotFoundError:
+        abort(404)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError):
+        # Arquivo que o Pillow não consegue (ou não deve, acima do limite de
+        # pixels) abrir: servir o original
+        return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    return send_file(os.path.abspath(caminho), max_age=86400)
 
 # API para dados em JSON
-@app.route('/api/coletas')
-def api_coletas():
-    coletas = Coleta.query.all()
-    return jsonify([{
+def _api_condicional(*tabelas):
+    """
+    ETag das respostas GET a partir das versões das `tabelas` e da URL. Se o
+    cliente já tem a versão atual, devolve 304 sem executar a consulta. As
+    versões e os dados são lidos na mesma transação de leitura.
+    """
+    def decorador(view):
+        @wraps(view)
+        def view_condicional(**argumentos):
+            etag = condicional.etag(condicional.versoes(db.session.connection(), tabelas),
+                                    request.full_path)
+            if request.if_none_match.contains(etag):
+                resposta = app.response_class(status=304)
+            else:
+                resposta = app.make_response(view(**argumentos))
+                if resposta.status_code != 200:
+                    return resposta
+            resposta.set_etag(etag)
+            resposta.cache_control.no_cache = True
+            return resposta
+        return view_condicional
+    return decorador
+
+def _serializar_coleta(c):
+    return {
         'id': c.id,
         'codigo': c.codigo,
         'nome_cientifico': c.nome_cientifico,
         'nome_popular': c.nome_popular,
         'data_coleta': c.data_coleta.strftime('%Y-%m-%d') if c.data_coleta else None,
-        'local_coleta': c.local_coleta
-    } for c in coletas])
+        'local_coleta': c.local_coleta,
+        'latitude': c.latitude,
+        'longitude': c.longitude,
+    }
 
-@app.route('/api/isolados')
-def api_isolados():
-    isolados = Isolado.query.all()
-    return jsonify([{
+def _serializar_isolado(i):
+    return {
         'id': i.id,
         'codigo': i.codigo,
         'coleta_codigo': i.coleta.codigo if i.coleta else None,
         'data_isolamento': i.data_isolamento.strftime('%Y-%m-%d') if i.data_isolamento else None,
         'meio_cultura': i.meio_cultura
-    } for i in isolados])
+    }
+
+def _resposta_api(query, modelo, serializar):
+    """
+    Sem parâmetros devolve a lista completa (formato original). Com `cursor`
+    ou `limite`, devolve uma página keyset; `total=1` inclui o total em cache.
+    """
+    if 'cursor' not in request.args and 'limite' not in request.args:
+        return jsonify([serializar(item) for item in query.all()])
+
+    limite = min(max(request.args.get('limite', 100, type=int), 1), 1000)
+    total = None
+    if request.args.get('total') == '1':
+        total = total_em_cache(('api', modelo.__tablename__), query, modelo)
+    try:
+        pagina = paginar(query, modelo, request.args.get('cursor') or None, limite, total)
+    except ValueError as e:
+        return jsonify({'erro': str(e)}), 400
+
+    resposta = {
+        'itens': [serializar(item) for item in pagina.items],
+        'proximo_cursor': pagina.next_cursor,
+        'cursor_anterior': pagina.prev_cursor,
+    }
+    if total is not None:
+        resposta['total'] = total
+    return jsonify(resposta)
+
+# Campos disponíveis na exportação em streaming (?formato=ndjson|csv&fields=...)
+CAMPOS_EXPORTACAO_COLETA = {
+    'id': Coleta.id,
+    'codigo': Coleta.codigo,
+    'nome_cientifico': Coleta.nome_cientifico,
+    'nome_popular': Coleta.nome_popular,
+    'data_coleta': Coleta.data_coleta,
+    'local_coleta': Coleta.local_coleta,
+    'coordenadas': Coleta.coordenadas,
+    'latitude': Coleta.latitude,
+    'longitude': Coleta.longitude,
+    'substrato': Coleta.substrato,
+    'coletor': Coleta.coletor,
+    'observacoes': Coleta.observacoes,
+    'data_cadastro': Coleta.data_cadastro,
+}
+
+CAMPOS_EXPORTACAO_ISOLADO = {
+    'id': Isolado.id,
+    'codigo': Isolado.codigo,
+    'coleta_id': Isolado.coleta_id,
+    'coleta_codigo': Coleta.codigo,
+    'origem_tipo': Isolado.origem_tipo,
+    'origem_instituicao': Isolado.origem_instituicao,
+    'especie_nome_cientifico': Isolado.especie_nome_cientifico,
+    'data_isolamento': Isolado.data_isolamento,
+    'meio_cultura': Isolado.meio_cultura,
+    'temperatura_incubacao': Isolado.temperatura_incubacao,
+    'observacoes': Isolado.observacoes,
+    'data_cadastro': Isolado.data_cadastro,
+}
+
+def _data_argumento(nome):
+    valor = request.args.get(nome)
+    return datetime.strptime(valor, '%Y-%m-%d').date() if valor else None
+
+def _filtros_exportacao_coletas():
+    filtros = []
+    if request.args.get('substrato'):
+        filtros.append(Coleta.substrato == request.args['substrato'])
+    if request.args.get('coletor'):
+        filtros.append(Coleta.coletor.contains(request.args['coletor']))
+    if _data_argumento('data_de'):
+        filtros.append(Coleta.data_coleta >= _data_argumento('data_de'))
+    if _data_argumento('data_ate'):
+        filtros.append(Coleta.data_coleta <= _data_argumento('data_ate'))
+    return filtros
+
+def _filtros_exportacao_isolados():
+    filtros = []
+    if request.args.get('coleta_id'):
+        # Com type=int um valor inválido viraria None (IS NULL), não um erro
+        try:
+            coleta_id = int(request.args['coleta_id'])
+        except ValueError:
+            raise ValueError('coleta_id deve ser um número inteiro')
+        filtros.append(Isolado.coleta_id == coleta_id)
+    if request.args.get('meio_cultura'):
+        filtros.append(Isolado.meio_cultura == request.args['meio_cultura'])
+    if request.args.get('origem_tipo'):
+        filtros.append(Isolado.origem_tipo == request.args['origem_tipo'])
+    if _data_argumento('data_de'):
+        filtros.append(Isolado.data_isolamento >= _data_argumento('data_de'))
+    if _data_argumento('data_ate'):
+        filtros.append(Isolado.data_isolamento <= _data_argumento('data_ate'))
+    return filtros
+
+def _exportar(modelo, campos, montar_filtros, juncoes=()):
+    """
+    Exporta `modelo` em NDJSON/CSV: só as colunas pedidas, com as tabelas
+    relacionadas na mesma consulta, lidas e enviadas em lotes.
+    """
+    try:
+        nomes = selecionar_campos(campos, request.args.get('fields'))
+        filtros = montar_filtros()
+    except ValueError as e:
+        return jsonify({'erro': str(e)}), 400
+
+    consulta = db.select(*[campos[nome].label(nome) for nome in nomes]).select_from(modelo)
+    for tabela, condicao in juncoes:
+        consulta = consulta.outerjoin(tabela, condicao)
+    consulta = consulta.where(*filtros).order_by(modelo.id)
+    return resposta_exportacao(db.session, consulta, nomes, request.args['formato'],
+                               modelo.__tablename__)
+
+@app.route('/api/coletas')
+@_api_condicional('coleta')
+def api_coletas():
+    if request.args.get('formato') in FORMATOS:
+        return _exportar(Coleta, CAMPOS_EXPORTACAO_COLETA, _filtros_exportacao_coletas)
+    return _resposta_api(Coleta.query.options(*_sem_textos(*TEXTOS_COLETA)), Coleta, _serializar_coleta)
+
+@app.route('/api/isolados')
+@_api_condicional('isolado', 'coleta')
+def api_isolados():
+    if request.args.get('formato') in FORMATOS:
+        return _exportar(Isolado, CAMPOS_EXPORTACAO_ISOLADO, _filtros_exportacao_isolados,
+                         juncoes=[(Coleta, Isolado.coleta_id == Coleta.id)])
+    return _resposta_api(Isolado.query.options(*opcoes_resumo_isolados()), Isolado, _serializar_isolado)
+
+# Diagnóstico da configuração do banco
+def _estado_engine(engine, pragmas):
+    with engine.connect() as conexao:
+        valores = {nome: conexao.exec_driver_sql(f'PRAGMA {nome}').scalar() for nome in pragmas}
+    return {
+        'url': engine.url.render_as_string(hide_password=True),
+        'pragmas': valores,
+        'pool': engine.pool.status(),
+    }
+
+@app.route('/api/diagnostico/banco')
+def api_diagnostico_banco():
+    resposta = {
+        'dialeto': db.engine.dialect.name,
+        'leitura_get_separada': bool(app.config.get('SQLITE_READ_ONLY_GET')
+                                     and app.extensions.get('engine_leitura') is not None),
+        'configurado': pragmas_sqlite(app.config),
+    }
+    if db.engine.dialect.name == 'sqlite':
+        resposta['escrita'] = _estado_engine(db.engine, pragmas_sqlite(app.config))
+        leitura = app.extensions.get('engine_leitura')
+        if leitura is not None:
+            resposta['leitura'] = _estado_engine(leitura, pragmas_sqlite(app.config, somente_leitura=True))
+    return jsonify(resposta)
+
+# Contagens das facetas para os mesmos filtros das listagens
+@app.route('/api/coletas/facetas')
+@_api_condicional('coleta')
+def api_coletas_facetas():
+    _, facetas, _, _ = _consulta_facetada(Coleta, FACETAS_COLETA)
+    return jsonify([faceta.para_json() for faceta in facetas])
+
+@app.route('/api/isolados/facetas')
+@_api_condicional('isolado')
+def api_isolados_facetas():
+    _, facetas, _, _ = _consulta_facetada(Isolado, FACETAS_ISOLADO)
+    return jsonify([faceta.para_json() for faceta in facetas])
+
+# Consultas espaciais (GeoJSON): retângulo e/ou raio; com `zoom`, agrupadas
+def _numeros_argumento(nome, quantidade):
+    valor = request.args.get(nome)
+    if not valor:
+        return None
+    try:
+        numeros = [float(parte) for parte in valor.split(',')]
+    except ValueError:
+        numeros = []
+    if len(numeros) != quantidade:
+        raise ValueError(f'{nome} deve ter {quantidade} números separados por vírgula')
+    return numeros
+
+def _regiao_argumentos():
+    caixa = _numeros_argumento('bbox', 4)
+    if caixa:
+        oeste, sul, leste, norte = caixa
+        if not (-180 <= oeste <= 180 and -180 <= leste <= 180 and -90 <= sul <= norte <= 90):
+            raise ValueError('bbox deve ser oeste,sul,leste,norte em graus')
+    centro = None
+    raio_km = request.args.get('raio_km', type=float)
+    if request.args.get('lat') or request.args.get('lon') or raio_km is not None:
+        latitude = request.args.get('lat', type=float)
+        longitude = request.args.get('lon', type=float)
+        if latitude is None or longitude is None or raio_km is None:
+            raise ValueError('Consulta por raio exige lat, lon e raio_km')
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise ValueError('lat/lon fora do intervalo')
+        if not 0 < raio_km <= RAIO_MAXIMO_KM:
+            raise ValueError(f'raio_km deve estar entre 0 e {RAIO_MAXIMO_KM}')
+        centro = (latitude, longitude)
+    if not caixa and not centro:
+        raise ValueError('Informe bbox=oeste,sul,leste,norte ou lat, lon e raio_km')
+    return Regiao(caixa, centro, raio_km)
+
+def _feature(longitude, latitude, propriedades):
+    return {
+        'type': 'Feature',
+        'geometry': {'type': 'Point', 'coordinates': [longitude, latitude]},
+        'properties': propriedades,
+    }
+
+def _propriedades_coleta(c):
+    return {
+        'id': c['id'],
+        'codigo': c['codigo'],
+        'nome_cientifico': c['nome_cientifico'],
+        'data_coleta': str(c['data_coleta']) if c['data_coleta'] else None,
+        'substrato': c['substrato'],
+        'url': url_for('coleta_detalhe', id=c['id']),
+    }
+
+@app.route('/api/coletas/geo')
+@_api_condicional('coleta')
+def api_coletas_geo():
+    try:
+        regiao = _regiao_argumentos()
+        zoom = request.args.get('zoom', type=int)
+        if zoom is not None and not 0 <= zoom <= ZOOM_MAXIMO:
+            raise ValueError(f'zoom deve estar entre 0 e {ZOOM_MAXIMO}')
+    except ValueError as e:
+        return jsonify({'erro': str(e)}), 400
+    conexao = db.session.connection()
+    
+    if zoom is None:
+        limite = min(max(request.args.get('limite', 1000, type=int), 1), 10000)
+        encontradas, truncado = pontos(conexao, regiao, limite)
+        return jsonify({
+            'type': 'FeatureCollection',
+            'features': [_feature(c['longitude'], c['latitude'], _propriedades_coleta(c))
+                         for c in encontradas],
+            'total': len(encontradas),
+            'truncado': truncado,
+        })
+    
+    # Grupos de uma coleta só viram pontos com os dados da coleta
+    grupos = agrupar(conexao, regiao, zoom)
+    sozinhas = [id for total, *_, id in grupos if total == 1]
+    detalhes = {}
+    for inicio in range(0, len(sozinhas), 500):
+        consulta = (db.select(Coleta.id, Coleta.codigo, Coleta.nome_cientifico, Coleta.data_coleta,
+                              Coleta.substrato, Coleta.latitude, Coleta.longitude)
+                    .where(Coleta.id.in_(sozinhas[inicio:inicio + 500])))
+        detalhes.update({linha.id: linha._mapping for linha in conexao.execute(consulta)})
+    
+    features = []
+    for total, latitude, longitude, caixa, id in grupos:
+        if total == 1 and id in detalhes:
+            c = detalhes[id]
+            features.append(_feature(c['longitude'], c['latitude'], _propriedades_coleta(c)))
+        else:
+            features.append(_feature(round(longitude, 6), round(latitude, 6),
+                                     {'cluster': True, 'total': total, 'bbox': [round(v, 6) for v in caixa]}))
+    return jsonify({
+        'type': 'FeatureCollection',
+        'features': features,
+        'total': sum(total for total, *_ in grupos),
+        'zoom': zoom,
+    })
+
+# Sugestões para os selects dos formulários (código, espécie ou data)
+SUGESTOES_LIMITE = 20
+_cache_sugestoes = CacheLRU(maximo=1024, ttl=60)
+
+def _sugerir(modelo, colunas, serializar):
+    """
+    Primeiro os códigos que começam com `q` (índice único de `codigo`), depois
+    os registros que contêm `q` em código, espécie ou data (índice de
+    trigramas). Sem `q`, os cadastrados mais recentemente.
+    """
+    termo = request.args.get('q', '').strip()
+    limite = min(max(request.args.get('limite', SUGESTOES_LIMITE, type=int), 1), 50)
+    chave = (modelo.__tablename__, termo, limite)
+    itens = _cache_sugestoes.obter(chave)
+    if itens is not None:
+        return jsonify(itens)
+    
+    consulta = db.select(*colunas)
+    if not termo:
+        linhas = db.session.execute(
+            consulta.order_by(modelo.data_cadastro.desc(), modelo.id.desc()).limit(limite)).all()
+    else:
+        # Comparação por faixa para usar o índice; códigos costumam estar em maiúsculas
+        prefixos = [db.and_(modelo.codigo >= prefixo, modelo.codigo < prefixo + '\U0010ffff')
+                    for prefixo in {termo, termo.upper()}]
+        linhas = db.session.execute(
+            consulta.where(db.or_(*prefixos)).order_by(modelo.codigo).limit(limite)).all()
+        encontrados = subconsulta_sugestao(modelo.__tablename__, termo)
+        if len(linhas) < limite and encontrados is not None:
+            vistos = [linha.id for linha in linhas]
+            linhas += db.session.execute(
+                consulta.join(encontrados, encontrados.c.id == modelo.id)
+                .where(modelo.id.not_in(vistos))
+                .order_by(encontrados.c.rank).limit(limite - len(linhas))).all()
+    
+    itens = [serializar(linha) for linha in linhas]
+    _cache_sugestoes.guardar(chave, itens)
+    return jsonify(itens)
+
+@app.route('/api/coletas/sugestoes')
+@_api_condicional('coleta')
+def api_coletas_sugestoes():
+    return _sugerir(
+        Coleta, [Coleta.id, Coleta.codigo, Coleta.nome_cientifico, Coleta.nome_popular, Coleta.data_coleta],
+        lambda c: {
+            'id': c.id,
+            'codigo': c.codigo,
+            'especie': c.nome_cientifico,
+            'data': c.data_coleta.strftime('%Y-%m-%d') if c.data_coleta else None,
+            'rotulo': f"{c.codigo} - {c.nome_cientifico or c.nome_popular or 'Sem identificação'}",
+        })
+
+@app.route('/api/isolados/sugestoes')
+@_api_condicional('isolado')
+def api_isolados_sugestoes():
+    return _sugerir(
+        Isolado, [Isolado.id, Isolado.codigo, Isolado.especie_nome_cientifico, Isolado.data_isolamento],
+        lambda i: {
+            'id': i.id,
+            'codigo': i.codigo,
+            'especie': i.especie_nome_cientifico,
+            'data': i.data_isolamento.strftime('%Y-%m-%d') if i.data_isolamento else None,
+            'rotulo': f"{i.codigo} - {i.especie_nome_cientifico or 'Sem identificação'}",
+        })
+
+# Totais e séries mensais pré-agregados
+@app.route('/api/estatisticas')
+@_api_condicional('coleta', 'isolado', 'experimento', 'repique')
+def api_estatisticas():
+    conexao = db.session.connection()
+    desde = request.args.get('desde', '')
+    return jsonify({
+        'totais': estatisticas.resumo(conexao),
+        'coletas_por_substrato': [
+            {'mes': mes, 'substrato': substrato, 'total': total}
+            for mes, substrato, total in estatisticas.series_mensais(conexao, 'coletas_substrato', desde)],
+        'coletas_por_coletor': [
+            {'mes': mes, 'coletor': coletor, 'total': total}
+            for mes, coletor, total in estatisticas.series_mensais(conexao, 'coletas_coletor', desde)],
+    })
+
+# Sincronização incremental (ver alteracoes.py)
+@app.route('/api/changes')
+@_api_condicional(*TABELAS_SINCRONIZADAS)
+def api_changes():
+    """
+    Sincronização incremental: alterações (registros completos e ids
+    excluídos) depois de `since`, em lotes de `limite`. Sem `since`, começa
+    do início (carga completa). O cliente repete com o `cursor` devolvido
+    enquanto `mais` for verdadeiro.
+    """
+    try:
+        cursor = int(request.args.get('since') or 0)
+    except ValueError:
+        return jsonify({'erro': 'Cursor de sincronização inválido'}), 400
+    limite = min(max(request.args.get('limite', LIMITE_PADRAO, type=int), 1), LIMITE_MAXIMO)
+    alteracoes, cursor, ha_mais = alteracoes_desde(db.session.connection(), db.metadata,
+                                                   max(cursor, 0), limite)
+    return jsonify({'alteracoes': alteracoes, 'cursor': cursor, 'mais': ha_mais})
+
+def _entradas_dwca():
+    return entradas_dwca(db.session, Coleta.__table__, ImagemColeta.__table__,
+                         url_for('uploaded_file', filename='', _external=True),
+                         app.config['DWC_DATASET_TITLE'], app.config['DWC_OCCURRENCE_ID_PREFIX'])
+
+@app.route('/api/dwca')
+@_api_condicional('coleta', 'imagem_coleta')
+def api_dwca():
+    """Darwin Core Archive das coletas, gerado em streaming (ver darwin_core.py)"""
+    resposta = app.response_class(stream_with_context(zip_em_stream(_entradas_dwca())),
+                                  mimetype='application/zip')
+    resposta.headers['Content-Disposition'] = 'attachment; filename=dwca-coletas.zip'
+    return resposta
+
+# Imagens pelos metadados EXIF, com os índices de data da captura e de GPS:
+# ?tirada_de=2024-03-01&tirada_ate=2024-03-31 (por data/hora da captura) e/ou ?gps=1
+def _serializar_imagem(imagem, chave):
+    return {
+        'id': imagem.id,
+        chave: getattr(imagem, chave),
+        'nome_arquivo': imagem.nome_arquivo,
+        'nome_original': imagem.nome_original,
+        'url': url_for('uploaded_file', filename=imagem.nome_arquivo),
+        'data_upload': imagem.data_upload.isoformat() if imagem.data_upload else None,
+        'exif_data_hora': imagem.exif_data_hora.isoformat() if imagem.exif_data_hora else None,
+        'exif_latitude': imagem.exif_latitude,
+        'exif_longitude': imagem.exif_longitude,
+        'exif_camera': imagem.exif_camera,
+    }
+
+def _api_imagens(modelo, chave):
+    try:
+        tirada_de, tirada_ate = _data_argumento('tirada_de'), _data_argumento('tirada_ate')
+    except ValueError:
+        return jsonify({'erro': 'Use datas no formato AAAA-MM-DD'}), 400
+    limite = min(max(request.args.get('limite', 100, type=int), 1), 1000)
+    cursor = request.args.get('cursor', '')
+
+    query = modelo.query
+    if request.args.get('gps') == '1':
+        query = query.filter(modelo.exif_latitude.isnot(None))
+    por_data = bool(tirada_de or tirada_ate)
+    try:
+        if por_data:
+            if tirada_de:
+                query = query.filter(modelo.exif_data_hora >= datetime.combine(tirada_de, datetime.min.time()))
+            if tirada_ate:
+                query = query.filter(modelo.exif_data_hora < datetime.combine(tirada_ate + timedelta(days=1),
+                                                                              datetime.min.time()))
+            # Cursor "<data/hora>|<id>" da última imagem da página
+            if cursor:
+                data_hora, ultimo = cursor.split('|')
+                data_hora, ultimo = datetime.fromisoformat(data_hora), int(ultimo)
+                query = query.filter(db.or_(modelo.exif_data_hora > data_hora,
+                                            db.and_(modelo.exif_data_hora == data_hora, modelo.id > ultimo)))
+            query = query.order_by(modelo.exif_data_hora, modelo.id)
+        else:
+            if cursor:
+                query = query.filter(modelo.id > int(cursor))
+            query = query.order_by(modelo.id)
+    except ValueError:
+        return jsonify({'erro': 'Cursor inválido'}), 400
+
+    imagens = query.limit(limite + 1).all()
+    proximo = None
+    if len(imagens) > limite:
+        imagens = imagens[:limite]
+        ultima = imagens[-1]
+        proximo = f'{ultima.exif_data_hora.isoformat()}|{ultima.id}' if por_data else str(ultima.id)
+    return jsonify({'itens': [_serializar_imagem(imagem, chave) for imagem in imagens],
+                    'proximo_cursor': proximo})
+
+@app.route('/api/coletas/imagens')
+@_api_condicional('imagem_coleta')
+def api_coletas_imagens():
+    return _api_imagens(ImagemColeta, 'coleta_id')
+
+@app.route('/api/isolados/imagens')
+@_api_condicional('imagem_isolado')
+def api_isolados_imagens():
+    return _api_imagens(ImagemIsolado, 'isolado_id')
+
+@app.route('/api/coletas/sugestoes-exif')
+@_api_condicional('coleta', 'imagem_coleta')
+def api_coletas_sugestoes_exif():
+    """Coletas sem coordenadas reconhecidas cujas fotos têm GPS, com a posição média das fotos"""
+    limite = min(max(request.args.get('limite', 100, type=int), 1), 1000)
+    linhas = db.session.execute(
+        db.select(Coleta.id, Coleta.codigo, Coleta.coordenadas, db.func.count(ImagemColeta.id),
+                  db.func.avg(ImagemColeta.exif_latitude), db.func.avg(ImagemColeta.exif_longitude))
+        .join(Coleta, Coleta.id == ImagemColeta.coleta_id)
+        .where(ImagemColeta.exif_latitude.isnot(None), Coleta.latitude.is_(None))
+        .group_by(Coleta.id)
+        .order_by(Coleta.id)
+        .limit(limite)).all()
+    return jsonify([
+        {'coleta_id': id, 'codigo': codigo, 'coordenadas_informadas': coordenadas, 'fotos_gps': fotos,
+         'coordenadas': f'{latitude:.5f}, {longitude:.5f}'}
+        for id, codigo, coordenadas, fotos, latitude, longitude in linhas
+    ])
+
+# Pacotes ZIP de imagens: de um registro ou dos registros filtrados na listagem
+def _pacote_imagens(imagem, chave, modelo, filtro, nome):
+    consulta = (db.select(imagem.id, modelo.id, modelo.codigo, imagem.nome_arquivo, imagem.nome_original,
+                          imagem.descricao, imagem.data_upload, ArquivoUpload.sha256)
+                .join(modelo, chave == modelo.id)
+                .outerjoin(ArquivoUpload, ArquivoUpload.caminho == imagem.nome_arquivo)
+                .where(filtro)
+                .order_by(chave, imagem.id))
+    entradas = entradas_imagens(db.session, consulta, app.config['UPLOAD_FOLDER'])
+    resposta = app.response_class(stream_with_context(zip_em_stream(entradas)), mimetype='application/zip')
+    resposta.headers['Content-Disposition'] = f'attachment; filename={nome}.zip'
+    return resposta
+
+@app.route('/coleta/<int:id>/imagens.zip')
+@_api_condicional('coleta', 'imagem_coleta')
+def coleta_imagens_zip(id):
+    coleta = Coleta.query.get_or_404(id)
+    return _pacote_imagens(ImagemColeta, ImagemColeta.coleta_id, Coleta, Coleta.id == coleta.id,
+                           f'imagens-{secure_filename(coleta.codigo) or coleta.id}')
+
+@app.route('/isolado/<int:id>/imagens.zip')
+@_api_condicional('isolado', 'imagem_isolado')
+def isolado_imagens_zip(id):
+    isolado = Isolado.query.get_or_404(id)
+    return _pacote_imagens(ImagemIsolado, ImagemIsolado.isolado_id, Isolado, Isolado.id == isolado.id,
+                           f'imagens-{secure_filename(isolado.codigo) or isolado.id}')
+
+@app.route('/coletas/imagens.zip')
+@_api_condicional('coleta', 'imagem_coleta')
+def coletas_imagens_zip():
+    filtradas = _consulta_filtrada(Coleta, FACETAS_COLETA).with_entities(Coleta.id)
+    return _pacote_imagens(ImagemColeta, ImagemColeta.coleta_id, Coleta, Coleta.id.in_(filtradas.statement),
+                           'imagens-coletas')
+
+@app.route('/isolados/imagens.zip')
+@_api_condicional('isolado', 'imagem_isolado')
+def isolados_imagens_zip():
+    filtrados = _consulta_filtrada(Isolado, FACETAS_ISOLADO).with_entities(Isolado.id)
+    return _pacote_imagens(ImagemIsolado, ImagemIsolado.isolado_id, Isolado, Isolado.id.in_(filtrados.statement),
+                           'imagens-isolados')
+
+# Cadastro em lote (/api/lote), na ordem em que os registros são criados
+TIPOS_LOTE = ('coletas', 'isolados', 'repiques')
+
+def _codigos_em_uso(modelo, itens):
+    """{índice: erro} dos itens cujo código repete outro do lote ou já está cadastrado"""
+    codigos = [_campo_texto(item, 'codigo') for item in itens]
+    existentes = set(db.session.scalars(
+        db.select(modelo.codigo).where(modelo.codigo.in_({codigo for codigo in codigos if codigo}))))
+    erros, vistos = {}, set()
+    for indice, codigo in enumerate(codigos):
+        if codigo in existentes:
+            erros[indice] = f'Código {codigo} já cadastrado.'
+        elif codigo and codigo in vistos:
+            erros[indice] = f'Código {codigo} repetido no lote.'
+        vistos.add(codigo)
+    return erros
+
+def _referencias_lote(modelo, itens, prefixo, *colunas):
+    """
+    Registros de `modelo` citados pelos itens em `<prefixo>_id` ou
+    `<prefixo>_codigo`, lidos em uma consulta: ({id: registro}, {codigo: registro})
+    """
+    ids, codigos = set(), set()
+    for item in itens:
+        try:
+            ids.add(int(item[f'{prefixo}_id']))
+        except (KeyError, TypeError, ValueError):
+            pass
+        if item.get(f'{prefixo}_codigo'):
+            codigos.add(str(item[f'{prefixo}_codigo']))
+    registros = db.session.scalars(
+        db.select(modelo).options(db.load_only(modelo.id, modelo.codigo, *colunas))
+        .where(db.or_(modelo.id.in_(ids), modelo.codigo.in_(codigos)))).all()
+    return {r.id: r for r in registros}, {r.codigo: r for r in registros}
+
+def _resolver_codigo(item, prefixo, por_codigo, mensagem):
+    """Troca `<prefixo>_codigo` pelo `<prefixo>_id` do registro citado"""
+    codigo = item.get(f'{prefixo}_codigo')
+    if not codigo:
+        return item
+    registro = por_codigo.get(str(codigo))
+    if registro is None:
+        raise ValueError(mensagem.format(codigo))
+    return {**item, f'{prefixo}_id': registro.id}
+
+@app.route('/api/lote', methods=['POST'])
+def api_lote():
+    """
+    Cadastro em lote, em uma única transação: {"coletas": [...],
+    "isolados": [...], "repiques": [...]} com os campos dos formulários e as
+    mesmas regras. Isolados citam a coleta por `coleta_id` ou
+    `coleta_codigo` e repiques o isolado por `isolado_id` ou
+    `isolado_codigo`, inclusive registros do mesmo lote. Se algum item for
+    inválido nada é gravado e a resposta lista os erros por item.
+    """
+    dados = request.get_json(silent=True)
+    if not isinstance(dados, dict):
+        return jsonify({'erro': 'Envie um objeto JSON com as listas coletas, isolados e/ou repiques'}), 400
+    listas = {tipo: dados.get(tipo) or [] for tipo in TIPOS_LOTE}
+    if not all(isinstance(itens, list) and all(isinstance(item, dict) for item in itens)
+               for itens in listas.values()):
+        return jsonify({'erro': 'coletas, isolados e repiques devem ser listas de objetos'}), 400
+    quantidade = sum(len(itens) for itens in listas.values())
+    if not quantidade:
+        return jsonify({'erro': 'Nenhum registro enviado'}), 400
+    if quantidade > app.config['BATCH_MAX_ITEMS']:
+        return jsonify({'erro': f"No máximo {app.config['BATCH_MAX_ITEMS']} registros por lote"}), 400
+
+    erros, criados = [], {}
+
+    def criar(tipo, modelo, montar, com_codigo=True):
+        # Valida todos os itens e insere os válidos de uma vez (um flush por tipo)
+        repetidos = _codigos_em_uso(modelo, listas[tipo]) if com_codigo else {}
+        objetos = []
+        for indice, item in enumerate(listas[tipo]):
+            try:
+                if indice in repetidos:
+                    raise ValueError(repetidos[indice])
+                objetos.append(modelo(**montar(item)))
+            except (ValueError, TypeError) as e:
+                erros.append({'tipo': tipo, 'indice': indice, 'erro': str(e)})
+        db.session.add_all(objetos)
+        db.session.flush()
+        criados[tipo] = objetos
+
+    try:
+        criar('coletas', Coleta, _valores_coleta)
+
+        coletas_por_id, coletas_por_codigo = _referencias_lote(
+            Coleta, listas['isolados'], 'coleta', Coleta.nome_cientifico)
+        criar('isolados', Isolado, lambda item: _valores_isolado(
+            _resolver_codigo(item, 'coleta', coletas_por_codigo, 'Coleta {} não encontrada.'), coletas_por_id.get))
+
+        isolados_por_id, isolados_por_codigo = _referencias_lote(Isolado, listas['repiques'], 'isolado')
+
+        def montar_repique(item):
+            item = _resolver_codigo(item, 'isolado', isolados_por_codigo, 'Isolado {} não encontrado.')
+            try:
+                isolado_id = int(item.get('isolado_id'))
+            except (TypeError, ValueError):
+                raise ValueError('Informe o isolado do repique (isolado_id ou isolado_codigo).')
+            if isolado_id not in isolados_por_id:
+                raise ValueError('Isolado não encontrado.')
+            return dict(isolado_id=isolado_id, **_valores_repique(item))
+        criar('repiques', Repique, montar_repique, com_codigo=False)
+    except IntegrityError as e:
+        db.session.rollback()
+        return jsonify({'erro': f'Conflito ao gravar o lote: {e.orig}'}), 400
+
+    if erros:
+        db.session.rollback()
+        return jsonify({'erro': f'{len(erros)} registro(s) inválido(s); nada foi gravado', 'erros': erros}), 400
+
+    # Lidos antes do commit, que expira os objetos
+    resposta = {tipo: [objeto.id for objeto in criados[tipo]] for tipo in TIPOS_LOTE}
+    avisos = [{'tipo': 'coletas', 'indice': indice, 'aviso': AVISO_COORDENADAS}
+              for indice, coleta in enumerate(criados['coletas'])
+              if coleta.coordenadas and coleta.latitude is None]
+    if avisos:
+        resposta['avisos'] = avisos
+    db.session.commit()
+    return jsonify(resposta), 201
+
+# Importação de planilhas: uma transação para o arquivo inteiro, com as
+# linhas validadas e inseridas em lotes (ver importacao.py)
+def _inserir_em_massa(modelo, linhas):
+    """
+    INSERT em massa (executemany), sem a unidade de trabalho do ORM. Os
+    efeitos dos eventos de flush são aplicados aqui: estatísticas, versões
+    das tabelas e, no commit, as versões das páginas e os caches.
+    """
+    tabela = modelo.__table__
+    db.session.execute(tabela.insert(), linhas)
+    conexao = db.session.connection()
+    estatisticas.somar_insercoes(conexao, tabela.name, linhas)
+    _registrar_versoes_banco(db.session, condicional.avancar_versoes(conexao, [tabela.name]))
+    invalidar_totais()
+    chaves = {(tabela.name,)}
+    for fk in tabela.foreign_keys:
+        chaves.update((fk.column.table.name, linha[fk.parent.name])
+                      for linha in linhas if linha.get(fk.parent.name) is not None)
+    db.session.info.setdefault('tabelas_alteradas', set()).add(tabela.name)
+    db.session.info.setdefault('versoes_alteradas', set()).update(chaves)
+
+def _montar_coleta_importada(dados):
+    valores = _valores_coleta(dados)
+    valores['latitude'], valores['longitude'] = interpretar_coordenadas(valores['coordenadas']) or (None, None)
+    return valores
+
+IMPORTACOES = {'coletas': Coleta, 'isolados': Isolado}
+
+def _importar(tipo, linhas, simular=False):
+    """
+    Valida as `linhas` [(número, dados)] com as regras dos formulários e
+    insere em lotes. Com erros (ou `simular`), a transação é desfeita e
+    nada é gravado. Retorna o relatório.
+    """
+    modelo = IMPORTACOES[tipo]
+    relatorio = {'tipo': tipo, 'simulacao': simular, 'linhas': 0, 'importados': 0,
+                 'total_erros': 0, 'erros': [], 'avisos': []}
+
+    def registrar(lista, numero, mensagem):
+        if len(relatorio[lista]) < MAXIMO_ERROS:
+            relatorio[lista].append({'linha': numero, 'mensagem': mensagem})
+
+    try:
+        for lote in em_lotes(linhas):
+            itens = [dados for _, dados in lote]
+            repetidos = _codigos_em_uso(modelo, itens)
+            if modelo is Isolado:
+                # Coletas citadas no lote, por id ou código, em uma consulta
+                coletas_por_id, coletas_por_codigo = _referencias_lote(
+                    Coleta, itens, 'coleta', Coleta.nome_cientifico)
+                montar = lambda dados: _valores_isolado(
+                    _resolver_codigo(dados, 'coleta', coletas_por_codigo, 'Coleta {} não encontrada.'),
+                    coletas_por_id.get)
+            else:
+                montar = _montar_coleta_importada
+
+            validas = []
+            for indice, (numero, dados) in enumerate(lote):
+                try:
+                    if indice in repetidos:
+                        raise ValueError(repetidos[indice])
+                    valores = montar(dados)
+                except (ValueError, TypeError) as e:
+                    relatorio['total_erros'] += 1
+                    registrar('erros', numero, str(e))
+                    continue
+                if modelo is Coleta and valores['coordenadas'] and valores['latitude'] is None:
+                    registrar('avisos', numero, AVISO_COORDENADAS)
+                validas.append(valores)
+
+            relatorio['linhas'] += len(lote)
+            # Mesmo com erros as linhas válidas são inseridas: os códigos dos
+            # próximos lotes são conferidos contra elas; o rollback desfaz tudo
+            if validas:
+                _inserir_em_massa(modelo, validas)
+                relatorio['importados'] += len(validas)
+    except IntegrityError as e:
+        relatorio['total_erros'] += 1
+        relatorio['erros'].append({'linha': None, 'mensagem': f'Conflito ao gravar: {e.orig}'})
+    except Exception:
+        db.session.rollback()
+        raise
+
+    if relatorio['total_erros'] or simular:
+        db.session.rollback()
+        if relatorio['total_erros']:
+            relatorio['importados'] = 0
+    else:
+        db.session.commit()
+    return relatorio
+
+@app.route('/api/importar/<tipo>', methods=['POST'])
+def api_importar(tipo):
+    """
+    Importa o arquivo `arquivo` (CSV ou XLSX, colunas com os campos dos
+    formulários). `simular=1` valida tudo e devolve o relatório sem gravar.
+    """
+    if tipo not in IMPORTACOES:
+        abort(404)
+    arquivo = request.files.get('arquivo')
+    if not arquivo or not arquivo.filename:
+        return jsonify({'erro': 'Envie a planilha no campo arquivo'}), 400
+    try:
+        formato = formato_do_arquivo(arquivo.filename)
+    except ValueError as e:
+        return jsonify({'erro': str(e)}), 400
+
+    try:
+        relatorio = _importar(tipo, ler_planilha(arquivo.stream, formato),
+                              simular=request.args.get('simular') == '1')
+    except ValueError as e:
+        return jsonify({'erro': str(e)}), 400
+    if relatorio['total_erros']:
+        return jsonify({'erro': f"{relatorio['total_erros']} linha(s) com erro; nada foi gravado",
+                        **relatorio}), 400
+    return jsonify(relatorio)
+
+# Uploads retomáveis: cria a sessão, envia as partes (em qualquer ordem, em
+# paralelo, repetindo as que falharem) e conclui anexando a imagem ao registro
+DESTINOS_UPLOAD = {
+    'coleta_id': (Coleta, ImagemColeta, 'Coleta {} não encontrada.'),
+    'isolado_id': (Isolado, ImagemIsolado, 'Isolado {} não encontrado.'),
+}
+
+def _sha256_valido(valor):
+    return isinstance(valor, str) and len(valor) == 64 and all(c in '0123456789abcdefABCDEF' for c in valor)
+
+def _sessao_upload_ou_404(id):
+    sessao = db.session.get(SessaoUpload, id)
+    if sessao is None:
+        abort(make_response(jsonify({'erro': 'Sessão de upload não encontrada ou expirada'}), 404))
+    return sessao
+
+def _serializar_sessao_upload(sessao):
+    recebidas = set(db.session.scalars(db.select(ParteUpload.indice).where(ParteUpload.sessao_id == sessao.id)))
+    total = total_partes(sessao.tamanho, sessao.tamanho_parte)
+    return {
+        'id': sessao.id,
+        'nome_original': sessao.nome_original,
+        'tamanho': sessao.tamanho,
+        'tamanho_parte': sessao.tamanho_parte,
+        'total_partes': total,
+        'partes_recebidas': len(recebidas),
+        'partes_faltando': [indice for indice in range(total) if indice not in recebidas],
+    }
+
+@app.route('/api/uploads', methods=['POST'])
+def api_criar_upload():
+    """
+    Abre uma sessão: {"nome": "IMG_0001.tif", "tamanho": bytes, "sha256":
+    opcional, "tamanho_parte": opcional}. A resposta traz o id, o tamanho
+    das partes e a lista de partes a enviar.
+    """
+    dados = request.get_json(silent=True)
+    if not isinstance(dados, dict):
+        return jsonify({'erro': 'Envie um objeto JSON com nome e tamanho do arquivo'}), 400
+    nome = secure_filename(str(dados.get('nome') or ''))
+    if not nome:
+        return jsonify({'erro': 'Informe o nome do arquivo'}), 400
+    tamanho = dados.get('tamanho')
+    maximo = app.config['UPLOAD_MAX_SIZE']
+    if not isinstance(tamanho, int) or isinstance(tamanho, bool) or not 0 < tamanho <= maximo:
+        return jsonify({'erro': f'O tamanho deve ser um inteiro entre 1 e {maximo} bytes'}), 400
+    if dados.get('sha256') is not None and not _sha256_valido(dados['sha256']):
+        return jsonify({'erro': 'sha256 deve ter 64 dígitos hexadecimais'}), 400
+    # Cada parte é uma requisição: não pode passar de MAX_CONTENT_LENGTH
+    tamanho_parte = min(app.config['UPLOAD_CHUNK_SIZE'], app.config['MAX_CONTENT_LENGTH'])
+    if isinstance(dados.get('tamanho_parte'), int):
+        tamanho_parte = max(TAMANHO_PARTE_MINIMO, min(dados['tamanho_parte'], tamanho_parte))
+
+    sessao = SessaoUpload(id=novo_identificador(), nome_original=nome, tamanho=tamanho,
+                          tamanho_parte=tamanho_parte, sha256=(dados.get('sha256') or '').lower() or None)
+    criar_parcial(app.config['UPLOAD_FOLDER'], sessao.id, tamanho)
+    db.session.add(sessao)
+    db.session.commit()
+    resposta = jsonify(_serializar_sessao_upload(sessao))
+    resposta.headers['Location'] = url_for('api_upload', id=sessao.id)
+    return resposta, 201
+
+@app.route('/api/uploads/<id>')
+def api_upload(id):
+    """Estado da sessão: depois de uma queda, o cliente envia só `partes_faltando`"""
+    return jsonify(_serializar_sessao_upload(_sessao_upload_ou_404(id)))
+
+@app.route('/api/uploads/<id>/partes/<int:indice>', methods=['PUT'])
+def api_enviar_parte(id, indice):
+    """
+    Corpo: os bytes da parte `indice` (a partir de 0); cabeçalho
+    X-Checksum-SHA256 com o SHA-256 da parte. Reenviar uma parte a substitui.
+    """
+    sessao = _sessao_upload_ou_404(id)
+    total = total_partes(sessao.tamanho, sessao.tamanho_parte)
+    if not 0 <= indice < total:
+        return jsonify({'erro': f'Parte inválida: use de 0 a {total - 1}'}), 400
+    sha256 = request.headers.get('X-Checksum-SHA256', '')
+    if not _sha256_valido(sha256):
+        return jsonify({'erro': 'Informe o SHA-256 da parte no cabeçalho X-Checksum-SHA256'}), 400
+
+    try:
+        gravar_parte(app.config['UPLOAD_FOLDER'], sessao.id, indice * sessao.tamanho_parte,
+                     tamanho_da_parte(sessao.tamanho, sessao.tamanho_parte, indice), request.stream, sha256)
+    except FileNotFoundError:
+        return jsonify({'erro': 'Sessão de upload expirada; inicie uma nova'}), 404
+    except ValueError as e:
+        # Os bytes já gravados nessa posição não valem mais: a parte volta a faltar
+        db.session.execute(db.delete(ParteUpload).where(ParteUpload.sessao_id == sessao.id,
+                                                        ParteUpload.indice == indice))
+        db.session.commit()
+        return jsonify({'erro': str(e)}), 400
+
+    parte = db.session.scalar(db.select(ParteUpload).filter_by(sessao_id=sessao.id, indice=indice))
+    if parte is None:
+        parte = ParteUpload(sessao_id=sessao.id, indice=indice)
+        db.session.add(parte)
+    parte.sha256 = sha256.lower()
+    sessao.data_atualizacao = datetime.utcnow()
+    db.session.commit()
+    return jsonify(_serializar_sessao_upload(sessao))
+
+@app.route('/api/uploads/<id>/concluir', methods=['POST'])
+def api_concluir_upload(id):
+    """
+    Com todas as partes recebidas, anexa o arquivo como imagem: {"coleta_id":
+    ...} ou {"isolado_id": ...}, e "descricao" opcional.
+    """
+    sessao = _sessao_upload_ou_404(id)
+    dados = request.get_json(silent=True)
+    if not isinstance(dados, dict):
+        return jsonify({'erro': 'Envie um objeto JSON com coleta_id ou isolado_id'}), 400
+    destinos = [campo for campo in DESTINOS_UPLOAD if dados.get(campo) is not None]
+    if len(destinos) != 1:
+        return jsonify({'erro': 'Informe coleta_id ou isolado_id (apenas um)'}), 400
+    campo = destinos[0]
+    modelo, modelo_imagem, mensagem = DESTINOS_UPLOAD[campo]
+    try:
+        registro_id = int(dados[campo])
+    except (TypeError, ValueError):
+        return jsonify({'erro': f'{campo} inválido'}), 400
+    if db.session.get(modelo, registro_id) is None:
+        return jsonify({'erro': mensagem.format(registro_id)}), 400
+    estado = _serializar_sessao_upload(sessao)
+    if estado['partes_faltando']:
+        return jsonify({'erro': f"Faltam {len(estado['partes_faltando'])} parte(s)", **estado}), 400
+
+    pasta = app.config['UPLOAD_FOLDER']
+    try:
+        salvo = concluir_parcial(db.session, pasta, sessao.id, sessao.nome_original, sessao.sha256)
+    except FileNotFoundError:
+        return jsonify({'erro': 'Sessão de upload expirada; inicie uma nova'}), 404
+    except ValueError as e:
+        return jsonify({'erro': str(e)}), 400
+    try:
+        imagem = modelo_imagem(nome_arquivo=salvo.caminho, nome_original=sessao.nome_original,
+                               descricao=_campo_texto(dados, 'descricao'), **{campo: registro_id})
+        db.session.add(imagem)
+        if salvo.novo:
+            enfileirar('rendicoes', nome_arquivo=salvo.caminho)
+        _enfileirar_exif([imagem])
+        db.session.delete(sessao)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        descartar_nao_registrados(db.session, [salvo], pasta)
+        raise
+    return jsonify({'id': imagem.id, 'nome_arquivo': salvo.caminho, 'sha256': salvo.sha256,
+                    'tamanho': salvo.tamanho}), 201
+
+@app.route('/api/uploads/<id>', methods=['DELETE'])
+def api_cancelar_upload(id):
+    sessao = _sessao_upload_ou_404(id)
+    db.session.delete(sessao)
+    db.session.commit()
+    descartar_parcial(app.config['UPLOAD_FOLDER'], sessao.id)
+    return '', 204
+
+# Estado das tarefas em segundo plano
+def _serializar_tarefa(t):
+    return {
+        'id': t.id,
+        'tipo': t.tipo,
+        'parametros': t.parametros,
+        'estado': t.estado,
+        'tentativas': t.tentativas,
+        'max_tentativas': t.max_tentativas,
+        'erro': t.erro,
+        'resultado': t.resultado,
+        'disponivel_em': t.disponivel_em.isoformat() if t.disponivel_em else None,
+        'data_cadastro': t.data_cadastro.isoformat() if t.data_cadastro else None,
+        'data_inicio': t.data_inicio.isoformat() if t.data_inicio else None,
+        'data_fim': t.data_fim.isoformat() if t.data_fim else None,
+    }
+
+@app.route('/api/tarefas/<int:id>')
+def api_tarefa(id):
+    return jsonify(_serializar_tarefa(Tarefa.query.get_or_404(id)))
+
+@app.route('/api/tarefas')
+def api_tarefas():
+    query = Tarefa.query
+    estado = request.args.get('estado')
+    if estado:
+        if estado not in ESTADOS:
+            return jsonify({'erro': f"Estado inválido. Use: {', '.join(ESTADOS)}"}), 400
+        query = query.filter(Tarefa.estado == estado)
+    tipo = request.args.get('tipo')
+    if tipo:
+        query = query.filter(Tarefa.tipo == tipo)
+    limite = min(max(request.args.get('limite', 100, type=int), 1), 1000)
+    contagem = dict(db.session.query(Tarefa.estado, db.func.count(Tarefa.id))
+                    .group_by(Tarefa.estado).all())
+    return jsonify({
+        'contagem': {e: contagem.get(e, 0) for e in ESTADOS},
+        'itens': [_serializar_tarefa(t) for t in
+                  query.order_by(Tarefa.id.desc()).limit(limite).all()],
+    })
+
+@app.cli.command('processar-tarefas')
+@click.option('--processos', type=int, default=None, help='Tamanho do pool (padrão: JOB_WORKERS)')
+@click.option('--ate-esvaziar', is_flag=True, help='Sai quando não houver tarefas disponíveis')
+def processar_tarefas(processos, ate_esvaziar):
+    """Executa as tarefas em segundo plano (miniaturas etc.) em um pool de processos"""
+    trabalhador = Trabalhador(
+        db.engine, Tarefa.__table__,
+        pastas={'uploads': os.path.abspath(app.config['UPLOAD_FOLDER']),
+                'rendicoes': os.path.abspath(app.config['RENDITION_FOLDER'])},
+        processos=processos or app.config['JOB_WORKERS'],
+        intervalo=app.config['JOB_POLL_INTERVAL'],
+        atraso=app.config['JOB_RETRY_DELAY'],
+        timeout=app.config['JOB_TIMEOUT'],
+        gravacoes={'exif': _gravar_exif})
+    # Ctrl+C/SIGTERM: para de reservar e espera as tarefas em execução
+    for sinal in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sinal, lambda *_: trabalhador.parar())
+    print(f'✓ Processando tarefas com {trabalhador.processos} processo(s)')
+    processadas = trabalhador.executar(ate_esvaziar=ate_esvaziar)
+    print(f'✓ {processadas} tarefas processadas')
+
+@app.cli.command('extrair-exif')
+@click.option('--processos', type=int, default=None, help='Tamanho do pool (padrão: JOB_WORKERS)')
+@click.option('--todas', is_flag=True, help='Relê também as imagens já processadas')
+def extrair_exif(processos, todas):
+    """Lê o EXIF das imagens enviadas antes da tarefa 'exif', em um pool de processos"""
+    pasta = os.path.abspath(app.config['UPLOAD_FOLDER'])
+    processos = processos or app.config['JOB_WORKERS']
+    lidas = com_gps = 0
+    with ProcessPoolExecutor(max_workers=processos) as pool:
+        for modelo in (ImagemColeta, ImagemIsolado):
+            tabela = modelo.__table__
+            consulta = db.select(tabela.c.id, tabela.c.nome_arquivo).order_by(tabela.c.id)
+            if not todas:
+                consulta = consulta.where(tabela.c.exif_lido.is_(False))
+            linhas = db.session.execute(consulta).all()
+            db.session.rollback()
+            atualizacao = _atualizacao_exif(tabela)
+            caminhos = [os.path.join(pasta, *nome.split('/')) for _, nome in linhas]
+            # Os processos leem os arquivos; só o processo principal grava no banco, em lotes
+            resultados = pool.map(ler_exif, caminhos, chunksize=max(1, min(256, len(caminhos) // (processos * 4))))
+            lote = []
+            for (id, _), valores in zip(linhas, resultados):
+                lote.append({'_id': id, **{f'_{coluna}': valor for coluna, valor in valores.items()}})
+                com_gps += valores['exif_latitude'] is not None
+                if len(lote) == 1000:
+                    with db.engine.begin() as conexao:
+                        conexao.execute(atualizacao, lote)
+                    lote = []
+            with db.engine.begin() as conexao:
+                if lote:
+                    conexao.execute(atualizacao, lote)
+                condicional.avancar_versoes(conexao, [tabela.name])
+            lidas += len(linhas)
+    print(f'✓ EXIF lido de {lidas} imagens ({com_gps} com GPS) com {processos} processo(s)')
+
+@app.cli.command('recalcular-estatisticas')
+def recalcular_estatisticas():
+    """Recalcula do zero os totais e séries mensais da tabela estatistica"""
+    with db.engine.begin() as conexao:
+        estatisticas.recalcular(conexao)
+    print('✓ Estatísticas recalculadas')
+
+@app.cli.command('reindexar-busca')
+def reindexar_busca():
+    """Recria o índice de busca textual a partir das tabelas"""
+    with db.engine.begin() as conexao:
+        criar_indice(conexao, reconstruir=False)
+        reconstruir_indice(conexao)
+    print('✓ Índice de busca reconstruído')
+
+@app.cli.command('reindexar-coordenadas')
+def reindexar_coordenadas():
+    """Reinterpreta o texto das coordenadas e recria o índice espacial"""
+    tabela = Coleta.__table__
+    atualizacao = (tabela.update().where(tabela.c.id == db.bindparam('_id'))
+                   .values(latitude=db.bindparam('_lat'), longitude=db.bindparam('_lon')))
+    reconhecidas = 0
+    with db.engine.begin() as conexao:
+        criar_indice_geo(conexao, reconstruir=False)
+        linhas = conexao.execute(db.select(tabela.c.id, tabela.c.coordenadas)).all()
+        for inicio in range(0, len(linhas), 10_000):
+            lote = []
+            for id, coordenadas in linhas[inicio:inicio + 10_000]:
+                latitude, longitude = interpretar_coordenadas(coordenadas) or (None, None)
+                reconhecidas += latitude is not None
+                lote.append({'_id': id, '_lat': latitude, '_lon': longitude})
+            conexao.execute(atualizacao, lote)
+        reconstruir_indice_geo(conexao)
+        condicional.avancar_versoes(conexao, ['coleta'])
+    print(f'✓ {reconhecidas} de {len(linhas)} coletas com coordenadas reconhecidas')
+
+@app.cli.command('migrar-uploads')
+def migrar_uploads():
+    """Move os uploads antigos (nome com timestamp, na raiz) para o armazenamento por conteúdo"""
+    pasta = app.config['UPLOAD_FOLDER']
+    antigos = db.session.execute(
+        db.select(ArquivoUpload.caminho).where(ArquivoUpload.sha256.is_(None))).scalars().all()
+    migrados = ausentes = 0
+    for caminho in antigos:
+        origem = os.path.join(pasta, caminho)
+        if not os.path.exists(origem):
+            ausentes += 1
+            continue
+        with open(origem, 'rb') as arquivo:
+            salvo = salvar_stream(db.session, arquivo, caminho, pasta)
+        # Os triggers transferem as referências do caminho antigo para o novo.
+        # UPDATE em massa, fora da unidade de trabalho: as versões das tabelas
+        # e das páginas que exibem as imagens avançam aqui
+        chaves = set()
+        for modelo, pai in ((ImagemColeta, 'coleta'), (ImagemIsolado, 'isolado')):
+            chave_pai = getattr(modelo, f'{pai}_id')
+            alteradas = db.session.execute(
+                db.update(modelo).where(modelo.nome_arquivo == caminho)
+                .values(nome_arquivo=salvo.caminho).returning(modelo.id, chave_pai)).all()
+            for id, pai_id in alteradas:
+                chaves.update({(modelo.__tablename__,), (modelo.__tablename__, id), (pai, pai_id)})
+        tabelas = {chave[0] for chave in chaves if len(chave) == 1}
+        condicional.avancar_versoes(db.session.connection(), tabelas)
+        db.session.info.setdefault('tabelas_alteradas', set()).update(tabelas)
+        db.session.info.setdefault('versoes_alteradas', set()).update(chaves)
+        db.session.commit()
+        _remover_arquivos_liberados([caminho])
+        migrados += 1
+    print(f'✓ {migrados} arquivos migrados, {ausentes} ausentes no disco')
+
+@app.cli.command('limpar-uploads')
+def limpar_uploads():
+    """Remove arquivos sem nenhuma imagem associada e temporários abandonados"""
+    liberados = _remover_arquivos_liberados()
+    # Sessões de upload sem partes novas há mais de TEMPORARIO_EXPIRACAO
+    limite = datetime.utcnow() - timedelta(seconds=TEMPORARIO_EXPIRACAO)
+    sessoes = db.session.scalars(db.delete(SessaoUpload).where(SessaoUpload.data_atualizacao < limite)
+                                 .returning(SessaoUpload.id)).all()
+    db.session.commit()
+    for id in sessoes:
+        descartar_parcial(app.config['UPLOAD_FOLDER'], id)
+    temporarios = limpar_temporarios(app.config['UPLOAD_FOLDER'])
+    print(f'✓ {len(liberados)} arquivos sem referência, {len(sessoes)} sessões de upload expiradas '
+          f'e {temporarios} temporários removidos')
+
+@app.cli.command('importar')
+@click.argument('tipo', type=click.Choice(sorted(IMPORTACOES)))
+@click.argument('arquivo', type=click.Path(exists=True, dir_okay=False))
+@click.option('--simular', is_flag=True, help='Valida e mostra o relatório sem gravar')
+def importar(tipo, arquivo, simular):
+    """Importa coletas ou isolados de uma planilha CSV/XLSX"""
+    try:
+        formato = formato_do_arquivo(arquivo)
+    except ValueError as e:
+        raise click.UsageError(str(e))
+    with open(arquivo, 'rb') as entrada:
+        try:
+            relatorio = _importar(tipo, ler_planilha(entrada, formato), simular=simular)
+        except ValueError as e:
+            print(f'✗ {e}')
+            raise SystemExit(1)
+
+    for lista, simbolo in (('erros', '✗'), ('avisos', '!')):
+        for item in relatorio[lista]:
+            print(f"{simbolo} linha {item['linha']}: {item['mensagem']}")
+    if relatorio['total_erros']:
+        print(f"✗ {relatorio['total_erros']} de {relatorio['linhas']} linha(s) com erro; nada foi gravado")
+        raise SystemExit(1)
+    if simular:
+        print(f"✓ {relatorio['linhas']} linha(s) válidas (simulação: nada foi gravado)")
+    else:
+        print(f"✓ {relatorio['importados']} {tipo} importados")
+
+@app.cli.command('exportar-dwca')
+@click.argument('destino', type=click.Path(dir_okay=False, writable=True))
+@click.option('--url-base', default='http://localhost:5000/',
+              help='Endereço público da aplicação, base das URLs das imagens')
+def exportar_dwca(destino, url_base):
+    """Grava o Darwin Core Archive das coletas (para execução agendada)"""
+    temporario = f'{destino}.tmp'
+    with app.test_request_context(base_url=url_base), open(temporario, 'wb') as saida:
+        for dados in zip_em_stream(_entradas_dwca()):
+            saida.write(dados)
+    # O arquivo publicado nunca fica pela metade
+    os.replace(temporario, destino)
+    print(f'✓ Darwin Core Archive gravado em {destino}')
+
+@app.cli.command('verificar-planos')
+def verificar_planos():
+    """Falha se alguma rota crítica fizer leitura completa (SCAN) de tabela"""
+    # As rotas precisam enxergar os registros de teste, que só existem na
+    # transação de escrita desta sessão
+    app.config['SQLITE_READ_ONLY_GET'] = False
+    app.config['PAGE_CACHE'] = False
+
+    # Registros mínimos para as rotas de detalhe; tudo é desfeito no final
+    coleta = Coleta(codigo='__plano__', nome_cientifico='Plano', data_coleta=date.today(), substrato='solo',
+                    coordenadas='-25.4284, -49.2733')
+    db.session.add(coleta)
+    db.session.flush()
+    isolado = Isolado(codigo='__plano__', coleta_id=coleta.id, data_isolamento=date.today())
+    db.session.add(isolado)
+    db.session.flush()
+    experimento = Experimento(titulo='__plano__', coleta_id=coleta.id, isolado_id=isolado.id)
+    db.session.add_all([
+        experimento,
+        Repique(isolado_id=isolado.id, data_repique=date.today()),
+        ImagemColeta(coleta_id=coleta.id, nome_arquivo='__plano__.jpg'),
+        ImagemIsolado(isolado_id=isolado.id, nome_arquivo='__plano__.jpg'),
+    ])
+    db.session.flush()
+
+    cursor = codificar_cursor('depois', datetime.utcnow(), coleta.id)
+    rotas = [
+        '/',
+        '/coletas',
+        f'/coletas?cursor={cursor}',
+        '/coletas?substrato=solo',
+        f'/coletas?substrato=solo&cursor={cursor}',
+        '/coletas?coletor=plano',
+        '/isolados',
+        f'/isolados?cursor={cursor}',
+        '/isolados?meio_cultura=BDA&origem_tipo=coleta',
+        '/experimentos',
+        f'/experimentos?cursor={cursor}',
+        f'/coleta/{coleta.id}',
+        f'/isolado/{isolado.id}',
+        f'/experimento/{experimento.id}',
+        '/api/coletas?limite=10',
+        f'/api/isolados?limite=10&cursor={cursor}',
+        '/api/coletas/sugestoes',
+        '/api/coletas/sugestoes?q=__pla',
+        '/api/coletas/sugestoes?q=lano',
+        '/api/isolados/sugestoes?q=plano',
+        f'/isolado/novo?coleta_id={coleta.id}',
+        f'/isolado/{isolado.id}/editar',
+        f'/experimento/novo?coleta_id={coleta.id}&isolado_id={isolado.id}',
+        f'/experimento/{experimento.id}/editar',
+        f'/coleta/{coleta.id}/imagens.zip',
+        '/coletas/imagens.zip?substrato=solo',
+        '/isolados/imagens.zip?meio_cultura=BDA',
+        '/api/coletas/geo?bbox=-50,-26,-49,-25',
+        '/api/coletas/geo?bbox=-180,-90,180,90&zoom=3',
+        '/api/coletas/geo?lat=-25.4&lon=-49.3&raio_km=20&zoom=10',
+        '/api/changes?since=1&limite=50',
+        '/api/coletas/imagens?tirada_de=2024-03-01&tirada_ate=2024-03-31',
+        '/api/coletas/imagens?gps=1&limite=10',
+        '/api/isolados/imagens?gps=1&tirada_de=2024-03-01',
+        '/api/coletas/sugestoes-exif',
+    ]
+
+    cliente = app.test_client()
+    try:
+        with capturar_consultas(db.engine) as consultas:
+            for rota in rotas:
+                resposta = cliente.get(rota)
+                # Respostas em streaming só consultam o banco quando lidas
+                resposta.get_data()
+                if resposta.status_code != 200:
+                    print(f'✗ {rota} respondeu {resposta.status_code}')
+                    raise SystemExit(1)
+        # versao_tabela tem uma linha por tabela: a leitura completa é o melhor plano
+        problemas = verificar(db.session.connection(), consultas,
+                              set(db.metadata.tables) - {VersaoTabela.__tablename__})
+    finally:
+        db.session.rollback()
+
+    for sql, plano, tabelas in problemas:
+        print(f"✗ Leitura completa de {', '.join(tabelas)}:")
+        print(f'  {sql}')
+        for detalhe in plano:
+            print(f'    {detalhe}')
+    if problemas:
+        raise SystemExit(1)
+    print(f'✓ {len(consultas)} consultas em {len(rotas)} rotas usam índices')
 
 if __name__ == '__main__':
     with app.app_context():
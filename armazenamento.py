@@ -0,0 +1,203 @@
+"""
+Sistema de Bioprospecção de Cogumelos Nativos
+Armazenamento de uploads endereçado por conteúdo (SHA-256) com deduplicação
+"""
+
+import hashlib
+import os
+import time
+import uuid
+from collections import namedtuple
+
+from sqlalchemy import text
+from werkzeug.utils import secure_filename
+
+TAMANHO_BLOCO = 1024 * 1024
+
+# Arquivos temporários abandonados (upload interrompido) são removidos depois disso
+TEMPORARIO_EXPIRACAO = 24 * 60 * 60
+
+PASTA_TEMPORARIA = '.tmp'
+
+ArquivoSalvo = namedtuple('ArquivoSalvo', 'caminho sha256 tamanho nome_original novo')
+
+# Tabelas de imagens cujo nome_arquivo referencia arquivo_upload.caminho
+TABELAS_IMAGEM = ('imagem_coleta', 'imagem_isolado')
+
+
+def _extensao(nome_original):
+    extensao = os.path.splitext(secure_filename(nome_original or ''))[1].lower()
+    return '.jpg' if extensao == '.jpeg' else extensao
+
+
+def caminho_conteudo(sha256, extensao):
+    """Caminho relativo em dois níveis de subpastas: ab/cd/abcd...ext"""
+    return f'{sha256[:2]}/{sha256[2:4]}/{sha256}{extensao}'
+
+
+def salvar_stream(session, stream, nome_original, pasta_uploads):
+    """
+    Copia o stream para disco calculando o SHA-256 durante a cópia. Se o
+    conteúdo já existir, o arquivo novo é descartado e o existente reaproveitado.
+    """
+    pasta_temporaria = os.path.join(pasta_uploads, PASTA_TEMPORARIA)
+    os.makedirs(pasta_temporaria, exist_ok=True)
+    temporario = os.path.join(pasta_temporaria, uuid.uuid4().hex)
+
+    hash_conteudo = hashlib.sha256()
+    tamanho = 0
+    try:
+        with open(temporario, 'wb') as destino:
+            while True:
+                bloco = stream.read(TAMANHO_BLOCO)
+                if not bloco:
+                    break
+                hash_conteudo.update(bloco)
+                destino.write(bloco)
+                tamanho += len(bloco)
+    except Exception:
+        os.remove(temporario)
+        raise
+
+    return armazenar_temporario(session, temporario, hash_conteudo.hexdigest(), tamanho,
+                                nome_original, pasta_uploads)
+
+
+def armazenar_temporario(session, temporario, sha256, tamanho, nome_original, pasta_uploads):
+    """
+    Registra o conteúdo em arquivo_upload e move o arquivo temporário já
+    completo para o caminho do conteúdo; se o conteúdo já existir, o
+    temporário é descartado. O registro vem antes de conferir o disco: ele
+    toma a trava de escrita do banco, e uma liberação concorrente do mesmo
+    conteúdo ou já removeu o arquivo ou espera o commit desta transação
+    (ver remover_do_disco).
+    """
+    caminho = caminho_conteudo(sha256, _extensao(nome_original))
+    absoluto = os.path.join(pasta_uploads, *caminho.split('/'))
+    salvo = ArquivoSalvo(caminho, sha256, tamanho, nome_original, False)
+    registrar_arquivo(session, salvo)
+
+    novo = not os.path.exists(absoluto)
+    if novo:
+        os.makedirs(os.path.dirname(absoluto), exist_ok=True)
+        os.replace(temporario, absoluto)
+    else:
+        os.remove(temporario)
+    return salvo._replace(novo=novo)
+
+
+def salvar_upload(session, arquivo, pasta_uploads):
+    """Salva um FileStorage do formulário (ver salvar_stream)"""
+    return salvar_stream(session, arquivo.stream, arquivo.filename, pasta_uploads)
+
+
+def registrar_arquivo(session, salvo):
+    """
+    Garante a linha em arquivo_upload (sem contar referência: os triggers das
+    tabelas de imagem incrementam `referencias` quando a imagem é inserida).
+    Mesmo sem inserir, o INSERT toma a trava de escrita até o commit.
+    """
+    session.execute(
+        text('INSERT INTO arquivo_upload (caminho, sha256, tamanho, referencias, data_criacao) '
+             'VALUES (:caminho, :sha256, :tamanho, 0, CURRENT_TIMESTAMP) '
+             'ON CONFLICT (caminho) DO NOTHING'),
+        {'caminho': salvo.caminho, 'sha256': salvo.sha256, 'tamanho': salvo.tamanho})
+
+
+def descartar_nao_registrados(session, salvos, pasta_uploads):
+    """
+    Após um rollback, remove os arquivos criados nesta requisição que não
+    chegaram a ser registrados no banco.
+    """
+    for salvo in salvos:
+        if not salvo.novo:
+            continue
+        registrado = session.execute(
+            text('SELECT 1 FROM arquivo_upload WHERE caminho = :caminho'),
+            {'caminho': salvo.caminho}).first()
+        absoluto = os.path.join(pasta_uploads, *salvo.caminho.split('/'))
+        if registrado is None and os.path.exists(absoluto):
+            os.remove(absoluto)
+
+
+def liberar_arquivos(conexao, caminhos=None):
+    """
+    Apaga do banco os arquivos sem nenhuma referência (todos, ou apenas os de
+    `caminhos`) e retorna seus caminhos para remoção do disco.
+    """
+    if caminhos is not None:
+        caminhos = sorted(set(caminhos))
+        if not caminhos:
+            return []
+        liberados = []
+        for inicio in range(0, len(caminhos), 500):
+            lote = caminhos[inicio:inicio + 500]
+            marcadores = ', '.join(f':c{i}' for i in range(len(lote)))
+            resultado = conexao.execute(
+                text(f'DELETE FROM arquivo_upload WHERE referencias <= 0 '
+                     f'AND caminho IN ({marcadores}) RETURNING caminho'),
+                {f'c{i}': caminho for i, caminho in enumerate(lote)})
+            liberados.extend(linha[0] for linha in resultado)
+        return liberados
+    resultado = conexao.execute(
+        text('DELETE FROM arquivo_upload WHERE referencias <= 0 RETURNING caminho'))
+    return [linha[0] for linha in resultado]
+
+
+def remover_do_disco(conexao, caminhos, pasta_uploads, remover_extra=None):
+    """
+    Remove arquivos liberados (e, via `remover_extra`, suas renditions). Roda
+    na transação de liberar_arquivos, antes do commit: com a trava de escrita
+    do DELETE, nenhum upload registra o mesmo conteúdo enquanto os arquivos
+    são apagados. Arquivos que ainda têm linha em arquivo_upload ficam.
+    """
+    caminhos = sorted(set(caminhos))
+    registrados = set()
+    for inicio in range(0, len(caminhos), 500):
+        lote = caminhos[inicio:inicio + 500]
+        marcadores = ', '.join(f':c{i}' for i in range(len(lote)))
+        registrados.update(linha[0] for linha in conexao.execute(
+            text(f'SELECT caminho FROM arquivo_upload WHERE caminho IN ({marcadores})'),
+            {f'c{i}': caminho for i, caminho in enumerate(lote)}))
+    for caminho in caminhos:
+        if caminho in registrados:
+            continue
+        absoluto = os.path.join(pasta_uploads, *caminho.split('/'))
+        if os.path.exists(absoluto):
+            os.remove(absoluto)
+        if remover_extra:
+            remover_extra(caminho)
+
+
+def limpar_temporarios(pasta_uploads):
+    pasta_temporaria = os.path.join(pasta_uploads, PASTA_TEMPORARIA)
+    if not os.path.isdir(pasta_temporaria):
+        return 0
+    limite = time.time() - TEMPORARIO_EXPIRACAO
+    removidos = 0
+    for nome in os.listdir(pasta_temporaria):
+        caminho = os.path.join(pasta_temporaria, nome)
+        if os.path.getmtime(caminho) < limite:
+            os.remove(caminho)
+            removidos += 1
+    return removidos
+
+
+def criar_triggers_referencias(conexao):
+    """Triggers que mantêm arquivo_upload.referencias (idempotente)"""
+    if conexao.dialect.name != 'sqlite':
+        return
+    for tabela in TABELAS_IMAGEM:
+        conexao.execute(text(
+            f'CREATE TRIGGER IF NOT EXISTS {tabela}_ref_ai AFTER INSERT ON {tabela} BEGIN '
+            f'UPDATE arquivo_upload SET referencias = referencias + 1 '
+            f'WHERE caminho = new.nome_arquivo; END'))
+        conexao.execute(text(
+            f'CREATE TRIGGER IF NOT EXISTS {tabela}_ref_ad AFTER DELETE ON {tabela} BEGIN '
+            f'UPDATE arquivo_upload SET referencias = referencias - 1 '
+            f'WHERE caminho = old.nome_arquivo; END'))
+        conexao.execute(text(
+            f'CREATE TRIGGER IF NOT EXISTS {tabela}_ref_au AFTER UPDATE OF nome_arquivo ON {tabela} '
+            f'WHEN old.nome_arquivo IS NOT new.nome_arquivo BEGIN '
+            f'UPDATE arquivo_upload SET referencias = referencias - 1 WHERE caminho = old.nome_arquivo; '
+            f'UPDATE arquivo_upload SET referencias = referencias + 1 WHERE caminho = new.nome_arquivo; END'))
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Mede as rotas mais usadas do sistema pelo cliente de testes do Flask:
+latência (percentis), número de consultas SQL e pico de memória por rota
+
+Uso: python benchmark.py [--repeticoes 30] [--saida resultado.json] [--comparar anterior.json] [--com-cache]
+Gere antes um volume de dados com dados_sinteticos.py.
+"""
+
+import argparse
+import json
+import platform
+import sqlite3
+import statistics
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import event
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from app import app, db, Coleta, Isolado, Repique, Experimento, ImagemColeta, ImagemIsolado
+from paginacao import codificar_cursor
+
+PERCENTIS = (50, 90, 95, 99)
+
+
+def rotas_padrao():
+    """Rotas medidas, com ids e termos escolhidos a partir dos dados do banco"""
+    with app.app_context():
+        coleta = Coleta.query.order_by(Coleta.id).offset(Coleta.query.count() // 2).first()
+        isolado = Isolado.query.order_by(Isolado.id).offset(Isolado.query.count() // 2).first()
+    if coleta is None or isolado is None:
+        sys.exit('✗ Banco sem coletas/isolados. Execute antes: python dados_sinteticos.py 10k')
+
+    termo = (coleta.nome_cientifico or coleta.codigo).split()[0]
+    # Cursor no meio da listagem: o custo não pode depender da profundidade
+    meio = codificar_cursor('depois', coleta.data_cadastro, coleta.id)
+    mes = coleta.data_coleta.replace(day=1).isoformat()
+    return {
+        'index': '/',
+        'coletas': '/coletas',
+        'coletas_profunda': f'/coletas?cursor={meio}',
+        'coletas_substrato': f'/coletas?substrato={coleta.substrato}',
+        'coletas_busca': f'/coletas?search={termo}',
+        'busca': f'/busca?q={termo}',
+        'isolados': '/isolados',
+        'experimentos': '/experimentos',
+        'coleta_detalhe': f'/coleta/{coleta.id}',
+        'isolado_detalhe': f'/isolado/{isolado.id}',
+        'api_coletas': '/api/coletas?limite=100',
+        'api_coletas_profunda': f'/api/coletas?limite=100&cursor={meio}',
+        'api_isolados': '/api/isolados?limite=100',
+        'api_coletas_ndjson': f'/api/coletas?formato=ndjson&data_de={mes}&data_ate={mes[:8]}28',
+        'api_isolados_csv': f'/api/isolados?formato=csv&coleta_id={coleta.id}',
+        'api_geo_brasil': '/api/coletas/geo?bbox=-74,-34,-34,6&zoom=4',
+        'api_geo_raio': f'/api/coletas/geo?lat={coleta.latitude}&lon={coleta.longitude}&raio_km=10&zoom=12',
+        'api_geo_pontos': f'/api/coletas/geo?lat={coleta.latitude}&lon={coleta.longitude}&raio_km=5',
+    }
+
+
+@contextmanager
+def contar_consultas():
+    """Conta as consultas executadas em todos os engines (escrita e leitura)"""
+    contagem = [0]
+
+    def contar(*args):
+        contagem[0] += 1
+
+    with app.app_context():
+        engines = [db.engine, app.extensions.get('engine_leitura')]
+    engines = [engine for engine in engines if engine is not None]
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', contar)
+    try:
+        yield contagem
+    finally:
+        for engine in engines:
+            event.remove(engine, 'before_cursor_execute', contar)
+
+
+def _requisitar(cliente, rota):
+    resposta = cliente.get(rota)
+    # Lê o corpo inteiro: respostas em streaming só executam aqui
+    corpo = resposta.get_data()
+    resposta.close()
+    if resposta.status_code != 200:
+        raise RuntimeError(f'{rota} respondeu {resposta.status_code}')
+    return len(corpo)
+
+
+def _resumo(tempos):
+    ordenados = sorted(tempos)
+    resumo = {
+        'min_ms': ordenados[0],
+        'max_ms': ordenados[-1],
+        'media_ms': statistics.fmean(ordenados),
+    }
+    if len(ordenados) > 1:
+        quantis = statistics.quantiles(ordenados, n=100, method='inclusive')
+        for p in PERCENTIS:
+            resumo[f'p{p}_ms'] = quantis[p - 1]
+    else:
+        for p in PERCENTIS:
+            resumo[f'p{p}_ms'] = ordenados[0]
+    return {chave: round(valor, 3) for chave, valor in resumo.items()}
+
+
+def medir_rota(cliente, rota, repeticoes, aquecimento):
+    for _ in range(aquecimento):
+        _requisitar(cliente, rota)
+
+    # Consultas e memória numa execução separada: tracemalloc distorce os tempos
+    tracemalloc.start()
+    with contar_consultas() as contagem:
+        tamanho = _requisitar(cliente, rota)
+    pico = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        _requisitar(cliente, rota)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+
+    return {
+        'rota': rota,
+        'repeticoes': repeticoes,
+        **_resumo(tempos),
+        'consultas': contagem[0],
+        'pico_memoria_kb': round(pico / 1024, 1),
+        'tamanho_resposta_bytes': tamanho,
+    }
+
+
+def contagens_banco():
+    with app.app_context():
+        return {modelo.__tablename__: db.session.query(db.func.count(modelo.id)).scalar()
+                for modelo in (Coleta, Isolado, Repique, Experimento, ImagemColeta, ImagemIsolado)}
+
+
+def comparar(atual, anterior):
+    print(f"\n📈 Comparação com {anterior['data']} (p50 / p95, ms)")
+    for nome, medida in atual['rotas'].items():
+        antes = anterior['rotas'].get(nome)
+        if not antes:
+            continue
+        deltas = []
+        for chave in ('p50_ms', 'p95_ms'):
+            variacao = (medida[chave] - antes[chave]) / antes[chave] * 100 if antes[chave] else 0
+            deltas.append(f"{antes[chave]:.1f} → {medida[chave]:.1f} ({variacao:+.0f}%)")
+        print(f"   {nome:<24} {'   '.join(deltas)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeticoes', type=int, default=30, help='Medições por rota')
+    parser.add_argument('--aquecimento', type=int, default=3, help='Requisições descartadas por rota')
+    parser.add_argument('--rotas', help='Nomes das rotas separados por vírgula (padrão: todas)')
+    parser.add_argument('--saida', help='Arquivo JSON de resultados (padrão: benchmark_<data>.json)')
+    parser.add_argument('--comparar', help='Resultado JSON anterior para comparação')
+    parser.add_argument('--com-cache', action='store_true',
+                        help='Mantém o cache de páginas (por padrão desligado: mede banco e templates)')
+    args = parser.parse_args()
+
+    # Com o cache de páginas, as medições após o aquecimento seriam só acertos
+    # do cache e não seriam comparáveis com resultados anteriores
+    app.config['PAGE_CACHE'] = args.com_cache
+
+    rotas = rotas_padrao()
+    if args.rotas:
+        pedidas = [nome.strip() for nome in args.rotas.split(',')]
+        desconhecidas = [nome for nome in pedidas if nome not in rotas]
+        if desconhecidas:
+            sys.exit(f"✗ Rotas desconhecidas: {', '.join(desconhecidas)}. Disponíveis: {', '.join(rotas)}")
+        rotas = {nome: rotas[nome] for nome in pedidas}
+
+    resultado = {
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'ambiente': {
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'plataforma': platform.platform(),
+            'banco': app.config['SQLALCHEMY_DATABASE_URI'],
+            'leitura_somente_get': app.config.get('SQLITE_READ_ONLY_GET'),
+            'cache_paginas': app.config['PAGE_CACHE'],
+        },
+        'banco': contagens_banco(),
+        'rotas': {},
+    }
+    print(f"🍄 Benchmark — {', '.join(f'{t}: {n}' for t, n in resultado['banco'].items())}")
+
+    cliente = app.test_client()
+    for nome, rota in rotas.items():
+        medida = medir_rota(cliente, rota, args.repeticoes, args.aquecimento)
+        resultado['rotas'][nome] = medida
+        print(f"   {nome:<24} p50 {medida['p50_ms']:>8.1f} ms   p95 {medida['p95_ms']:>8.1f} ms   "
+              f"{medida['consultas']:>3} consultas   {medida['pico_memoria_kb']:>9.1f} KiB")
+
+    if resource is not None:
+        # ru_maxrss: KiB no Linux
+        resultado['pico_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    saida = args.saida or f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(saida, 'w', encoding='utf-8') as arquivo:
+        json.dump(resultado, arquivo, ensure_ascii=False, indent=2)
+    print(f"\n✓ Resultados salvos em {saida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as arquivo:
+            comparar(resultado, json.load(arquivo))
+
+
+if __name__ == '__main__':
+    main()
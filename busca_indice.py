@@ -0,0 +1,143 @@
+"""
+Sistema de Bioprospecção de Cogumelos Nativos
+Índice de busca textual (SQLite FTS5) para coletas, isolados e experimentos
+"""
+
+import re
+
+from sqlalchemy import Float, Integer, text
+
+# Tabela de origem -> colunas indexadas e peso de cada uma no ranking bm25
+INDICES = {
+    'coleta': [
+        ('codigo', 10.0),
+        ('nome_cientifico', 5.0),
+        ('nome_popular', 4.0),
+        ('local_coleta', 2.0),
+        ('substrato', 2.0),
+        ('coletor', 2.0),
+        ('observacoes', 1.0),
+    ],
+    'isolado': [
+        ('codigo', 10.0),
+        ('especie_nome_cientifico', 5.0),
+        ('meio_cultura', 3.0),
+        ('origem_instituicao', 2.0),
+        ('observacoes', 1.0),
+    ],
+    'experimento': [
+        ('titulo', 10.0),
+        ('objetivo', 3.0),
+        ('resultados', 1.0),
+        ('conclusoes', 1.0),
+    ],
+}
+
+# remove_diacritics 2: "Itajaí", "itajai" e "ITAJAÍ" geram o mesmo token
+TOKENIZADOR = 'unicode61 remove_diacritics 2'
+
+# Índices de trigramas para as sugestões dos formulários: casam qualquer
+# trecho (>= 3 caracteres) do código, da espécie ou da data
+SUGESTOES = {
+    'coleta': ['codigo', 'nome_cientifico', 'data_coleta'],
+    'isolado': ['codigo', 'especie_nome_cientifico', 'data_isolamento'],
+}
+
+TOKENIZADOR_SUGESTOES = 'trigram'
+
+_TERMO = re.compile(r'\w+', re.UNICODE)
+
+
+def _ddl(tabela, fts, colunas, tokenizador):
+    lista = ', '.join(colunas)
+    novos = ', '.join(f'new.{c}' for c in colunas)
+    antigos = ', '.join(f'old.{c}' for c in colunas)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"{lista}, content='{tabela}', content_rowid='id', tokenize='{tokenizador}')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {tabela} BEGIN "
+        f"INSERT INTO {fts}(rowid, {lista}) VALUES (new.id, {novos}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {tabela} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {lista}) VALUES ('delete', old.id, {antigos}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {tabela} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {lista}) VALUES ('delete', old.id, {antigos}); "
+        f"INSERT INTO {fts}(rowid, {lista}) VALUES (new.id, {novos}); END",
+    ]
+
+
+def _indices():
+    """(tabela, tabela FTS5, colunas, tokenizador) de todos os índices"""
+    for tabela, colunas in INDICES.items():
+        yield tabela, f'{tabela}_fts', [coluna for coluna, _ in colunas], TOKENIZADOR
+    for tabela, colunas in SUGESTOES.items():
+        yield tabela, f'{tabela}_trigramas', colunas, TOKENIZADOR_SUGESTOES
+
+
+def criar_indice(conexao, reconstruir=True):
+    """Cria as tabelas FTS5 e os triggers de sincronização (idempotente)"""
+    if conexao.dialect.name != 'sqlite':
+        return
+    for tabela, fts, colunas, tokenizador in _indices():
+        existia = conexao.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :nome"),
+            {'nome': fts}).first() is not None
+        for comando in _ddl(tabela, fts, colunas, tokenizador):
+            conexao.execute(text(comando))
+        if reconstruir and not existia:
+            conexao.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+
+
+def reconstruir_indice(conexao, tabela=None):
+    """Reindexa o conteúdo a partir das tabelas de origem"""
+    for origem, fts, _, _ in _indices():
+        if tabela in (None, origem):
+            conexao.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+
+
+def expressao_busca(termo):
+    """
+    Converte o texto digitado em uma expressão MATCH segura: cada palavra
+    vira um termo entre aspas com busca por prefixo, combinados com AND.
+    Retorna None se não houver palavras pesquisáveis.
+    """
+    palavras = _TERMO.findall(termo or '')
+    if not palavras:
+        return None
+    return ' AND '.join(f'"{palavra}"*' for palavra in palavras)
+
+
+def subconsulta_busca(tabela, termo):
+    """
+    Subconsulta (id, rank) com os registros de `tabela` que casam com `termo`,
+    ordenáveis por relevância (bm25; menor = mais relevante).
+    """
+    expressao = expressao_busca(termo)
+    if expressao is None:
+        return None
+    fts = f'{tabela}_fts'
+    pesos = ', '.join(str(peso) for _, peso in INDICES[tabela])
+    return (
+        text(f'SELECT rowid AS id, bm25({fts}, {pesos}) AS rank '
+             f'FROM {fts} WHERE {fts} MATCH :expressao')
+        .bindparams(expressao=expressao)
+        .columns(id=Integer, rank=Float)
+        .subquery(f'busca_{tabela}')
+    )
+
+
+def subconsulta_sugestao(tabela, termo):
+    """
+    Subconsulta (id, rank) com os registros de `tabela` que contêm `termo`
+    (sem diferenciar maiúsculas) no código, espécie ou data. O índice de
+    trigramas só atende termos de 3 ou mais caracteres; retorna None abaixo disso.
+    """
+    termo = (termo or '').strip()
+    if len(termo) < 3:
+        return None
+    fts = f'{tabela}_trigramas'
+    return (
+        text(f'SELECT rowid AS id, rank FROM {fts} WHERE {fts} MATCH :expressao')
+        .bindparams(expressao='"' + termo.replace('"', '""') + '"')
+        .columns(id=Integer, rank=Float)
+        .subquery(f'sugestao_{tabela}')
+    )
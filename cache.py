@@ -0,0 +1,52 @@
+"""
+Sistema de Bioprospecção de Cogumelos Nativos
+Cache em memória (LRU com validade) para contagens e respostas derivadas
+das tabelas, descartado por tabela quando há escrita
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class CacheLRU:
+    """
+    Dicionário limitado a `maximo` entradas (as menos usadas saem) e com
+    validade de `ttl` segundos. O primeiro item de cada chave (tupla) é a
+    tabela de origem, usada por `invalidar`. Seguro entre threads.
+    """
+
+    def __init__(self, maximo, ttl):
+        self.maximo = maximo
+        self.ttl = ttl
+        self._itens = OrderedDict()
+        self._trava = threading.Lock()
+
+    def obter(self, chave):
+        """Valor em cache ou None se ausente/expirado"""
+        with self._trava:
+            item = self._itens.get(chave)
+            if item is None:
+                return None
+            valor, criado = item
+            if time.monotonic() - criado >= self.ttl:
+                del self._itens[chave]
+                return None
+            self._itens.move_to_end(chave)
+            return valor
+
+    def guardar(self, chave, valor):
+        with self._trava:
+            self._itens[chave] = (valor, time.monotonic())
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.maximo:
+                self._itens.popitem(last=False)
+
+    def invalidar(self, tabelas=None):
+        """Descarta as entradas das tabelas alteradas (todas, se None)"""
+        with self._trava:
+            if tabelas is None:
+                self._itens.clear()
+                return
+            for chave in [chave for chave in self._itens if chave[0] in tabelas]:
+                del self._itens[chave]
@@ -0,0 +1,178 @@
+"""
+Sistema de Bioprospecção de Cogumelos Nativos
+Cache de páginas renderizadas. Cada página guarda as chaves de que depende
+(tabelas e registros exibidos); uma escrita confirmada avança a versão
+dessas chaves e a página deixa de valer. Escritas de outros processos são
+vistas pela tabela versao_tabela (ver condicional.py), conferida a cada
+acerto do cache.
+"""
+
+import threading
+from functools import wraps
+
+from flask import current_app, g, has_app_context, request, session
+from sqlalchemy import inspect
+
+from cache import CacheLRU
+
+# Chave (tabela, TODOS): linhas da tabela removidas em massa pelo banco
+# (exclusão em cascata), sem que se saiba quais
+TODOS = '*'
+
+
+class Versoes:
+    """
+    Versão de cada chave: (tabela,) para a tabela inteira e (tabela, id) para
+    um registro. As versões vêm de uma sequência global: uma página renderizada
+    a partir do instante `inicio` vale enquanto nenhuma de suas chaves tiver
+    versão maior que `inicio`.
+
+    Também acompanha as versões de versao_tabela: as produzidas pelas escritas
+    deste processo já avançaram as chaves dos registros; qualquer outra veio
+    de outro processo e avança a tabela inteira.
+    """
+
+    def __init__(self):
+        self._versoes = {}
+        self._sequencia = 0
+        self._banco = {}
+        self._trava = threading.Lock()
+
+    def atual(self):
+        return self._sequencia
+
+    def maior(self, chaves):
+        versoes = self._versoes
+        return max((versoes.get(chave, 0) for chave in chaves), default=0)
+
+    def avancar(self, chaves):
+        with self._trava:
+            self._sequencia += 1
+            for chave in chaves:
+                self._versoes[chave] = self._sequencia
+
+    def registrar_locais(self, versoes_banco):
+        """
+        Versões de versao_tabela [(tabela, versão)] de uma transação deste
+        processo, após o commit. Só a versão seguinte à conhecida é registrada:
+        uma lacuna é escrita de outro processo e fica para sincronizar().
+        """
+        with self._trava:
+            for tabela, versao in sorted(versoes_banco):
+                if self._banco.get(tabela) == versao - 1:
+                    self._banco[tabela] = versao
+
+    def sincronizar(self, atuais):
+        """
+        Versões atuais de versao_tabela {tabela: versão}. As tabelas com versão
+        maior que a conhecida foram gravadas por outro processo: todas as
+        páginas que dependem delas deixam de valer.
+        """
+        with self._trava:
+            externas = [tabela for tabela, versao in atuais.items() if versao > self._banco.get(tabela, -1)]
+            if not externas:
+                return
+            self._sequencia += 1
+            for tabela in externas:
+                self._banco[tabela] = atuais[tabela]
+                self._versoes[(tabela,)] = self._versoes[(tabela, TODOS)] = self._sequencia
+
+
+def chaves_alteradas(objetos):
+    """
+    Chaves afetadas pela gravação de `objetos` (no after_flush): a tabela, o
+    registro e os registros pais pelas FKs, que listam os filhos
+    """
+    chaves = set()
+    for objeto in objetos:
+        estado = inspect(objeto)
+        tabela = estado.mapper.local_table
+        chaves.add((tabela.name,))
+        chaves.add((tabela.name, objeto.id))
+        for fk in tabela.foreign_keys:
+            atributo = estado.mapper.get_property_by_column(fk.parent).key
+            for valor in estado.attrs[atributo].history.sum():
+                if valor is not None:
+                    chaves.add((fk.column.table.name, valor))
+    return chaves
+
+
+def chaves_em_cascata(tabelas):
+    """Chaves afetadas por linhas de `tabelas` removidas em cascata pelo banco"""
+    return {(tabela,) for tabela in tabelas} | {(tabela, TODOS) for tabela in tabelas}
+
+
+def registrar_carga(objeto):
+    """Evento 'load' do ORM: o registro passa a ser dependência da página em renderização"""
+    if not has_app_context():
+        return
+    dependencias = g.get('dependencias_pagina')
+    if dependencias is not None:
+        tabela = inspect(objeto).mapper.local_table.name
+        dependencias.add((tabela, objeto.id))
+        dependencias.add((tabela, TODOS))
+
+
+class CachePaginas:
+    """
+    Respostas de views GET em um CacheLRU, validadas pelas Versoes.
+    `ler_versoes(tabelas)` retorna as versões atuais de versao_tabela, na
+    ordem pedida (uma consulta por acerto do cache).
+    """
+
+    def __init__(self, maximo, ttl, ler_versoes):
+        self.versoes = Versoes()
+        self._cache = CacheLRU(maximo, ttl)
+        self._ler_versoes = ler_versoes
+
+    def _valida(self, inicio, dependencias):
+        return self.versoes.maior(dependencias) <= inicio
+
+    def _sincronizar(self, tabelas):
+        self.versoes.sincronizar(dict(zip(tabelas, self._ler_versoes(tabelas))))
+
+    def em_cache(self, *tabelas, registro=None):
+        """
+        Guarda a resposta da view. `tabelas`: dependências de tabela inteira
+        (listagens, totais); `registro`: tabela do registro identificado pelo
+        argumento `id` da rota. Os registros carregados pelo ORM durante a
+        renderização entram como dependências automaticamente. Requisições
+        com mensagens flash pendentes não usam o cache.
+        """
+        def decorador(view):
+            @wraps(view)
+            def view_em_cache(**argumentos):
+                if (not current_app.config['PAGE_CACHE'] or request.method != 'GET'
+                        or '_flashes' in session):
+                    return view(**argumentos)
+
+                chave = ('pagina', request.full_path)
+                guardada = self._cache.obter(chave)
+                if guardada is not None:
+                    self._sincronizar(guardada[2])
+                if guardada is not None and self._valida(guardada[0], guardada[1]):
+                    _, _, _, corpo, mimetype = guardada
+                    resposta = current_app.response_class(corpo, mimetype=mimetype)
+                    resposta.headers['X-Cache'] = 'HIT'
+                    return resposta
+
+                inicio = self.versoes.atual()
+                dependencias = {(tabela,) for tabela in tabelas}
+                if registro:
+                    dependencias.add((registro, argumentos['id']))
+                g.dependencias_pagina = dependencias
+                try:
+                    resposta = current_app.make_response(view(**argumentos))
+                finally:
+                    g.pop('dependencias_pagina', None)
+
+                # Não guarda se alguma dependência mudou durante a renderização
+                if (resposta.status_code == 200 and not resposta.direct_passthrough
+                        and '_flashes' not in session and self._valida(inicio, dependencias)):
+                    tabelas_pagina = tuple(sorted({dependencia[0] for dependencia in dependencias}))
+                    self._cache.guardar(chave, (inicio, frozenset(dependencias), tabelas_pagina,
+                                                resposta.get_data(), resposta.mimetype))
+                resposta.headers['X-Cache'] = 'MISS'
+                return resposta
+            return view_em_cache
+        return decorador
@@ -0,0 +1,56 @@
+"""
+Sistema de Bioprospecção de Cogumelos Nativos
+Exclusões em cascata feitas pelo próprio banco (ON DELETE CASCADE): quais
+linhas descendentes somem junto com os objetos excluídos pela sessão
+"""
+
+from sqlalchemy import inspect, or_, select
+
+
+def _filhas(metadata):
+    """tabela pai -> [(tabela filha, coluna da FK)] das FKs com ON DELETE CASCADE"""
+    filhas = {}
+    for tabela in metadata.tables.values():
+        for fk in tabela.foreign_keys:
+            if (fk.ondelete or '').upper() == 'CASCADE':
+                filhas.setdefault(fk.column.table.name, []).append((tabela, fk.parent))
+    return filhas
+
+
+def descendentes(metadata, excluidos):
+    """
+    {tabela: (Table, condição)} com as linhas que o banco remove em cascata
+    a partir de `excluidos` ({tabela: ids}). As linhas de `excluidos` ficam
+    de fora das condições: quem as excluiu já as conhece.
+    """
+    filhas = _filhas(metadata)
+    condicoes = {}
+
+    def visitar(nome, ids):
+        for filha, coluna in filhas.get(nome, ()):
+            condicoes.setdefault(filha.name, (filha, []))[1].append(coluna.in_(ids))
+            visitar(filha.name, select(filha.c.id).where(coluna.in_(ids)))
+
+    for nome, ids in excluidos.items():
+        visitar(nome, sorted(ids))
+
+    resultado = {}
+    for nome, (tabela, lista) in condicoes.items():
+        condicao = or_(*lista)
+        if excluidos.get(nome):
+            condicao = condicao & tabela.c.id.not_in(sorted(excluidos[nome]))
+        resultado[nome] = (tabela, condicao)
+    return resultado
+
+
+def descendentes_da_sessao(session):
+    """descendentes() dos objetos marcados para exclusão na sessão (antes do flush)"""
+    excluidos = {}
+    metadata = None
+    for objeto in session.deleted:
+        tabela = inspect(objeto).mapper.local_table
+        metadata = tabela.metadata
+        excluidos.setdefault(tabela.name, set()).add(objeto.id)
+    if metadata is None:
+        return {}
+    return descendentes(metadata, excluidos)
@@ -0,0 +1,77 @@
+"""
+Sistema de Bioprospecção de Cogumelos Nativos
+Arquivos ZIP gerados em streaming: cada entrada é escrita aos pedaços e os
+bytes comprimidos são entregues à resposta assim que ficam prontos
+"""
+
+import os
+import time
+import zipfile
+
+# Formatos já comprimidos: gravados sem compressão (ZIP_STORED), pois o
+# deflate só gastaria CPU sem reduzir o tamanho
+JA_COMPRIMIDOS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.heic', '.heif', '.zip', '.gz'}
+
+TAMANHO_BLOCO = 1024 * 1024
+
+
+class _Saida:
+    """
+    Destino do ZipFile sem seek: o zipfile passa a usar descritores de dados
+    depois de cada entrada, e o arquivo nunca precisa estar inteiro na memória
+    """
+
+    def __init__(self):
+        self._partes = []
+        self._posicao = 0
+
+    def write(self, dados):
+        self._partes.append(bytes(dados))
+        self._posicao += len(dados)
+        return len(dados)
+
+    def tell(self):
+        return self._posicao
+
+    def flush(self):
+        pass
+
+    def retirar(self):
+        dados = b''.join(self._partes)
+        self._partes = []
+        return dados
+
+
+def ler_blocos(arquivo):
+    """Conteúdo de um arquivo já aberto em blocos de TAMANHO_BLOCO; fecha o arquivo no final"""
+    with arquivo:
+        while True:
+            bloco = arquivo.read(TAMANHO_BLOCO)
+            if not bloco:
+                break
+            yield bloco
+
+
+def zip_em_stream(entradas, compressao=zipfile.ZIP_DEFLATED):
+    """
+    Gera os bytes de um ZIP com `entradas` [(nome, pedaços em bytes)]. Só
+    os pedaços da entrada atual e o diretório central ficam em memória.
+    Entradas em formatos de JA_COMPRIMIDOS são armazenadas sem compressão.
+    """
+    saida = _Saida()
+    with zipfile.ZipFile(saida, 'w', compression=compressao) as arquivo:
+        for nome, pedacos in entradas:
+            informacoes = zipfile.ZipInfo(nome, date_time=time.localtime()[:6])
+            if os.path.splitext(nome)[1].lower() in JA_COMPRIMIDOS:
+                informacoes.compress_type = zipfile.ZIP_STORED
+            else:
+                informacoes.compress_type = compressao
+            # Tamanho desconhecido de antemão: ZIP64 para entradas acima de 4 GB
+            with arquivo.open(informacoes, 'w', force_zip64=True) as destino:
+                for pedaco in pedacos:
+                    destino.write(pedaco)
+                    dados = saida.retirar()
+                    if dados:
+                        yield dados
+            yield saida.retirar()
+    yield saida.retirar()
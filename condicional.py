@@ -0,0 +1,45 @@
+"""
+Sistema de Bioprospecção de Cogumelos Nativos
+Requisições condicionais: ETag forte e cache imutável para os uploads
+endereçados por conteúdo e ETags da API derivadas das versões das tabelas
+"""
+
+import hashlib
+import re
+
+from sqlalchemy import text
+
+# O conteúdo de ab/cd/<sha256>.ext nunca muda: o próprio SHA-256 é a ETag
+UPLOAD_MAX_AGE = 365 * 24 * 60 * 60
+
+_CAMINHO_CONTEUDO = re.compile(r'^[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})(?:\.\w+)?$')
+
+
+def sha256_do_caminho(caminho):
+    """SHA-256 de um caminho do armazenamento por conteúdo, ou None (uploads antigos)"""
+    encontrado = _CAMINHO_CONTEUDO.match(caminho)
+    return encontrado.group(1) if encontrado else None
+
+
+def avancar_versoes(conexao, tabelas):
+    """
+    Incrementa a versão das tabelas gravadas, na mesma transação da escrita.
+    Retorna as novas versões {tabela: versão}.
+    """
+    incremento = text('INSERT INTO versao_tabela (tabela, versao) VALUES (:tabela, 1) '
+                      'ON CONFLICT (tabela) DO UPDATE SET versao = versao + 1 RETURNING versao')
+    return {tabela: conexao.execute(incremento, {'tabela': tabela}).scalar_one()
+            for tabela in sorted(tabelas)}
+
+
+def versoes(conexao, tabelas):
+    """Versões atuais das tabelas, na ordem pedida (0 se nunca gravada)"""
+    marcadores = ', '.join(f':t{n}' for n in range(len(tabelas)))
+    atuais = dict(conexao.execute(
+        text(f'SELECT tabela, versao FROM versao_tabela WHERE tabela IN ({marcadores})'),
+        {f't{n}': tabela for n, tabela in enumerate(tabelas)}).all())
+    return tuple(atuais.get(tabela, 0) for tabela in tabelas)
+
+
+def etag(*partes):
+    return hashlib.sha256(repr(partes).encode()).hexdigest()[:32]
@@ -6,6 +6,10 @@ Arquivo de configuração
 import os
 from datetime import timedelta
 
+from flask import current_app, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event
+
 class Config:
     """Configuração base da aplicação"""
     
@@ -16,11 +20,45 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///cogumelos.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Ajustes do SQLite aplicados a cada nova conexão
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))  # ms
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))  # bytes
+    SQLITE_CACHE_SIZE = int(os.environ.get('SQLITE_CACHE_SIZE', -64000))  # negativo = KiB
+    # Requisições GET/HEAD usam um pool de conexões somente leitura
+    SQLITE_READ_ONLY_GET = os.environ.get('SQLITE_READ_ONLY_GET', '1') == '1'
+    
     # Configurações de upload
     UPLOAD_FOLDER = 'uploads'
+    RENDITION_FOLDER = 'renditions'
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
-    
+    # Uploads retomáveis (/api/uploads): limite por arquivo e tamanho das partes,
+    # cada uma enviada em uma requisição (até MAX_CONTENT_LENGTH)
+    UPLOAD_MAX_SIZE = int(os.environ.get('UPLOAD_MAX_SIZE', 2 * 1024 * 1024 * 1024))  # bytes
+    UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024))  # bytes
+
+    # Fila de tarefas em segundo plano (processamento de imagens)
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', min(4, os.cpu_count() or 1)))  # processos
+    JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+    JOB_RETRY_DELAY = int(os.environ.get('JOB_RETRY_DELAY', 30))  # s, dobra a cada tentativa
+    JOB_TIMEOUT = int(os.environ.get('JOB_TIMEOUT', 600))  # s até uma tarefa em execução ser retomada
+    JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 1.0))  # s
+
+    # Cache de páginas renderizadas (invalidado pelas escritas deste processo
+    # e, via versao_tabela, pelas de outros workers, do trabalhador e da CLI)
+    PAGE_CACHE = os.environ.get('PAGE_CACHE', '1') == '1'
+    PAGE_CACHE_SIZE = int(os.environ.get('PAGE_CACHE_SIZE', 256))  # páginas
+    PAGE_CACHE_TTL = int(os.environ.get('PAGE_CACHE_TTL', 300))  # s
+
+    # Registros aceitos por requisição em /api/lote
+    BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', 1000))
+
+    # Darwin Core Archive (/api/dwca e `flask exportar-dwca`)
+    DWC_DATASET_TITLE = os.environ.get('DWC_DATASET_TITLE', 'Coleções de cogumelos nativos')
+    DWC_OCCURRENCE_ID_PREFIX = os.environ.get('DWC_OCCURRENCE_ID_PREFIX', '')  # ex.: urn:catalog:UTFPR:COG:
+
     # Configurações de sessão
     PERMANENT_SESSION_LIFETIME = timedelta(hours=24)
     
@@ -50,6 +88,8 @@ class TestingConfig(Config):
     TESTING = True
     DEBUG = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SQLITE_READ_ONLY_GET = False
+    PAGE_CACHE = False
 
 # Dicionário de configurações
 config = {
@@ -63,3 +103,69 @@ def get_config():
     """Retorna a configuração baseada na variável de ambiente"""
     config_name = os.environ.get('FLASK_ENV', 'default')
     return config.get(config_name, config['default'])
+
+
+def pragmas_sqlite(config, somente_leitura=False):
+    """PRAGMAs aplicados às conexões, na ordem de execução"""
+    pragmas = {}
+    if not somente_leitura:
+        # journal_mode é gravado no arquivo e exige conexão de escrita
+        pragmas['journal_mode'] = config['SQLITE_JOURNAL_MODE']
+    pragmas['synchronous'] = config['SQLITE_SYNCHRONOUS']
+    pragmas['busy_timeout'] = config['SQLITE_BUSY_TIMEOUT']
+    pragmas['mmap_size'] = config['SQLITE_MMAP_SIZE']
+    pragmas['cache_size'] = config['SQLITE_CACHE_SIZE']
+    # Exclusões em cascata (ON DELETE CASCADE) são feitas pelo banco
+    pragmas['foreign_keys'] = 'ON'
+    if somente_leitura:
+        pragmas['query_only'] = 'ON'
+    return pragmas
+
+
+def configurar_sqlite(engine, config, somente_leitura=False):
+    """Registra a aplicação dos PRAGMAs em toda conexão nova do engine"""
+    if engine.dialect.name != 'sqlite':
+        return
+    pragmas = pragmas_sqlite(config, somente_leitura)
+
+    @event.listens_for(engine, 'connect')
+    def _aplicar_pragmas(conexao_dbapi, registro):
+        cursor = conexao_dbapi.cursor()
+        for nome, valor in pragmas.items():
+            cursor.execute(f'PRAGMA {nome}={valor}')
+        cursor.close()
+
+
+def criar_engine_leitura(engine, config):
+    """
+    Engine somente leitura apontando para o mesmo arquivo SQLite. Retorna
+    None para bancos em memória ou que não sejam SQLite.
+    """
+    url = engine.url
+    if url.get_backend_name() != 'sqlite' or url.database in (None, '', ':memory:'):
+        return None
+    caminho = os.path.abspath(url.database)
+    leitura = create_engine(f'sqlite:///file:{caminho}?mode=ro&uri=true')
+    configurar_sqlite(leitura, config, somente_leitura=True)
+    return leitura
+
+
+class SessaoRoteada(Session):
+    """
+    Sessão que envia leituras de requisições GET/HEAD para o engine somente
+    leitura (app.extensions['engine_leitura']), liberando o de escrita.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._usar_leitura():
+            return current_app.extensions['engine_leitura']
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _usar_leitura(self):
+        if not has_request_context() or request.method not in ('GET', 'HEAD'):
+            return False
+        if not current_app.config.get('SQLITE_READ_ONLY_GET'):
+            return False
+        if current_app.extensions.get('engine_leitura') is None:
+            return False
+        return not (self._flushing or self.new or self.dirty or self.deleted)
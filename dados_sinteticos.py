@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Gera um volume grande de dados sintéticos (10k, 100k ou 1M coletas) para
+medir o desempenho do sistema com o benchmark.py
+
+Uso: python dados_sinteticos.py 100k [--limpar] [--semente 42]
+Use DATABASE_URL para apontar para um banco separado do de trabalho.
+"""
+
+import argparse
+import random
+import time
+from datetime import date, datetime, timedelta
+
+import condicional
+import estatisticas
+from app import (app, db, Coleta, Isolado, Repique, Experimento, ImagemColeta,
+                 ImagemIsolado, ArquivoUpload, Tarefa)
+
+ESCALAS = {
+    '10k': 10_000,
+    '100k': 100_000,
+    '1m': 1_000_000,
+}
+
+# Quantidades relativas ao número de coletas
+PROPORCOES = {
+    'isolados': 0.5,
+    'repiques_por_isolado': 3,
+    'experimentos': 0.1,
+    'imagens_por_coleta': 2,
+    'imagens_por_isolado': 1,
+}
+
+# Arquivos distintos; as imagens repetem os mesmos arquivos (deduplicação)
+ARQUIVOS_DISTINTOS = 1000
+
+TAMANHO_LOTE = 10_000
+
+ESPECIES = [
+    ('Agaricus bisporus', 'Champignon'), ('Pleurotus ostreatus', 'Shimeji'),
+    ('Lentinula edodes', 'Shiitake'), ('Ganoderma lucidum', 'Reishi'),
+    ('Trametes versicolor', 'Cauda-de-peru'), ('Auricularia auricula-judae', 'Orelha-de-pau'),
+    ('Pycnoporus sanguineus', 'Orelha-de-pau-vermelha'), ('Schizophyllum commune', 'Cogumelo-leque'),
+    ('Amanita muscaria', 'Mata-moscas'), ('Macrolepiota procera', 'Parasol'),
+    ('Coprinus comatus', 'Barba-de-sábio'), ('Oudemansiella canarii', ''),
+    ('Favolus brasiliensis', ''), ('Lentinus crinitus', ''),
+    ('Agaricus subrufescens', 'Cogumelo-do-sol'), ('Pleurotus djamor', 'Shimeji-salmão'),
+]
+LOCAIS = [
+    ('Parque Nacional da Serra do Mar, SP', -23.55, -46.63),
+    ('Fazenda Experimental da UTFPR, PR', -25.43, -49.27),
+    ('Floresta Nacional de Irati, PR', -25.40, -50.60),
+    ('Reserva Biológica do Lami, RS', -30.24, -51.10),
+    ('Parque Estadual do Rio Doce, MG', -19.70, -42.55),
+    ('Floresta da Tijuca, RJ', -22.96, -43.28),
+    ('Reserva Ducke, AM', -2.95, -59.95),
+    ('Chapada dos Veadeiros, GO', -14.10, -47.60),
+]
+SUBSTRATOS = ['solo', 'madeira', 'serrapilheira', 'tronco vivo', 'esterco', 'folhas em decomposição']
+COLETORES = ['Dr. Silva', 'Prof. Santos', 'Dra. Oliveira', 'M.Sc. Costa', 'Prof. Lima',
+             'Dra. Pereira', 'Dr. Almeida', 'Eng. Rocha']
+MEIOS = ['BDA', 'MEA', 'Sabouraud', 'Ágar aveia', 'Serragem', 'Extrato de malte']
+INSTITUICOES = ['Embrapa', 'Fiocruz', 'CBMAI', 'URM', 'Coleção UFSC']
+STATUS = ['Em andamento', 'Concluído', 'Pausado', 'Cancelado']
+FRASES = [
+    'Basidiomas gregários em área de mata atlântica, próximos a troncos em decomposição.',
+    'Chapéu convexo com superfície lisa e margem involuta.',
+    'Lamelas livres, brancas quando jovens, escurecendo com a maturação.',
+    'Coletado após período de chuvas intensas, umidade relativa elevada.',
+    'Esporada obtida em laboratório no mesmo dia da coleta.',
+    'Crescimento micelial vigoroso, sem contaminação aparente.',
+    'Material herborizado e depositado no herbário institucional.',
+]
+
+
+def _texto(aleatorio, minimo=1, maximo=4):
+    return ' '.join(aleatorio.choices(FRASES, k=aleatorio.randint(minimo, maximo)))
+
+
+def _data(aleatorio, inicio=date(2015, 1, 1), dias=3650):
+    return inicio + timedelta(days=aleatorio.randrange(dias))
+
+
+def _inserir(conexao, tabela, linhas, rotulo):
+    """Insere `linhas` (gerador de dicts) em lotes com INSERT ... VALUES do Core"""
+    total = 0
+    inicio = time.perf_counter()
+    lote = []
+    for linha in linhas:
+        lote.append(linha)
+        if len(lote) == TAMANHO_LOTE:
+            conexao.execute(tabela.insert(), lote)
+            total += len(lote)
+            lote = []
+    if lote:
+        conexao.execute(tabela.insert(), lote)
+        total += len(lote)
+    print(f"   • {rotulo}: {total} em {time.perf_counter() - inicio:.1f}s")
+    return total
+
+
+def _proximo_id(conexao, tabela):
+    return (conexao.execute(db.select(db.func.max(tabela.c.id))).scalar() or 0) + 1
+
+
+def gerar(quantidade, semente=42, limpar=False):
+    aleatorio = random.Random(semente)
+    n_isolados = int(quantidade * PROPORCOES['isolados'])
+    n_experimentos = int(quantidade * PROPORCOES['experimentos'])
+    agora = datetime.utcnow()
+
+    with app.app_context():
+        db.create_all()
+        with db.engine.begin() as conexao:
+            if limpar:
+                print("🧹 Limpando dados existentes...")
+                for modelo in (Tarefa, Repique, ImagemIsolado, ImagemColeta, Experimento,
+                               Isolado, Coleta, ArquivoUpload):
+                    conexao.execute(modelo.__table__.delete())
+
+            # IDs explícitos: as chaves estrangeiras são calculadas sem reler o banco
+            id_coleta = _proximo_id(conexao, Coleta.__table__)
+            id_isolado = _proximo_id(conexao, Isolado.__table__)
+            sufixo = f'{semente}-{id_coleta}'
+
+            print(f"📝 Gerando {quantidade} coletas e registros relacionados...")
+            arquivos = [f'{aleatorio.getrandbits(256):064x}' for _ in range(ARQUIVOS_DISTINTOS)]
+            arquivos = [f'{h[:2]}/{h[2:4]}/{h}.jpg' for h in arquivos]
+            _inserir(conexao, ArquivoUpload.__table__, (
+                {'caminho': caminho, 'sha256': caminho[6:70], 'tamanho': aleatorio.randint(200_000, 4_000_000),
+                 'referencias': 0, 'data_criacao': agora}
+                for caminho in arquivos), 'Arquivos')
+
+            def coletas():
+                for i in range(quantidade):
+                    especie, popular = aleatorio.choice(ESPECIES)
+                    local, lat, lon = aleatorio.choice(LOCAIS)
+                    data_coleta = _data(aleatorio)
+                    lat = round(lat + aleatorio.uniform(-0.2, 0.2), 5)
+                    lon = round(lon + aleatorio.uniform(-0.2, 0.2), 5)
+                    yield {
+                        'id': id_coleta + i,
+                        'codigo': f'SIN-{sufixo}-C{i:07d}',
+                        'nome_cientifico': especie,
+                        'nome_popular': popular,
+                        'data_coleta': data_coleta,
+                        'local_coleta': local,
+                        'coordenadas': f'{lat:.5f}, {lon:.5f}',
+                        'latitude': lat,
+                        'longitude': lon,
+                        'substrato': aleatorio.choice(SUBSTRATOS),
+                        'coletor': aleatorio.choice(COLETORES),
+                        'observacoes': _texto(aleatorio),
+                        'data_cadastro': agora - timedelta(minutes=quantidade - i),
+                    }
+            _inserir(conexao, Coleta.__table__, coletas(), 'Coletas')
+
+            def isolados():
+                for i in range(n_isolados):
+                    coleta = id_coleta + aleatorio.randrange(quantidade)
+                    de_coleta = aleatorio.random() < 0.85
+                    yield {
+                        'id': id_isolado + i,
+                        'codigo': f'SIN-{sufixo}-I{i:07d}',
+                        'coleta_id': coleta if de_coleta else None,
+                        'origem_tipo': 'coleta' if de_coleta else aleatorio.choice(['adquirida', 'doada']),
+                        'origem_instituicao': None if de_coleta else aleatorio.choice(INSTITUICOES),
+                        'especie_nome_cientifico': aleatorio.choice(ESPECIES)[0],
+                        'data_isolamento': _data(aleatorio),
+                        'meio_cultura': aleatorio.choice(MEIOS),
+                        'temperatura_incubacao': aleatorio.choice([22.0, 25.0, 28.0, None]),
+                        'observacoes': _texto(aleatorio, 0, 2),
+                        'data_cadastro': agora - timedelta(minutes=n_isolados - i),
+                    }
+            _inserir(conexao, Isolado.__table__, isolados(), 'Isolados')
+
+            def repiques():
+                for i in range(n_isolados):
+                    for _ in range(PROPORCOES['repiques_por_isolado']):
+                        yield {
+                            'isolado_id': id_isolado + i,
+                            'data_repique': _data(aleatorio),
+                            'numero_placas': aleatorio.randint(1, 6),
+                            'meio_cultura': aleatorio.choice(MEIOS),
+                            'observacoes': _texto(aleatorio, 0, 1),
+                            'data_cadastro': agora,
+                        }
+            _inserir(conexao, Repique.__table__, repiques(), 'Repiques')
+
+            def experimentos():
+                for i in range(n_experimentos):
+                    yield {
+                        'titulo': f'Experimento sintético {sufixo}-{i}',
+                        'coleta_id': id_coleta + aleatorio.randrange(quantidade),
+                        'isolado_id': id_isolado + aleatorio.randrange(n_isolados) if n_isolados else None,
+                        'data_inicio': _data(aleatorio),
+                        'objetivo': _texto(aleatorio, 2, 5),
+                        'materiais_metodos': _texto(aleatorio, 4, 10),
+                        'resultados': _texto(aleatorio, 4, 10),
+                        'discussao': _texto(aleatorio, 4, 10),
+                        'conclusoes': _texto(aleatorio, 1, 3),
+                        'status': aleatorio.choice(STATUS),
+                        'data_cadastro': agora - timedelta(minutes=n_experimentos - i),
+                    }
+            _inserir(conexao, Experimento.__table__, experimentos(), 'Experimentos')
+
+            def imagens(chave, primeiro_id, quantidade_pais, por_pai):
+                for i in range(quantidade_pais):
+                    for _ in range(por_pai):
+                        yield {
+                            chave: primeiro_id + i,
+                            'nome_arquivo': aleatorio.choice(arquivos),
+                            'nome_original': f'IMG_{aleatorio.randrange(10**6):06d}.jpg',
+                            'descricao': aleatorio.choice(['Vista superior', 'Vista lateral',
+                                                           'Lamelas', 'Detalhe do estipe', '']),
+                            'data_upload': agora,
+                        }
+            _inserir(conexao, ImagemColeta.__table__,
+                     imagens('coleta_id', id_coleta, quantidade, PROPORCOES['imagens_por_coleta']),
+                     'Imagens de coletas')
+            _inserir(conexao, ImagemIsolado.__table__,
+                     imagens('isolado_id', id_isolado, n_isolados, PROPORCOES['imagens_por_isolado']),
+                     'Imagens de isolados')
+
+        # Inserções pelo Core não passam pelos eventos da sessão
+        with db.engine.begin() as conexao:
+            estatisticas.recalcular(conexao)
+            condicional.avancar_versoes(conexao, [modelo.__tablename__ for modelo in (
+                Coleta, Isolado, Repique, Experimento, ImagemColeta, ImagemIsolado, ArquivoUpload)])
+
+        # Estatísticas do planejador para o volume novo
+        with db.engine.begin() as conexao:
+            if conexao.dialect.name == 'sqlite':
+                conexao.exec_driver_sql('ANALYZE')
+
+    print("\n🎉 Dados sintéticos criados com sucesso!")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('escala', choices=sorted(ESCALAS), help='Quantidade de coletas')
+    parser.add_argument('--limpar', action='store_true', help='Apaga os dados existentes antes')
+    parser.add_argument('--semente', type=int, default=42, help='Semente do gerador aleatório')
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    gerar(ESCALAS[args.escala], args.semente, args.limpar)
+    print(f"⏱️  Tempo total: {time.perf_counter() - inicio:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
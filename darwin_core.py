@@ -0,0 +1,145 @@
+"""
+Sistema de Bioprospecção de Cogumelos Nativos
+Darwin Core Archive (DwC-A) das coletas para publicação em agregadores de
+biodiversidade: occurrence.txt (núcleo), multimedia.txt (extensão Simple
+Multimedia do GBIF, a partir das imagens das coletas), meta.xml e eml.xml
+"""
+
+import mimetypes
+import os
+from datetime import datetime, timezone
+from functools import lru_cache
+from urllib.parse import quote
+from xml.sax.saxutils import escape
+
+from sqlalchemy import String, cast, func, select
+
+from exportacao import ler_em_lotes
+
+DWC = 'http://rs.tdwg.org/dwc/terms/'
+DC = 'http://purl.org/dc/terms/'
+
+# (termo, URI) na ordem das colunas; a coluna 0 é o id (coleta.id)
+TERMOS_OCORRENCIA = [
+    ('occurrenceID', DWC), ('basisOfRecord', DWC), ('catalogNumber', DWC), ('kingdom', DWC),
+    ('scientificName', DWC), ('vernacularName', DWC), ('eventDate', DWC), ('recordedBy', DWC),
+    ('locality', DWC), ('verbatimCoordinates', DWC), ('decimalLatitude', DWC),
+    ('decimalLongitude', DWC), ('geodeticDatum', DWC), ('habitat', DWC), ('occurrenceRemarks', DWC),
+]
+
+TERMOS_MULTIMIDIA = [
+    ('type', DC), ('format', DC), ('identifier', DC), ('title', DC), ('description', DC), ('created', DC),
+]
+
+_META = '''<?xml version="1.0" encoding="UTF-8"?>
+<archive xmlns="http://rs.tdwg.org/dwc/text/" metadata="eml.xml">
+  <core encoding="UTF-8" fieldsTerminatedBy="\\t" linesTerminatedBy="\\n" fieldsEnclosedBy=""
+        ignoreHeaderLines="1" rowType="http://rs.tdwg.org/dwc/terms/Occurrence">
+    <files><location>occurrence.txt</location></files>
+    <id index="0"/>
+{campos_ocorrencia}
+  </core>
+  <extension encoding="UTF-8" fieldsTerminatedBy="\\t" linesTerminatedBy="\\n" fieldsEnclosedBy=""
+             ignoreHeaderLines="1" rowType="http://rs.gbif.org/terms/1.0/Multimedia">
+    <files><location>multimedia.txt</location></files>
+    <coreid index="0"/>
+{campos_multimidia}
+  </extension>
+</archive>
+'''
+
+_EML = '''<?xml version="1.0" encoding="UTF-8"?>
+<eml:eml xmlns:eml="eml://ecoinformatics.org/eml-2.1.1" packageId="{pacote}" system="http://gbif.org"
+         scope="system" xml:lang="pt">
+  <dataset>
+    <title>{titulo}</title>
+    <pubDate>{data}</pubDate>
+    <language>pt</language>
+  </dataset>
+</eml:eml>
+'''
+
+
+def _campos(termos):
+    return '\n'.join(f'    <field index="{indice}" term="{uri}{termo}"/>'
+                     for indice, (termo, uri) in enumerate(termos, start=1))
+
+
+def meta_xml():
+    return _META.format(campos_ocorrencia=_campos(TERMOS_OCORRENCIA),
+                        campos_multimidia=_campos(TERMOS_MULTIMIDIA))
+
+
+def eml_xml(titulo, pacote):
+    return _EML.format(titulo=escape(titulo), pacote=escape(pacote),
+                       data=datetime.now(timezone.utc).date().isoformat())
+
+
+def _texto(coluna):
+    """
+    Coluna como texto, já no banco: sem tabulações e quebras de linha (que
+    separam campos e linhas) e '' para nulos. As linhas chegam prontas
+    para o join, sem conversão valor a valor no Python.
+    """
+    texto = cast(coluna, String)
+    for caractere in ('\t', '\r', '\n'):
+        texto = func.replace(texto, caractere, ' ')
+    return func.coalesce(texto, '')
+
+
+def _data_hora(coluna):
+    return func.replace(_texto(coluna), ' ', 'T')
+
+
+@lru_cache(maxsize=None)
+def _formato(extensao):
+    return mimetypes.guess_type(f'arquivo{extensao}')[0] or ''
+
+
+def _cabecalho(primeira, termos):
+    return ('\t'.join([primeira] + [termo for termo, _ in termos]) + '\n').encode()
+
+
+def _linhas(linhas):
+    return ''.join('\t'.join(linha) + '\n' for linha in linhas).encode()
+
+
+def _ocorrencias(session, coleta, prefixo_id):
+    c = coleta.c
+    consulta = select(*map(_texto, (c.id, c.codigo, c.nome_cientifico, c.nome_popular, c.data_coleta,
+                                    c.coletor, c.local_coleta, c.coordenadas, c.latitude, c.longitude,
+                                    c.substrato, c.observacoes))).order_by(c.id)
+    yield _cabecalho('id', TERMOS_OCORRENCIA)
+    for lote in ler_em_lotes(session, consulta):
+        yield _linhas(
+            (id, prefixo_id + codigo, 'PreservedSpecimen', codigo, 'Fungi', nome_cientifico, nome_popular,
+             data_coleta, coletor, local, coordenadas, latitude, longitude, 'WGS84' if latitude else '',
+             substrato, observacoes)
+            for (id, codigo, nome_cientifico, nome_popular, data_coleta, coletor, local, coordenadas,
+                 latitude, longitude, substrato, observacoes) in lote)
+
+
+def _multimidia(session, imagem, url_uploads):
+    i = imagem.c
+    consulta = select(_texto(i.coleta_id), i.nome_arquivo, _texto(i.nome_original), _texto(i.descricao),
+                      _data_hora(i.data_upload)).order_by(i.coleta_id, i.id)
+    yield _cabecalho('coreid', TERMOS_MULTIMIDIA)
+    for lote in ler_em_lotes(session, consulta):
+        yield _linhas(
+            (coleta_id, 'StillImage', _formato(os.path.splitext(nome_arquivo)[1].lower()),
+             url_uploads + quote(nome_arquivo), nome_original, descricao, data_upload)
+            for coleta_id, nome_arquivo, nome_original, descricao, data_upload in lote)
+
+
+def entradas_dwca(session, coleta, imagem, url_uploads, titulo, prefixo_id=''):
+    """
+    Entradas do ZIP (ver compactacao.zip_em_stream). `url_uploads` é a URL
+    absoluta da pasta de uploads, base dos identificadores das imagens;
+    `prefixo_id` torna o occurrenceID globalmente único (ex.: urn:catalog:UTFPR:COG:).
+    """
+    return [
+        ('meta.xml', [meta_xml().encode()]),
+        ('eml.xml', [eml_xml(titulo, prefixo_id or titulo).encode()]),
+        ('occurrence.txt', _ocorrencias(session, coleta, prefixo_id)),
+        ('multimedia.txt', _multimidia(session, imagem, url_uploads)),
+    ]
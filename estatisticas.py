@@ -0,0 +1,276 @@
+"""
+Sistema de Bioprospecção de Cogumelos Nativos
+Totais e séries mensais agregados (rollup) mantidos a cada flush da sessão
+"""
+
+from collections import Counter
+
+from sqlalchemy import func, inspect, select, text
+
+# Cada linha de uma tabela contribui com +1 para algumas chaves
+# (metrica, periodo, dimensao). periodo é 'AAAA-MM' ou '' para totais globais.
+#
+#   total                   ''       tabela
+#   experimentos_status     ''       status
+#   experimentos_com_inicio ''       ''
+#   isolados_com_temperatura ''      ''
+#   isolados_com_observacoes ''      ''
+#   isolados_com_repiques   ''       ''       (calculado no after_flush)
+#   isolados_meio           ''       meio_cultura
+#   coletas_substrato       AAAA-MM  substrato
+#   coletas_coletor         AAAA-MM  coletor
+
+
+def _chaves_coleta(v):
+    chaves = [('total', '', 'coleta')]
+    if v['data_coleta']:
+        periodo = v['data_coleta'].strftime('%Y-%m')
+        chaves.append(('coletas_substrato', periodo, v['substrato'] or ''))
+        chaves.append(('coletas_coletor', periodo, v['coletor'] or ''))
+    return chaves
+
+
+def _chaves_isolado(v):
+    chaves = [('total', '', 'isolado')]
+    if v['temperatura_incubacao'] is not None:
+        chaves.append(('isolados_com_temperatura', '', ''))
+    if v['observacoes']:
+        chaves.append(('isolados_com_observacoes', '', ''))
+    if v['meio_cultura']:
+        chaves.append(('isolados_meio', '', v['meio_cultura']))
+    return chaves
+
+
+def _chaves_experimento(v):
+    chaves = [('total', '', 'experimento'), ('experimentos_status', '', v['status'] or '')]
+    if v['data_inicio']:
+        chaves.append(('experimentos_com_inicio', '', ''))
+    return chaves
+
+
+# tabela -> (colunas que afetam as chaves, função valores -> chaves)
+REGRAS = {
+    'coleta': (('data_coleta', 'substrato', 'coletor'), _chaves_coleta),
+    'isolado': (('temperatura_incubacao', 'observacoes', 'meio_cultura'), _chaves_isolado),
+    'experimento': (('status', 'data_inicio'), _chaves_experimento),
+    'repique': ((), lambda v: [('total', '', 'repique')]),
+}
+
+_PENDENTES = 'estatisticas_pendentes'
+_COM_REPIQUES = 'estatisticas_isolados_com_repiques'
+
+
+def _valores_novos(objeto, colunas):
+    """Valores de um objeto ainda não inserido, com os defaults das colunas"""
+    tabela = inspect(objeto).mapper.local_table
+    valores = {}
+    for coluna in colunas:
+        valor = getattr(objeto, coluna)
+        default = tabela.c[coluna].default
+        if valor is None and default is not None and default.is_scalar:
+            valor = default.arg
+        valores[coluna] = valor
+    return valores
+
+
+def _valores_no_banco(conexao, tabela, colunas, ids):
+    """Valores atuais (antes do flush) das linhas `ids`"""
+    valores = {}
+    ids = list(ids)
+    for inicio in range(0, len(ids), 500):
+        lote = ids[inicio:inicio + 500]
+        consulta = (tabela.select().with_only_columns(tabela.c.id, *(tabela.c[c] for c in colunas))
+                    .where(tabela.c.id.in_(lote)))
+        for linha in conexao.execute(consulta):
+            valores[linha.id] = dict(linha._mapping)
+    return valores
+
+
+def _isolados_com_repiques(conexao, ids):
+    ids = [id for id in ids if id is not None]
+    if not ids:
+        return set()
+    marcadores = ', '.join(f':i{n}' for n in range(len(ids)))
+    resultado = conexao.execute(
+        text(f'SELECT DISTINCT isolado_id FROM repique WHERE isolado_id IN ({marcadores})'),
+        {f'i{n}': id for n, id in enumerate(ids)})
+    return {linha[0] for linha in resultado}
+
+
+def _descontar_cascata(conexao, cascata, deltas):
+    """
+    Desconta as linhas que o banco vai remover em cascata (ver cascata.py).
+    Elas não passam pela sessão: as contribuições são agregadas no SQL, sem
+    carregar as linhas.
+    """
+    for nome, (tabela, condicao) in cascata.items():
+        if nome not in REGRAS:
+            continue
+        colunas, regra = REGRAS[nome]
+        agrupamento = [tabela.c[coluna] for coluna in colunas]
+        consulta = select(*agrupamento, func.count()).where(condicao).group_by(*agrupamento)
+        for *valores, total in conexao.execute(consulta):
+            for chave in regra(dict(zip(colunas, valores))):
+                deltas[chave] -= total
+
+    if 'isolado' in cascata:
+        isolado, condicao = cascata['isolado']
+        repique = isolado.metadata.tables['repique']
+        com_repiques = conexao.execute(
+            select(func.count(repique.c.isolado_id.distinct()))
+            .where(repique.c.isolado_id.in_(select(isolado.c.id).where(condicao)))).scalar()
+        deltas[('isolados_com_repiques', '', '')] -= com_repiques
+
+
+def preparar(session, cascata=None):
+    """
+    before_flush: calcula as variações das chaves a partir dos objetos novos,
+    alterados e excluídos (e das linhas removidas em `cascata`). Os valores
+    anteriores são lidos do banco, que ainda não recebeu o flush.
+    """
+    deltas = Counter()
+    antigos = {}  # tabela -> ids cujos valores anteriores precisam ser descontados
+
+    for objeto in session.new:
+        tabela = inspect(objeto).mapper.local_table
+        if tabela.name in REGRAS:
+            colunas, regra = REGRAS[tabela.name]
+            for chave in regra(_valores_novos(objeto, colunas)):
+                deltas[chave] += 1
+
+    for objeto in session.dirty:
+        tabela = inspect(objeto).mapper.local_table
+        if tabela.name not in REGRAS:
+            continue
+        colunas, regra = REGRAS[tabela.name]
+        estado = inspect(objeto)
+        if any(estado.attrs[coluna].history.has_changes() for coluna in colunas):
+            antigos.setdefault(tabela, set()).add(objeto.id)
+            for chave in regra({coluna: getattr(objeto, coluna) for coluna in colunas}):
+                deltas[chave] += 1
+
+    for objeto in session.deleted:
+        tabela = inspect(objeto).mapper.local_table
+        if tabela.name in REGRAS:
+            antigos.setdefault(tabela, set()).add(objeto.id)
+
+    if antigos:
+        conexao = session.connection()
+        for tabela, ids in antigos.items():
+            colunas, regra = REGRAS[tabela.name]
+            for valores in _valores_no_banco(conexao, tabela, colunas, ids).values():
+                for chave in regra(valores):
+                    deltas[chave] -= 1
+
+    if cascata:
+        _descontar_cascata(session.connection(), cascata, deltas)
+
+    # Isolados que podem ganhar ou perder o primeiro/último repique
+    afetados = set()
+    for objeto in session.new | session.dirty | session.deleted:
+        tabela = inspect(objeto).mapper.local_table.name
+        if tabela == 'repique':
+            afetados.add(objeto.isolado_id)
+            historico = inspect(objeto).attrs['isolado_id'].history
+            afetados.update(historico.deleted or ())
+        elif tabela == 'isolado' and objeto in session.deleted:
+            afetados.add(objeto.id)
+    afetados.discard(None)
+    antes = _isolados_com_repiques(session.connection(), afetados) if afetados else set()
+
+    session.info[_PENDENTES] = deltas
+    session.info[_COM_REPIQUES] = (afetados, antes, [o for o in session.new
+                                                     if inspect(o).mapper.local_table.name == 'repique'])
+
+
+def aplicar(session):
+    """after_flush: grava as variações preparadas no before_flush"""
+    deltas = session.info.pop(_PENDENTES, None) or Counter()
+    afetados, antes, novos_repiques = session.info.pop(_COM_REPIQUES, (set(), set(), []))
+
+    # IDs de isolados novos só existem depois do INSERT
+    afetados = afetados | {repique.isolado_id for repique in novos_repiques}
+    afetados.discard(None)
+    if afetados:
+        depois = _isolados_com_repiques(session.connection(), afetados)
+        deltas[('isolados_com_repiques', '', '')] += len(depois) - len(antes)
+
+    deltas = {chave: delta for chave, delta in deltas.items() if delta}
+    if deltas:
+        somar(session.connection(), deltas)
+
+
+def somar_insercoes(conexao, nome, linhas):
+    """Contribuições de linhas inseridas fora da sessão (importação em lote)"""
+    if nome not in REGRAS:
+        return
+    colunas, regra = REGRAS[nome]
+    deltas = Counter()
+    for linha in linhas:
+        for chave in regra({coluna: linha.get(coluna) for coluna in colunas}):
+            deltas[chave] += 1
+    if deltas:
+        somar(conexao, deltas)
+
+
+def somar(conexao, deltas):
+    conexao.execute(
+        text('INSERT INTO estatistica (periodo, metrica, dimensao, valor) '
+             'VALUES (:periodo, :metrica, :dimensao, :delta) '
+             'ON CONFLICT (periodo, metrica, dimensao) DO UPDATE SET valor = valor + excluded.valor'),
+        [{'metrica': m, 'periodo': p, 'dimensao': d, 'delta': delta}
+         for (m, p, d), delta in deltas.items()])
+
+
+# Recalculo completo a partir das tabelas (comando recalcular-estatisticas)
+_RECALCULO = [
+    "SELECT 'total', '', 'coleta', COUNT(*) FROM coleta",
+    "SELECT 'total', '', 'isolado', COUNT(*) FROM isolado",
+    "SELECT 'total', '', 'experimento', COUNT(*) FROM experimento",
+    "SELECT 'total', '', 'repique', COUNT(*) FROM repique",
+    "SELECT 'experimentos_status', '', COALESCE(status, ''), COUNT(*) FROM experimento "
+    "GROUP BY COALESCE(status, '')",
+    "SELECT 'experimentos_com_inicio', '', '', COUNT(*) FROM experimento WHERE data_inicio IS NOT NULL",
+    "SELECT 'isolados_com_temperatura', '', '', COUNT(*) FROM isolado WHERE temperatura_incubacao IS NOT NULL",
+    "SELECT 'isolados_com_observacoes', '', '', COUNT(*) FROM isolado "
+    "WHERE observacoes IS NOT NULL AND observacoes != ''",
+    "SELECT 'isolados_com_repiques', '', '', COUNT(DISTINCT isolado_id) FROM repique",
+    "SELECT 'isolados_meio', '', meio_cultura, COUNT(*) FROM isolado "
+    "WHERE meio_cultura IS NOT NULL AND meio_cultura != '' GROUP BY meio_cultura",
+    "SELECT 'coletas_substrato', substr(data_coleta, 1, 7), COALESCE(substrato, ''), COUNT(*) "
+    "FROM coleta WHERE data_coleta IS NOT NULL GROUP BY 2, 3",
+    "SELECT 'coletas_coletor', substr(data_coleta, 1, 7), COALESCE(coletor, ''), COUNT(*) "
+    "FROM coleta WHERE data_coleta IS NOT NULL GROUP BY 2, 3",
+]
+
+
+def recalcular(conexao):
+    conexao.execute(text('DELETE FROM estatistica'))
+    for consulta in _RECALCULO:
+        conexao.execute(text(f'INSERT INTO estatistica (metrica, periodo, dimensao, valor) {consulta}'))
+
+
+def valores(conexao, metrica, periodo=''):
+    """{dimensao: valor} de uma métrica (uma leitura pela chave primária)"""
+    resultado = conexao.execute(
+        text('SELECT dimensao, valor FROM estatistica WHERE metrica = :metrica AND periodo = :periodo'),
+        {'metrica': metrica, 'periodo': periodo})
+    return dict(resultado.all())
+
+
+def resumo(conexao):
+    """Todas as métricas globais (periodo '') como {metrica: {dimensao: valor}}"""
+    resumo = {}
+    for metrica, dimensao, valor in conexao.execute(
+            text("SELECT metrica, dimensao, valor FROM estatistica WHERE periodo = ''")):
+        resumo.setdefault(metrica, {})[dimensao] = valor
+    return resumo
+
+
+def series_mensais(conexao, metrica, desde=None):
+    """[(periodo, dimensao, valor)] de uma métrica mensal, em ordem cronológica"""
+    resultado = conexao.execute(
+        text("SELECT periodo, dimensao, valor FROM estatistica WHERE metrica = :metrica "
+             "AND periodo != '' AND periodo >= :desde AND valor != 0 ORDER BY periodo, dimensao"),
+        {'metrica': metrica, 'desde': desde or ''})
+    return [tuple(linha) for linha in resultado]
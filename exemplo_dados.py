@@ -4,6 +4,7 @@ Script para popular o banco de dados com dados de exemplo
 Execute este script após criar o banco de dados para ter dados para testar
 """
 
+import estatisticas
 from app import app, db, Coleta, Isolado, Repique, Experimento, ImagemColeta, ImagemIsolado
 from datetime import datetime, date
 
@@ -316,6 +317,10 @@ def criar_dados_exemplo():
         db.session.add(experimento3)
         
         db.session.commit()
+        
+        # A limpeza inicial (delete em massa) não passa pelos eventos da sessão
+        with db.engine.begin() as conexao:
+            estatisticas.recalcular(conexao)
         print(f"✅ {3} experimentos criados com sucesso!")
         
         print("\n🎉 Dados de exemplo criados com sucesso!")
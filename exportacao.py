@@ -0,0 +1,89 @@
+"""
+Sistema de Bioprospecção de Cogumelos Nativos
+Exportação em streaming (NDJSON/CSV) lendo o banco em lotes
+"""
+
+import csv
+import io
+import json
+from datetime import date, datetime
+
+from flask import Response, stream_with_context
+
+# Linhas buscadas do cursor por vez; cada lote vira um único pedaço da resposta
+TAMANHO_LOTE = 1000
+
+FORMATOS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def selecionar_campos(disponiveis, pedido):
+    """
+    Resolve o parâmetro `fields` (lista separada por vírgulas) contra o mapa
+    nome -> coluna. Sem pedido, todos os campos. ValueError se houver campo
+    desconhecido.
+    """
+    if not pedido:
+        return list(disponiveis)
+    nomes = [nome.strip() for nome in pedido.split(',') if nome.strip()]
+    invalidos = [nome for nome in nomes if nome not in disponiveis]
+    if invalidos:
+        raise ValueError(
+            f"Campos inválidos: {', '.join(invalidos)}. "
+            f"Disponíveis: {', '.join(disponiveis)}")
+    return nomes
+
+
+def _valor_json(valor):
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    raise TypeError(f'Tipo não serializável: {type(valor).__name__}')
+
+
+def _valor_csv(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    return valor
+
+
+def ler_em_lotes(session, consulta):
+    """Linhas da consulta em lotes de TAMANHO_LOTE, com o cursor aberto no servidor"""
+    resultado = session.execute(consulta, execution_options={'yield_per': TAMANHO_LOTE})
+    try:
+        yield from resultado.partitions()
+    finally:
+        resultado.close()
+
+
+def gerar_ndjson(session, consulta, nomes):
+    for lote in ler_em_lotes(session, consulta):
+        yield ''.join(
+            json.dumps(dict(zip(nomes, linha)), default=_valor_json, ensure_ascii=False) + '\n'
+            for linha in lote)
+
+
+def gerar_csv(session, consulta, nomes):
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(nomes)
+    for lote in ler_em_lotes(session, consulta):
+        escritor.writerows([_valor_csv(valor) for valor in linha] for linha in lote)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def resposta_exportacao(session, consulta, nomes, formato, nome_arquivo):
+    """Response em streaming; a consulta só é executada quando o corpo é lido"""
+    gerador = gerar_ndjson if formato == 'ndjson' else gerar_csv
+    resposta = Response(stream_with_context(gerador(session, consulta, nomes)),
+                        mimetype=FORMATOS[formato])
+    if formato == 'csv':
+        resposta.headers['Content-Disposition'] = f'attachment; filename={nome_arquivo}.csv'
+    return resposta
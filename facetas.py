@@ -0,0 +1,100 @@
+"""
+Sistema de Bioprospecção de Cogumelos Nativos
+Filtros por facetas com contagem de valores em cache
+"""
+
+from sqlalchemy import func
+
+from cache import CacheLRU
+
+# Validade (s) das contagens em cache; escritas na tabela também limpam o cache
+FACETAS_TTL = 300
+
+# Quantidade máxima de combinações de filtros guardadas (as mais antigas saem)
+FACETAS_MAXIMO = 512
+
+# Valores exibidos por faceta, dos mais frequentes para os menos
+VALORES_POR_FACETA = 50
+
+_cache = CacheLRU(FACETAS_MAXIMO, FACETAS_TTL)
+
+
+class Faceta:
+    """
+    Coluna usada como faceta. `filtro(coluna, valor)` monta a condição
+    aplicada quando a faceta está selecionada (padrão: igualdade).
+    """
+
+    def __init__(self, nome, coluna, rotulo, filtro=None):
+        self.nome = nome
+        self.coluna = coluna
+        self.rotulo = rotulo
+        self._filtro = filtro
+
+    def filtro(self, valor):
+        if self._filtro:
+            return self._filtro(self.coluna, valor)
+        return self.coluna == valor
+
+
+class ResultadoFaceta:
+    def __init__(self, faceta, selecionado, valores):
+        self.nome = faceta.nome
+        self.rotulo = faceta.rotulo
+        self.selecionado = selecionado
+        self.valores = valores  # [(valor, total)]
+
+    def para_json(self):
+        return {
+            'nome': self.nome,
+            'rotulo': self.rotulo,
+            'selecionado': self.selecionado or None,
+            'valores': [{'valor': valor, 'total': total} for valor, total in self.valores],
+        }
+
+
+def aplicar_filtros(query, facetas, selecionados):
+    """Aplica à `query` as facetas selecionadas ({nome: valor})"""
+    for faceta in facetas:
+        valor = selecionados.get(faceta.nome)
+        if valor:
+            query = query.filter(faceta.filtro(valor))
+    return query
+
+
+def _contar(query, faceta):
+    total = func.count()
+    return [tuple(linha) for linha in
+            query.order_by(None)
+                 .with_entities(faceta.coluna, total)
+                 .filter(faceta.coluna.isnot(None), faceta.coluna != '')
+                 .group_by(faceta.coluna)
+                 .order_by(total.desc(), faceta.coluna)
+                 .limit(VALORES_POR_FACETA)
+                 .all()]
+
+
+def contar_facetas(entidade, query, facetas, selecionados, chave_extra=()):
+    """
+    Contagem de valores de cada faceta sobre `query` (já com os filtros que
+    não são facetas, identificados por `chave_extra`), considerando as demais
+    facetas selecionadas mas não a própria, para que seja possível trocar de
+    valor. Resultados ficam em cache por entidade e combinação de filtros.
+    """
+    resultados = []
+    for faceta in facetas:
+        outras = tuple(sorted((nome, valor) for nome, valor in selecionados.items()
+                              if valor and nome != faceta.nome))
+        chave = (entidade, faceta.nome, outras, tuple(chave_extra))
+        valores = _cache.obter(chave)
+        if valores is None:
+            filtrada = aplicar_filtros(query, [f for f in facetas if f is not faceta], selecionados)
+            valores = _contar(filtrada, faceta)
+            _cache.guardar(chave, valores)
+        resultados.append(ResultadoFaceta(faceta, selecionados.get(faceta.nome), valores))
+    return resultados
+
+
+def invalidar_facetas(entidades=None):
+    """Descarta as contagens das entidades alteradas (todas, se None)"""
+    _cache.invalidar(entidades)
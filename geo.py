@@ -0,0 +1,223 @@
+"""
+Sistema de Bioprospecção de Cogumelos Nativos
+Coordenadas das coletas: interpretação do texto, índice espacial (SQLite
+R*Tree) e consultas por retângulo, raio e agrupamento por nível de zoom
+"""
+
+import math
+import re
+
+from sqlalchemy import text
+
+# Quilômetros por grau de latitude (raio médio da Terra: 6371 km)
+KM_POR_GRAU = 111.195
+
+RAIO_MAXIMO_KM = 1000
+
+# Lado das células de agrupamento: 1/4 de um tile de 256 px (64 px na tela)
+CELULAS_POR_TILE = 4
+
+ZOOM_MAXIMO = 22
+
+# Graus, minutos e segundos opcionais e hemisfério no final ou no início:
+# "-23.5505", "23°33'01.8\"S", "46° 38.0' O", "S 23° 33'"
+_GRAUS = (r"([+-])?\s*(\d+(?:\.\d+)?)\s*(?:°|º)?\s*"
+          r"(?:(\d+(?:\.\d+)?)\s*(?:'|′)\s*)?"
+          r"(?:(\d+(?:\.\d+)?)\s*(?:\"|″|'')\s*)?")
+_COMPONENTE = re.compile(_GRAUS + r"(?:([NSEWLO])\b)?")
+_COMPONENTE_PREFIXO = re.compile(r"\b([NSEWLO])\s*" + _GRAUS)
+_INICIA_COM_HEMISFERIO = re.compile(r"^[NSEWLO]\s*[\d+-]")
+
+# Hemisférios (L = leste, O = oeste): (eixo, sinal)
+_HEMISFERIOS = {
+    'N': ('lat', 1), 'S': ('lat', -1),
+    'E': ('lon', 1), 'L': ('lon', 1), 'W': ('lon', -1), 'O': ('lon', -1),
+}
+
+
+def interpretar_coordenadas(texto):
+    """
+    Converte o texto livre do campo `coordenadas` em (latitude, longitude)
+    decimais. Aceita graus decimais ("-23.5505, -46.6333"; com vírgula
+    decimal, separados por ";") e graus/minutos/segundos com hemisfério
+    ("23°33'01.8\"S 46°38'00.0\"W"). Retorna None se não reconhecer.
+    """
+    if not texto:
+        return None
+    texto = texto.strip().upper()
+    if ';' in texto:
+        texto = texto.replace(',', '.').replace(';', ' ')
+
+    eixos = {}
+    sem_hemisferio = []
+    if _INICIA_COM_HEMISFERIO.match(texto):
+        componentes = [(sinal, graus, minutos, segundos, hemisferio)
+                       for hemisferio, sinal, graus, minutos, segundos in _COMPONENTE_PREFIXO.findall(texto)]
+    else:
+        componentes = _COMPONENTE.findall(texto)
+    for sinal, graus, minutos, segundos, hemisferio in componentes:
+        minutos = float(minutos or 0)
+        segundos = float(segundos or 0)
+        if minutos >= 60 or segundos >= 60:
+            return None
+        valor = float(graus) + minutos / 60 + segundos / 3600
+        if sinal == '-':
+            valor = -valor
+        if hemisferio:
+            eixo, fator = _HEMISFERIOS[hemisferio]
+            if eixo in eixos:
+                return None
+            eixos[eixo] = fator * abs(valor)
+        else:
+            sem_hemisferio.append(valor)
+
+    # Sem hemisfério, a ordem é latitude, longitude
+    for eixo in ('lat', 'lon'):
+        if eixo not in eixos and sem_hemisferio:
+            eixos[eixo] = sem_hemisferio.pop(0)
+    if sem_hemisferio or len(eixos) != 2:
+        return None
+    latitude, longitude = eixos['lat'], eixos['lon']
+    if abs(latitude) > 90 or abs(longitude) > 180:
+        return None
+    return round(latitude, 6), round(longitude, 6)
+
+
+_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS coleta_geo USING rtree(id, lat_min, lat_max, lon_min, lon_max)",
+    "CREATE TRIGGER IF NOT EXISTS coleta_geo_ai AFTER INSERT ON coleta "
+    "WHEN new.latitude IS NOT NULL AND new.longitude IS NOT NULL BEGIN "
+    "INSERT INTO coleta_geo VALUES (new.id, new.latitude, new.latitude, new.longitude, new.longitude); END",
+    "CREATE TRIGGER IF NOT EXISTS coleta_geo_ad AFTER DELETE ON coleta BEGIN "
+    "DELETE FROM coleta_geo WHERE id = old.id; END",
+    "CREATE TRIGGER IF NOT EXISTS coleta_geo_au AFTER UPDATE OF latitude, longitude ON coleta BEGIN "
+    "DELETE FROM coleta_geo WHERE id = old.id; "
+    "INSERT INTO coleta_geo SELECT new.id, new.latitude, new.latitude, new.longitude, new.longitude "
+    "WHERE new.latitude IS NOT NULL AND new.longitude IS NOT NULL; END",
+]
+
+
+def criar_indice_geo(conexao, reconstruir=True):
+    """Cria a tabela R*Tree e os triggers de sincronização (idempotente)"""
+    if conexao.dialect.name != 'sqlite':
+        return
+    existia = conexao.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'coleta_geo'")).first() is not None
+    for comando in _DDL:
+        conexao.execute(text(comando))
+    if reconstruir and not existia:
+        reconstruir_indice_geo(conexao)
+
+
+def reconstruir_indice_geo(conexao):
+    conexao.execute(text('DELETE FROM coleta_geo'))
+    conexao.execute(text(
+        'INSERT INTO coleta_geo SELECT id, latitude, latitude, longitude, longitude '
+        'FROM coleta WHERE latitude IS NOT NULL AND longitude IS NOT NULL'))
+
+
+class Regiao:
+    """
+    Área consultada: retângulo (oeste, sul, leste, norte) e, opcionalmente,
+    um círculo (latitude, longitude, raio em km) dentro dele.
+    """
+
+    def __init__(self, caixa=None, centro=None, raio_km=None):
+        self.caixas = []
+        if caixa:
+            self.caixas.append(caixa)
+        self.centro = centro
+        self.raio_km = raio_km
+        if centro:
+            self.caixas.append(caixa_do_raio(centro, raio_km))
+
+    def condicoes(self, lat, lon, parametros):
+        """Condições SQL sobre as expressões `lat`/`lon`, preenchendo `parametros`"""
+        condicoes = []
+        for n, (oeste, sul, leste, norte) in enumerate(self.caixas):
+            parametros.update({f'sul{n}': sul, f'norte{n}': norte, f'oeste{n}': oeste, f'leste{n}': leste})
+            condicoes.append(f'{lat} BETWEEN :sul{n} AND :norte{n}')
+            if oeste <= leste:
+                condicoes.append(f'{lon} BETWEEN :oeste{n} AND :leste{n}')
+            else:
+                # Retângulo que cruza o antimeridiano (180°)
+                condicoes.append(f'({lon} >= :oeste{n} OR {lon} <= :leste{n})')
+        if self.centro:
+            # Aproximação equirretangular: só aritmética no SQL, precisa para
+            # raios de até algumas centenas de km
+            latitude, longitude = self.centro
+            parametros.update({
+                'lat_centro': latitude, 'lon_centro': longitude,
+                'km_lat': KM_POR_GRAU, 'km_lon': KM_POR_GRAU * math.cos(math.radians(latitude)),
+                'raio2': self.raio_km ** 2,
+            })
+            condicoes.append(
+                f'(({lat} - :lat_centro) * :km_lat) * (({lat} - :lat_centro) * :km_lat) + '
+                f'(({lon} - :lon_centro) * :km_lon) * (({lon} - :lon_centro) * :km_lon) <= :raio2')
+        return ' AND '.join(condicoes) or '1'
+
+    def condicoes_indice(self, parametros):
+        """Condições sobre a tabela R*Tree (g), que usam o índice espacial"""
+        condicoes = []
+        for n, (oeste, sul, leste, norte) in enumerate(self.caixas):
+            parametros.update({f'sul{n}': sul, f'norte{n}': norte, f'oeste{n}': oeste, f'leste{n}': leste})
+            condicoes.append(f'g.lat_max >= :sul{n} AND g.lat_min <= :norte{n}')
+            if oeste <= leste:
+                condicoes.append(f'g.lon_max >= :oeste{n} AND g.lon_min <= :leste{n}')
+            else:
+                condicoes.append(f'(g.lon_max >= :oeste{n} OR g.lon_min <= :leste{n})')
+        return ' AND '.join(condicoes) or '1'
+
+
+def caixa_do_raio(centro, raio_km):
+    """Retângulo (oeste, sul, leste, norte) que contém o círculo"""
+    latitude, longitude = centro
+    delta_lat = raio_km / KM_POR_GRAU
+    sul, norte = max(latitude - delta_lat, -90), min(latitude + delta_lat, 90)
+    cosseno = math.cos(math.radians(max(abs(sul), abs(norte))))
+    if cosseno < 1e-6 or raio_km / (KM_POR_GRAU * cosseno) >= 180:
+        return (-180, sul, 180, norte)
+    delta_lon = raio_km / (KM_POR_GRAU * cosseno)
+    oeste = (longitude - delta_lon + 540) % 360 - 180
+    leste = (longitude + delta_lon + 540) % 360 - 180
+    return (oeste, sul, leste, norte)
+
+
+def pontos(conexao, regiao, limite):
+    """
+    Coletas dentro da região, em ordem de id: [dict], truncado. O R*Tree
+    (float de 32 bits, arredondado para fora) seleciona os candidatos; as
+    colunas da coleta dão o filtro exato.
+    """
+    parametros = {'limite': limite + 1}
+    linhas = conexao.execute(text(
+        'SELECT c.id, c.codigo, c.nome_cientifico, c.data_coleta, c.substrato, c.latitude, c.longitude '
+        'FROM coleta_geo g JOIN coleta c ON c.id = g.id '
+        f'WHERE {regiao.condicoes_indice(parametros)} '
+        f'AND {regiao.condicoes("c.latitude", "c.longitude", parametros)} '
+        'ORDER BY c.id LIMIT :limite'), parametros).mappings().all()
+    return [dict(linha) for linha in linhas[:limite]], len(linhas) > limite
+
+
+def tamanho_celula(zoom):
+    """Lado da célula de agrupamento, em graus, para o nível de zoom"""
+    return 360 / (2 ** zoom) / CELULAS_POR_TILE
+
+
+def agrupar(conexao, regiao, zoom):
+    """
+    Agrupa as coletas da região em uma grade do tamanho do zoom, só com o
+    índice espacial: [(total, latitude média, longitude média,
+    (oeste, sul, leste, norte), id de uma das coletas)].
+    """
+    parametros = {'celula': tamanho_celula(zoom)}
+    resultado = conexao.execute(text(
+        'SELECT COUNT(*), AVG(g.lat_min), AVG(g.lon_min), '
+        'MIN(g.lon_min), MIN(g.lat_min), MAX(g.lon_min), MAX(g.lat_min), MIN(g.id) '
+        'FROM coleta_geo g '
+        f'WHERE {regiao.condicoes_indice(parametros)} '
+        f'AND {regiao.condicoes("g.lat_min", "g.lon_min", parametros)} '
+        'GROUP BY CAST((g.lon_min + 180) / :celula AS INTEGER), CAST((g.lat_min + 90) / :celula AS INTEGER)'),
+        parametros)
+    return [(total, latitude, longitude, (oeste, sul, leste, norte), id)
+            for total, latitude, longitude, oeste, sul, leste, norte, id in resultado]
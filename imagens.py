@@ -0,0 +1,163 @@
+"""
+Sistema de Bioprospecção de Cogumelos Nativos
+Geração e cache de versões reduzidas (renditions) das imagens enviadas
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from PIL import Image, ImageOps, features
+
+# Tamanhos disponíveis: nome -> (largura máxima, altura máxima)
+RENDICOES = {
+    'miniatura': (320, 320),
+    'media': (1280, 1280),
+}
+
+QUALIDADE = 82
+
+# Tempo máximo (s) sem renovação antes de uma trava ser considerada
+# abandonada por um processo que morreu no meio da geração. Quem gera a
+# rendition renova a trava a cada TRAVA_RENOVACAO segundos, por mais que o
+# redimensionamento de um original grande demore.
+TRAVA_EXPIRACAO = 60
+TRAVA_RENOVACAO = TRAVA_EXPIRACAO / 4
+
+# Travas por thread distribuídas por hash do destino (quantidade fixa)
+_travas_locais = [threading.Lock() for _ in range(64)]
+
+
+def formato_rendicao():
+    """Retorna (formato Pillow, extensão) usado nas renditions"""
+    if features.check('webp'):
+        return 'WEBP', 'webp'
+    return 'JPEG', 'jpg'
+
+
+def caminho_rendicao(pasta_rendicoes, tamanho, nome_arquivo):
+    """Caminho em disco da rendition de uma imagem"""
+    _, extensao = formato_rendicao()
+    base = os.path.splitext(nome_arquivo)[0]
+    return os.path.join(pasta_rendicoes, tamanho, f'{base}.{extensao}')
+
+
+def _trava_local(destino):
+    return _travas_locais[hash(destino) % len(_travas_locais)]
+
+
+def _adquirir_trava_arquivo(caminho_trava, destino):
+    """
+    Trava entre processos baseada em criação exclusiva de arquivo.
+    Retorna False se outro processo terminou a rendition enquanto esperávamos.
+    """
+    while True:
+        try:
+            fd = os.open(caminho_trava, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            os.close(fd)
+            return True
+        except FileExistsError:
+            if os.path.exists(destino):
+                return False
+            try:
+                if time.time() - os.path.getmtime(caminho_trava) > TRAVA_EXPIRACAO:
+                    os.remove(caminho_trava)
+                    continue
+            except FileNotFoundError:
+                continue
+            time.sleep(0.05)
+
+
+@contextmanager
+def _renovar_trava(caminho_trava):
+    """Atualiza o mtime da trava em uma thread enquanto o bloco executa"""
+    parar = threading.Event()
+
+    def renovar():
+        while not parar.wait(TRAVA_RENOVACAO):
+            try:
+                os.utime(caminho_trava)
+            except FileNotFoundError:
+                return
+
+    renovador = threading.Thread(target=renovar, daemon=True)
+    renovador.start()
+    try:
+        yield
+    finally:
+        parar.set()
+        renovador.join()
+
+
+def _gerar(origem, destino, tamanho):
+    formato, _ = formato_rendicao()
+    with Image.open(origem) as imagem:
+        imagem = ImageOps.exif_transpose(imagem)
+        if imagem.mode not in ('RGB', 'RGBA'):
+            imagem = imagem.convert('RGBA' if 'A' in imagem.getbands() else 'RGB')
+        if formato == 'JPEG' and imagem.mode == 'RGBA':
+            imagem = imagem.convert('RGB')
+        imagem.thumbnail(RENDICOES[tamanho], Image.LANCZOS)
+
+        temporario = f'{destino}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            imagem.save(temporario, formato, quality=QUALIDADE, optimize=True)
+            os.replace(temporario, destino)
+        except Exception:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            raise
+
+
+def obter_rendicao(pasta_uploads, pasta_rendicoes, tamanho, nome_arquivo):
+    """
+    Garante que a rendition existe em disco e retorna seu caminho.
+
+    Apenas uma thread/processo gera cada rendition: os demais aguardam a
+    trava e reutilizam o arquivo produzido.
+    """
+    if tamanho not in RENDICOES:
+        raise ValueError(f'Tamanho de rendition inválido: {tamanho}')
+
+    destino = caminho_rendicao(pasta_rendicoes, tamanho, nome_arquivo)
+    if os.path.exists(destino):
+        return destino
+
+    origem = os.path.join(pasta_uploads, nome_arquivo)
+    if not os.path.exists(origem):
+        raise FileNotFoundError(origem)
+
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    caminho_trava = f'{destino}.lock'
+
+    with _trava_local(destino):
+        if os.path.exists(destino):
+            return destino
+        if not _adquirir_trava_arquivo(caminho_trava, destino):
+            return destino
+        try:
+            if not os.path.exists(destino):
+                with _renovar_trava(caminho_trava):
+                    _gerar(origem, destino, tamanho)
+        finally:
+            try:
+                os.remove(caminho_trava)
+            except FileNotFoundError:
+                pass
+    return destino
+
+
+def remover_rendicoes(pasta_rendicoes, nome_arquivo):
+    """Remove todas as renditions em cache de uma imagem"""
+    for tamanho in RENDICOES:
+        caminho = caminho_rendicao(pasta_rendicoes, tamanho, nome_arquivo)
+        if os.path.exists(caminho):
+            os.remove(caminho)
+
+
+def gerar_rendicoes(pastas, nome_arquivo):
+    """Tarefa em segundo plano: gera todas as renditions de um upload"""
+    return {tamanho: os.path.relpath(obter_rendicao(pastas['uploads'], pastas['rendicoes'],
+                                                    tamanho, nome_arquivo), pastas['rendicoes'])
+            for tamanho in RENDICOES}
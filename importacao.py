@@ -0,0 +1,129 @@
+"""
+Sistema de Bioprospecção de Cogumelos Nativos
+Importação de planilhas (CSV/XLSX) lidas em lotes de linhas
+"""
+
+import codecs
+import csv
+import io
+import os
+import zipfile
+from datetime import date, datetime
+
+# Linhas validadas e inseridas por vez
+TAMANHO_LOTE = 1000
+
+# Erros e avisos listados no relatório (os demais só entram na contagem)
+MAXIMO_ERROS = 100
+
+FORMATOS_IMPORTACAO = ('csv', 'xlsx')
+
+SEPARADORES_CSV = (',', ';', '\t')
+
+# CSV que não é UTF-8 válido: o Excel em português grava em Windows-1252
+CODIFICACAO_ALTERNATIVA = 'cp1252'
+
+TAMANHO_BLOCO = 1024 * 1024
+
+
+def formato_do_arquivo(nome):
+    """Formato pela extensão do arquivo; ValueError se não for suportado"""
+    extensao = os.path.splitext(nome or '')[1].lower().lstrip('.')
+    if extensao not in FORMATOS_IMPORTACAO:
+        raise ValueError(f"Formato não suportado: use {' ou '.join(FORMATOS_IMPORTACAO)}")
+    return extensao
+
+
+def _nome_coluna(nome):
+    return str(nome or '').strip().lower().replace(' ', '_')
+
+
+def _celula(valor):
+    """Valor de célula no formato dos campos dos formulários"""
+    if isinstance(valor, datetime):
+        return valor.date().isoformat()
+    if isinstance(valor, date):
+        return valor.isoformat()
+    if isinstance(valor, float) and valor.is_integer():
+        return int(valor)
+    if isinstance(valor, str):
+        return valor.strip()
+    return valor
+
+
+def _codificacao_csv(arquivo):
+    """UTF-8 se o arquivo inteiro decodificar como UTF-8; senão CODIFICACAO_ALTERNATIVA"""
+    inicio = arquivo.tell()
+    decodificador = codecs.getincrementaldecoder('utf-8')()
+    try:
+        for bloco in iter(lambda: arquivo.read(TAMANHO_BLOCO), b''):
+            decodificador.decode(bloco)
+        decodificador.decode(b'', final=True)
+        return 'utf-8-sig'
+    except UnicodeDecodeError:
+        return CODIFICACAO_ALTERNATIVA
+    finally:
+        arquivo.seek(inicio)
+
+
+def _ler_csv(arquivo):
+    # A codificação é decidida antes da primeira linha: um erro no meio da
+    # leitura deixaria parte do arquivo já validada
+    texto = io.TextIOWrapper(arquivo, encoding=_codificacao_csv(arquivo), newline='')
+    try:
+        # Separador pelo cabeçalho: planilhas em português costumam usar ';'
+        primeira = texto.readline()
+        texto.seek(0)
+        separador = max(SEPARADORES_CSV, key=primeira.count)
+        leitor = csv.reader(texto, delimiter=separador)
+        cabecalho = [_nome_coluna(nome) for nome in next(leitor, [])]
+        for valores in leitor:
+            if any(valor.strip() for valor in valores):
+                yield leitor.line_num, dict(zip(cabecalho, (_celula(valor) for valor in valores)))
+    except UnicodeDecodeError:
+        # Bytes sem caractere nem em Windows-1252 (0x81, 0x8D, 0x8F, 0x90, 0x9D)
+        raise ValueError('Codificação do CSV não reconhecida: salve a planilha como CSV UTF-8')
+    finally:
+        # O arquivo é de quem chamou: não deixa o TextIOWrapper fechá-lo
+        texto.detach()
+
+
+def _ler_xlsx(arquivo):
+    # Dependência só da importação de planilhas do Excel
+    from openpyxl import load_workbook
+    from openpyxl.utils.exceptions import InvalidFileException
+
+    try:
+        planilha = load_workbook(arquivo, read_only=True, data_only=True)
+    except (zipfile.BadZipFile, InvalidFileException, KeyError):
+        # KeyError: um ZIP sem as partes de uma pasta de trabalho do Excel
+        raise ValueError('Arquivo XLSX inválido ou corrompido')
+    try:
+        linhas = planilha.active.iter_rows(values_only=True)
+        cabecalho = [_nome_coluna(nome) for nome in next(linhas, ())]
+        for numero, valores in enumerate(linhas, start=2):
+            if any(valor not in (None, '') for valor in valores):
+                yield numero, dict(zip(cabecalho, (_celula(valor) for valor in valores)))
+    finally:
+        planilha.close()
+
+
+def ler_planilha(arquivo, formato):
+    """
+    Linhas da primeira planilha (XLSX) ou do CSV como (número da linha,
+    {coluna: valor}), lidas sob demanda. Os nomes das colunas são os campos
+    dos formulários (minúsculas; espaços viram _); linhas vazias são puladas.
+    ValueError (durante a leitura) se o arquivo não puder ser lido.
+    """
+    return _ler_xlsx(arquivo) if formato == 'xlsx' else _ler_csv(arquivo)
+
+
+def em_lotes(linhas, tamanho=TAMANHO_LOTE):
+    lote = []
+    for linha in linhas:
+        lote.append(linha)
+        if len(lote) == tamanho:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
@@ -0,0 +1,90 @@
+"""
+Sistema de Bioprospecção de Cogumelos Nativos
+Leitura dos metadados EXIF das fotos (data/hora da captura, GPS e câmera),
+gravados nas colunas exif_* das tabelas de imagem
+"""
+
+import math
+import os
+from datetime import datetime
+
+from PIL import ExifTags, Image
+
+TAMANHO_CAMERA = 100
+
+# Colunas preenchidas por ler_exif (todas nulas quando não há EXIF)
+COLUNAS_EXIF = ('exif_data_hora', 'exif_latitude', 'exif_longitude', 'exif_camera')
+
+
+def _texto(valor):
+    if isinstance(valor, bytes):
+        valor = valor.decode('utf-8', 'replace')
+    return str(valor).strip('\x00 ') if valor is not None else ''
+
+
+def _data_hora(valor):
+    """'AAAA:MM:DD HH:MM:SS' no horário local da câmera (sem fuso)"""
+    try:
+        return datetime.strptime(_texto(valor)[:19], '%Y:%m:%d %H:%M:%S')
+    except ValueError:
+        return None
+
+
+def _graus(valor, referencia, limite):
+    """(graus, minutos, segundos) + N/S/L/O em graus decimais; None se inválido"""
+    try:
+        graus, minutos, segundos = (float(parte) for parte in valor)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+    decimal = graus + minutos / 60 + segundos / 3600
+    if not math.isfinite(decimal) or decimal > limite:
+        return None
+    return -decimal if _texto(referencia).upper() in ('S', 'W') else decimal
+
+
+def _camera(base):
+    marca = _texto(base.get(ExifTags.Base.Make))
+    modelo = _texto(base.get(ExifTags.Base.Model))
+    # Muitos fabricantes repetem a marca no modelo ("Canon" + "Canon EOS 80D")
+    camera = modelo if modelo.lower().startswith(marca.lower()) else f'{marca} {modelo}'
+    return camera.strip()[:TAMANHO_CAMERA] or None
+
+
+def ler_exif(caminho):
+    """
+    {coluna: valor} para COLUNAS_EXIF. Só o cabeçalho do arquivo é lido (a
+    imagem não é decodificada). Arquivos ausentes, que não são imagens ou
+    sem EXIF resultam em valores nulos. Função de módulo: pode rodar em um
+    pool de processos.
+    """
+    valores = dict.fromkeys(COLUNAS_EXIF)
+    try:
+        with Image.open(caminho) as imagem:
+            base = imagem.getexif()
+            exif = base.get_ifd(ExifTags.IFD.Exif)
+            gps = base.get_ifd(ExifTags.IFD.GPSInfo)
+    except Exception:
+        # Arquivo ausente, formato desconhecido ou EXIF corrompido
+        return valores
+
+    valores['exif_data_hora'] = (_data_hora(exif.get(ExifTags.Base.DateTimeOriginal))
+                                 or _data_hora(base.get(ExifTags.Base.DateTime)))
+    latitude = _graus(gps.get(ExifTags.GPS.GPSLatitude), gps.get(ExifTags.GPS.GPSLatitudeRef), 90)
+    longitude = _graus(gps.get(ExifTags.GPS.GPSLongitude), gps.get(ExifTags.GPS.GPSLongitudeRef), 180)
+    # 0,0 é o valor de receptores sem sinal, não uma posição real
+    if latitude is not None and longitude is not None and (latitude, longitude) != (0, 0):
+        valores['exif_latitude'], valores['exif_longitude'] = latitude, longitude
+    valores['exif_camera'] = _camera(base)
+    return valores
+
+
+def extrair_exif(pastas, nome_arquivo, **imagem):
+    """
+    Tarefa em segundo plano: ler_exif de um upload, com a data/hora em ISO
+    8601 (o resultado da tarefa é gravado como JSON). `imagem` (tabela e id)
+    é onde o processo principal grava os valores.
+    """
+    valores = ler_exif(os.path.join(pastas['uploads'], *nome_arquivo.split('/')))
+    if valores['exif_data_hora']:
+        valores['exif_data_hora'] = valores['exif_data_hora'].isoformat()
+    return valores
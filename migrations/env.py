@@ -45,6 +45,31 @@ target_db = current_app.extensions['migrate'].db
 # ... etc.
 
 
+# Tabelas virtuais criadas fora do ORM (pelas migrações e por db.create_all)
+# e os sufixos das tabelas-sombra que o SQLite cria para cada uma
+SOMBRAS_FTS5 = ('_data', '_idx', '_docsize', '_config', '_content')
+SOMBRAS_RTREE = ('_node', '_parent', '_rowid')
+TABELAS_VIRTUAIS = {
+    'coleta_fts': SOMBRAS_FTS5,
+    'isolado_fts': SOMBRAS_FTS5,
+    'experimento_fts': SOMBRAS_FTS5,
+    'coleta_trigramas': SOMBRAS_FTS5,
+    'isolado_trigramas': SOMBRAS_FTS5,
+    'coleta_geo': SOMBRAS_RTREE,
+}
+TABELAS_FORA_DO_ORM = {
+    f'{tabela}{sufixo}'
+    for tabela, sombras in TABELAS_VIRTUAIS.items()
+    for sufixo in ('',) + sombras
+}
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    if type_ == 'table' and reflected and compare_to is None and name in TABELAS_FORA_DO_ORM:
+        return False
+    return True
+
+
 def get_metadata():
     if hasattr(target_db, 'metadatas'):
         return target_db.metadatas[None]
@@ -93,6 +118,7 @@ def run_migrations_online():
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    conf_args.setdefault("include_object", include_object)
 
     connectable = get_engine()
 
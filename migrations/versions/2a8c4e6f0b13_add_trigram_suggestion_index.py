@@ -0,0 +1,58 @@
+"""Add trigram FTS5 index for form suggestions
+
+Revision ID: 2a8c4e6f0b13
+Revises: 7e3b5d9a1f60
+Create Date: 2026-10-18 15:48:09.527361
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2a8c4e6f0b13'
+down_revision = '7e3b5d9a1f60'
+branch_labels = None
+depends_on = None
+
+
+SUGESTOES = {
+    'coleta': ['codigo', 'nome_cientifico', 'data_coleta'],
+    'isolado': ['codigo', 'especie_nome_cientifico', 'data_isolamento'],
+}
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    for tabela, colunas in SUGESTOES.items():
+        fts = f'{tabela}_trigramas'
+        lista = ', '.join(colunas)
+        novos = ', '.join(f'new.{c}' for c in colunas)
+        antigos = ', '.join(f'old.{c}' for c in colunas)
+
+        op.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({lista}, content='{tabela}', "
+            f"content_rowid='id', tokenize='trigram')")
+        op.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {tabela} BEGIN "
+            f"INSERT INTO {fts}(rowid, {lista}) VALUES (new.id, {novos}); END")
+        op.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {tabela} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {lista}) VALUES ('delete', old.id, {antigos}); END")
+        op.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {tabela} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {lista}) VALUES ('delete', old.id, {antigos}); "
+            f"INSERT INTO {fts}(rowid, {lista}) VALUES (new.id, {novos}); END")
+        op.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    for tabela in SUGESTOES:
+        for sufixo in ('ai', 'ad', 'au'):
+            op.execute(f'DROP TRIGGER IF EXISTS {tabela}_trigramas_{sufixo}')
+        op.execute(f'DROP TABLE IF EXISTS {tabela}_trigramas')
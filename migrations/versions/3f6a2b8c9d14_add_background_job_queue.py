@@ -0,0 +1,45 @@
+"""Add background job queue
+
+Revision ID: 3f6a2b8c9d14
+Revises: 9b3e4c1d7a20
+Create Date: 2026-10-18 12:41:09.562381
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f6a2b8c9d14'
+down_revision = '9b3e4c1d7a20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # db.create_all() pode ter criado a tabela antes da migração
+    if 'tarefa' in sa.inspect(op.get_bind()).get_table_names():
+        return
+
+    op.create_table(
+        'tarefa',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('tipo', sa.String(length=50), nullable=False),
+        sa.Column('parametros', sa.JSON(), nullable=True),
+        sa.Column('estado', sa.String(length=20), nullable=False),
+        sa.Column('tentativas', sa.Integer(), nullable=False),
+        sa.Column('max_tentativas', sa.Integer(), nullable=False),
+        sa.Column('erro', sa.Text(), nullable=True),
+        sa.Column('resultado', sa.JSON(), nullable=True),
+        sa.Column('disponivel_em', sa.DateTime(), nullable=False),
+        sa.Column('data_cadastro', sa.DateTime(), nullable=True),
+        sa.Column('data_inicio', sa.DateTime(), nullable=True),
+        sa.Column('data_fim', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_tarefa_estado', 'tarefa', ['estado', 'disponivel_em', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_tarefa_estado', table_name='tarefa')
+    op.drop_table('tarefa')
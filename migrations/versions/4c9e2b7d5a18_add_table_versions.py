@@ -0,0 +1,31 @@
+"""Add versao_tabela for API ETags
+
+Revision ID: 4c9e2b7d5a18
+Revises: 8d2f4a6c1e95
+Create Date: 2026-10-18 18:40:12.615930
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4c9e2b7d5a18'
+down_revision = '8d2f4a6c1e95'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # db.create_all() pode ter criado a tabela antes da migração
+    if 'versao_tabela' not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table(
+            'versao_tabela',
+            sa.Column('tabela', sa.String(length=50), nullable=False),
+            sa.Column('versao', sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint('tabela'),
+        )
+
+
+def downgrade():
+    op.drop_table('versao_tabela')
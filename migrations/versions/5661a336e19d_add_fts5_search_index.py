@@ -0,0 +1,61 @@
+"""Add FTS5 search index
+
+Revision ID: 5661a336e19d
+Revises: e2007977e573
+Create Date: 2026-10-18 09:12:41.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5661a336e19d'
+down_revision = 'e2007977e573'
+branch_labels = None
+depends_on = None
+
+
+INDICES = {
+    'coleta': ['codigo', 'nome_cientifico', 'nome_popular', 'local_coleta',
+               'substrato', 'coletor', 'observacoes'],
+    'isolado': ['codigo', 'especie_nome_cientifico', 'meio_cultura',
+                'origem_instituicao', 'observacoes'],
+    'experimento': ['titulo', 'objetivo', 'resultados', 'conclusoes'],
+}
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    for tabela, colunas in INDICES.items():
+        fts = f'{tabela}_fts'
+        lista = ', '.join(colunas)
+        novos = ', '.join(f'new.{c}' for c in colunas)
+        antigos = ', '.join(f'old.{c}' for c in colunas)
+
+        op.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({lista}, content='{tabela}', "
+            f"content_rowid='id', tokenize='unicode61 remove_diacritics 2')")
+        op.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {tabela} BEGIN "
+            f"INSERT INTO {fts}(rowid, {lista}) VALUES (new.id, {novos}); END")
+        op.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {tabela} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {lista}) VALUES ('delete', old.id, {antigos}); END")
+        op.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {tabela} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {lista}) VALUES ('delete', old.id, {antigos}); "
+            f"INSERT INTO {fts}(rowid, {lista}) VALUES (new.id, {novos}); END")
+        op.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    for tabela in INDICES:
+        for sufixo in ('ai', 'ad', 'au'):
+            op.execute(f'DROP TRIGGER IF EXISTS {tabela}_fts_{sufixo}')
+        op.execute(f'DROP TABLE IF EXISTS {tabela}_fts')
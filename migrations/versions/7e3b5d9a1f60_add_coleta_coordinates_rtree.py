@@ -0,0 +1,127 @@
+"""Add numeric coordinates and R*Tree index to coleta
+
+Revision ID: 7e3b5d9a1f60
+Revises: d41f8a6b2c37
+Create Date: 2026-10-18 15:02:47.193820
+
+"""
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7e3b5d9a1f60'
+down_revision = 'd41f8a6b2c37'
+branch_labels = None
+depends_on = None
+
+
+# Cópia congelada de geo.interpretar_coordenadas nesta revisão: a migração
+# não deve mudar de resultado se o interpretador da aplicação mudar depois
+_GRAUS = (r"([+-])?\s*(\d+(?:\.\d+)?)\s*(?:°|º)?\s*"
+          r"(?:(\d+(?:\.\d+)?)\s*(?:'|′)\s*)?"
+          r"(?:(\d+(?:\.\d+)?)\s*(?:\"|″|'')\s*)?")
+_COMPONENTE = re.compile(_GRAUS + r"(?:([NSEWLO])\b)?")
+_COMPONENTE_PREFIXO = re.compile(r"\b([NSEWLO])\s*" + _GRAUS)
+_INICIA_COM_HEMISFERIO = re.compile(r"^[NSEWLO]\s*[\d+-]")
+_HEMISFERIOS = {
+    'N': ('lat', 1), 'S': ('lat', -1),
+    'E': ('lon', 1), 'L': ('lon', 1), 'W': ('lon', -1), 'O': ('lon', -1),
+}
+
+
+def interpretar_coordenadas(texto):
+    if not texto:
+        return None
+    texto = texto.strip().upper()
+    if ';' in texto:
+        texto = texto.replace(',', '.').replace(';', ' ')
+
+    eixos = {}
+    sem_hemisferio = []
+    if _INICIA_COM_HEMISFERIO.match(texto):
+        componentes = [(sinal, graus, minutos, segundos, hemisferio)
+                       for hemisferio, sinal, graus, minutos, segundos in _COMPONENTE_PREFIXO.findall(texto)]
+    else:
+        componentes = _COMPONENTE.findall(texto)
+    for sinal, graus, minutos, segundos, hemisferio in componentes:
+        minutos = float(minutos or 0)
+        segundos = float(segundos or 0)
+        if minutos >= 60 or segundos >= 60:
+            return None
+        valor = float(graus) + minutos / 60 + segundos / 3600
+        if sinal == '-':
+            valor = -valor
+        if hemisferio:
+            eixo, fator = _HEMISFERIOS[hemisferio]
+            if eixo in eixos:
+                return None
+            eixos[eixo] = fator * abs(valor)
+        else:
+            sem_hemisferio.append(valor)
+
+    for eixo in ('lat', 'lon'):
+        if eixo not in eixos and sem_hemisferio:
+            eixos[eixo] = sem_hemisferio.pop(0)
+    if sem_hemisferio or len(eixos) != 2:
+        return None
+    latitude, longitude = eixos['lat'], eixos['lon']
+    if abs(latitude) > 90 or abs(longitude) > 180:
+        return None
+    return round(latitude, 6), round(longitude, 6)
+
+
+def upgrade():
+    conexao = op.get_bind()
+    colunas = {coluna['name'] for coluna in sa.inspect(conexao).get_columns('coleta')}
+    # db.create_all() pode ter criado as colunas antes da migração. ALTER TABLE
+    # direto: o modo batch recriaria a tabela e perderia os triggers da busca
+    if 'latitude' not in colunas:
+        op.add_column('coleta', sa.Column('latitude', sa.Float(), nullable=True))
+    if 'longitude' not in colunas:
+        op.add_column('coleta', sa.Column('longitude', sa.Float(), nullable=True))
+
+    coleta = sa.table('coleta', sa.column('id', sa.Integer), sa.column('coordenadas', sa.String),
+                      sa.column('latitude', sa.Float), sa.column('longitude', sa.Float))
+    atualizacao = (coleta.update().where(coleta.c.id == sa.bindparam('_id'))
+                   .values(latitude=sa.bindparam('_lat'), longitude=sa.bindparam('_lon')))
+    lote = []
+    for id, coordenadas in conexao.execute(
+            sa.select(coleta.c.id, coleta.c.coordenadas).where(coleta.c.coordenadas.isnot(None))).all():
+        interpretadas = interpretar_coordenadas(coordenadas)
+        if interpretadas:
+            lote.append({'_id': id, '_lat': interpretadas[0], '_lon': interpretadas[1]})
+    for inicio in range(0, len(lote), 10_000):
+        conexao.execute(atualizacao, lote[inicio:inicio + 10_000])
+
+    if conexao.dialect.name != 'sqlite':
+        return
+
+    op.execute('CREATE VIRTUAL TABLE IF NOT EXISTS coleta_geo USING rtree(id, lat_min, lat_max, lon_min, lon_max)')
+    op.execute(
+        'CREATE TRIGGER IF NOT EXISTS coleta_geo_ai AFTER INSERT ON coleta '
+        'WHEN new.latitude IS NOT NULL AND new.longitude IS NOT NULL BEGIN '
+        'INSERT INTO coleta_geo VALUES (new.id, new.latitude, new.latitude, new.longitude, new.longitude); END')
+    op.execute(
+        'CREATE TRIGGER IF NOT EXISTS coleta_geo_ad AFTER DELETE ON coleta BEGIN '
+        'DELETE FROM coleta_geo WHERE id = old.id; END')
+    op.execute(
+        'CREATE TRIGGER IF NOT EXISTS coleta_geo_au AFTER UPDATE OF latitude, longitude ON coleta BEGIN '
+        'DELETE FROM coleta_geo WHERE id = old.id; '
+        'INSERT INTO coleta_geo SELECT new.id, new.latitude, new.latitude, new.longitude, new.longitude '
+        'WHERE new.latitude IS NOT NULL AND new.longitude IS NOT NULL; END')
+    op.execute('DELETE FROM coleta_geo')
+    op.execute('INSERT INTO coleta_geo SELECT id, latitude, latitude, longitude, longitude '
+               'FROM coleta WHERE latitude IS NOT NULL AND longitude IS NOT NULL')
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        for sufixo in ('ai', 'ad', 'au'):
+            op.execute(f'DROP TRIGGER IF EXISTS coleta_geo_{sufixo}')
+        op.execute('DROP TABLE IF EXISTS coleta_geo')
+
+    op.drop_column('coleta', 'longitude')
+    op.drop_column('coleta', 'latitude')
@@ -0,0 +1,75 @@
+"""Add ON DELETE CASCADE to child foreign keys
+
+Revision ID: 8d2f4a6c1e95
+Revises: 2a8c4e6f0b13
+Create Date: 2026-10-18 17:21:36.804152
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d2f4a6c1e95'
+down_revision = '2a8c4e6f0b13'
+branch_labels = None
+depends_on = None
+
+
+# (tabela, coluna, tabela referenciada)
+FKS = [
+    ('imagem_coleta', 'coleta_id', 'coleta'),
+    ('imagem_isolado', 'isolado_id', 'isolado'),
+    ('isolado', 'coleta_id', 'coleta'),
+    ('repique', 'isolado_id', 'isolado'),
+    ('experimento', 'coleta_id', 'coleta'),
+    ('experimento', 'isolado_id', 'isolado'),
+]
+
+
+def _pragma_foreign_keys(valor):
+    # PRAGMA foreign_keys não tem efeito dentro de uma transação
+    with op.get_context().autocommit_block():
+        op.execute(f'PRAGMA foreign_keys={valor}')
+
+
+def _recriar_sqlite(conexao, ondelete):
+    # O SQLite não altera FKs: cada tabela é recriada (modo batch) a partir da
+    # definição refletida. Sem foreign_keys, o DROP da tabela antiga não
+    # dispara a cascata; os triggers (busca, referências) são recriados depois.
+    _pragma_foreign_keys('OFF')
+    for tabela in dict.fromkeys(tabela for tabela, _, _ in FKS):
+        triggers = conexao.execute(
+            sa.text("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = :tabela"),
+            {'tabela': tabela}).scalars().all()
+        definicao = sa.Table(tabela, sa.MetaData(), autoload_with=conexao)
+        for fk in definicao.foreign_key_constraints:
+            fk.ondelete = ondelete
+        with op.batch_alter_table(tabela, copy_from=definicao, recreate='always'):
+            pass
+        for sql in triggers:
+            op.execute(sql)
+    _pragma_foreign_keys('ON')
+
+
+def _recriar(ondelete):
+    conexao = op.get_bind()
+    if conexao.dialect.name == 'sqlite':
+        _recriar_sqlite(conexao, ondelete)
+        return
+
+    inspetor = sa.inspect(conexao)
+    for tabela, coluna, referenciada in FKS:
+        for fk in inspetor.get_foreign_keys(tabela):
+            if fk['constrained_columns'] == [coluna] and fk['name']:
+                op.drop_constraint(fk['name'], tabela, type_='foreignkey')
+        op.create_foreign_key(f'fk_{tabela}_{coluna}', tabela, referenciada, [coluna], ['id'],
+                              ondelete=ondelete)
+
+
+def upgrade():
+    _recriar('CASCADE')
+
+
+def downgrade():
+    _recriar(None)
@@ -0,0 +1,78 @@
+"""Add content-addressed upload storage
+
+Revision ID: 9b3e4c1d7a20
+Revises: fac3ae6fc25b
+Create Date: 2026-10-18 11:58:22.407113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b3e4c1d7a20'
+down_revision = 'fac3ae6fc25b'
+branch_labels = None
+depends_on = None
+
+
+TABELAS_IMAGEM = ('imagem_coleta', 'imagem_isolado')
+
+
+def upgrade():
+    inspetor = sa.inspect(op.get_bind())
+
+    if 'arquivo_upload' not in inspetor.get_table_names():
+        op.create_table(
+            'arquivo_upload',
+            sa.Column('caminho', sa.String(length=255), nullable=False),
+            sa.Column('sha256', sa.String(length=64), nullable=True),
+            sa.Column('tamanho', sa.Integer(), nullable=True),
+            sa.Column('referencias', sa.Integer(), nullable=False),
+            sa.Column('data_criacao', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('caminho'),
+        )
+
+    for tabela in TABELAS_IMAGEM:
+        colunas = {coluna['name'] for coluna in inspetor.get_columns(tabela)}
+        if 'nome_original' not in colunas:
+            with op.batch_alter_table(tabela, schema=None) as batch_op:
+                batch_op.add_column(sa.Column('nome_original', sa.String(length=255), nullable=True))
+        op.execute(f'UPDATE {tabela} SET nome_original = nome_arquivo WHERE nome_original IS NULL')
+
+    # Uploads existentes (na raiz de uploads/, sem hash conhecido) passam a ser
+    # arquivos com a contagem atual de imagens que os usam. O nome_arquivo das
+    # imagens não muda; `flask migrar-uploads` move os arquivos depois.
+    op.execute(
+        "INSERT INTO arquivo_upload (caminho, sha256, tamanho, referencias, data_criacao) "
+        "SELECT nome_arquivo, NULL, NULL, COUNT(*), CURRENT_TIMESTAMP FROM ("
+        "SELECT nome_arquivo FROM imagem_coleta UNION ALL SELECT nome_arquivo FROM imagem_isolado"
+        ") GROUP BY nome_arquivo "
+        "ON CONFLICT (caminho) DO NOTHING")
+
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    for tabela in TABELAS_IMAGEM:
+        op.execute(
+            f'CREATE TRIGGER IF NOT EXISTS {tabela}_ref_ai AFTER INSERT ON {tabela} BEGIN '
+            f'UPDATE arquivo_upload SET referencias = referencias + 1 '
+            f'WHERE caminho = new.nome_arquivo; END')
+        op.execute(
+            f'CREATE TRIGGER IF NOT EXISTS {tabela}_ref_ad AFTER DELETE ON {tabela} BEGIN '
+            f'UPDATE arquivo_upload SET referencias = referencias - 1 '
+            f'WHERE caminho = old.nome_arquivo; END')
+        op.execute(
+            f'CREATE TRIGGER IF NOT EXISTS {tabela}_ref_au AFTER UPDATE OF nome_arquivo ON {tabela} '
+            f'WHEN old.nome_arquivo IS NOT new.nome_arquivo BEGIN '
+            f'UPDATE arquivo_upload SET referencias = referencias - 1 WHERE caminho = old.nome_arquivo; '
+            f'UPDATE arquivo_upload SET referencias = referencias + 1 WHERE caminho = new.nome_arquivo; END')
+
+
+def downgrade():
+    for tabela in TABELAS_IMAGEM:
+        for sufixo in ('ai', 'ad', 'au'):
+            op.execute(f'DROP TRIGGER IF EXISTS {tabela}_ref_{sufixo}')
+        with op.batch_alter_table(tabela, schema=None) as batch_op:
+            batch_op.drop_column('nome_original')
+    op.drop_table('arquivo_upload')
@@ -0,0 +1,69 @@
+"""Add alteracao change log for delta sync
+
+Revision ID: b5e1c9d3f7a2
+Revises: 4c9e2b7d5a18
+Create Date: 2026-10-18 19:12:05.318264
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5e1c9d3f7a2'
+down_revision = '4c9e2b7d5a18'
+branch_labels = None
+depends_on = None
+
+
+# Tabelas sincronizadas com os clientes de campo nesta revisão
+TABELAS = ('coleta', 'imagem_coleta', 'isolado', 'imagem_isolado', 'repique', 'experimento')
+
+
+def upgrade():
+    conexao = op.get_bind()
+    # db.create_all() pode ter criado a tabela antes da migração
+    if 'alteracao' not in sa.inspect(conexao).get_table_names():
+        op.create_table(
+            'alteracao',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('tabela', sa.String(length=50), nullable=False),
+            sa.Column('registro_id', sa.Integer(), nullable=False),
+            sa.Column('excluido', sa.Boolean(), nullable=False),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('tabela', 'registro_id', name='uq_alteracao_registro'),
+            sqlite_autoincrement=True,
+        )
+    if conexao.dialect.name != 'sqlite':
+        return
+
+    existiam = conexao.execute(sa.text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'coleta_alt_ai'")).first() is not None
+    for tabela in TABELAS:
+        # INSERT OR REPLACE remove a alteração anterior do registro (UNIQUE) e
+        # grava uma nova com id maior
+        registrar = f"INSERT OR REPLACE INTO alteracao (tabela, registro_id, excluido) VALUES ('{tabela}'"
+        op.execute(
+            f'CREATE TRIGGER IF NOT EXISTS {tabela}_alt_ai AFTER INSERT ON {tabela} BEGIN '
+            f'{registrar}, new.id, 0); END')
+        op.execute(
+            f'CREATE TRIGGER IF NOT EXISTS {tabela}_alt_au AFTER UPDATE ON {tabela} BEGIN '
+            f'{registrar}, new.id, 0); END')
+        op.execute(
+            f'CREATE TRIGGER IF NOT EXISTS {tabela}_alt_ad AFTER DELETE ON {tabela} BEGIN '
+            f'{registrar}, old.id, 1); END')
+
+    # Registro das linhas existentes: base para a primeira sincronização
+    if not existiam:
+        for tabela in TABELAS:
+            op.execute(
+                'INSERT OR REPLACE INTO alteracao (tabela, registro_id, excluido) '
+                f"SELECT '{tabela}', id, 0 FROM {tabela} ORDER BY id")
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        for tabela in TABELAS:
+            for sufixo in ('ai', 'au', 'ad'):
+                op.execute(f'DROP TRIGGER IF EXISTS {tabela}_alt_{sufixo}')
+    op.drop_table('alteracao')
@@ -0,0 +1,61 @@
+"""Add statistics rollup table
+
+Revision ID: c72d5e0a4b91
+Revises: 3f6a2b8c9d14
+Create Date: 2026-10-18 13:36:52.184907
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c72d5e0a4b91'
+down_revision = '3f6a2b8c9d14'
+branch_labels = None
+depends_on = None
+
+
+# Mesmo recálculo de estatisticas.recalcular, congelado nesta revisão
+RECALCULO = [
+    "SELECT 'total', '', 'coleta', COUNT(*) FROM coleta",
+    "SELECT 'total', '', 'isolado', COUNT(*) FROM isolado",
+    "SELECT 'total', '', 'experimento', COUNT(*) FROM experimento",
+    "SELECT 'total', '', 'repique', COUNT(*) FROM repique",
+    "SELECT 'experimentos_status', '', COALESCE(status, ''), COUNT(*) FROM experimento "
+    "GROUP BY COALESCE(status, '')",
+    "SELECT 'experimentos_com_inicio', '', '', COUNT(*) FROM experimento WHERE data_inicio IS NOT NULL",
+    "SELECT 'isolados_com_temperatura', '', '', COUNT(*) FROM isolado WHERE temperatura_incubacao IS NOT NULL",
+    "SELECT 'isolados_com_observacoes', '', '', COUNT(*) FROM isolado "
+    "WHERE observacoes IS NOT NULL AND observacoes != ''",
+    "SELECT 'isolados_com_repiques', '', '', COUNT(DISTINCT isolado_id) FROM repique",
+    "SELECT 'isolados_meio', '', meio_cultura, COUNT(*) FROM isolado "
+    "WHERE meio_cultura IS NOT NULL AND meio_cultura != '' GROUP BY meio_cultura",
+    "SELECT 'coletas_substrato', substr(data_coleta, 1, 7), COALESCE(substrato, ''), COUNT(*) "
+    "FROM coleta WHERE data_coleta IS NOT NULL GROUP BY 2, 3",
+    "SELECT 'coletas_coletor', substr(data_coleta, 1, 7), COALESCE(coletor, ''), COUNT(*) "
+    "FROM coleta WHERE data_coleta IS NOT NULL GROUP BY 2, 3",
+]
+
+
+def upgrade():
+    # db.create_all() pode ter criado a tabela antes da migração
+    if 'estatistica' not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table(
+            'estatistica',
+            sa.Column('periodo', sa.String(length=7), nullable=False),
+            sa.Column('metrica', sa.String(length=50), nullable=False),
+            sa.Column('dimensao', sa.String(length=200), nullable=False),
+            sa.Column('valor', sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint('periodo', 'metrica', 'dimensao'),
+        )
+        op.create_index('ix_estatistica_metrica', 'estatistica', ['metrica', 'periodo'], unique=False)
+
+    op.execute('DELETE FROM estatistica')
+    for consulta in RECALCULO:
+        op.execute(f'INSERT INTO estatistica (metrica, periodo, dimensao, valor) {consulta}')
+
+
+def downgrade():
+    op.drop_index('ix_estatistica_metrica', table_name='estatistica')
+    op.drop_table('estatistica')
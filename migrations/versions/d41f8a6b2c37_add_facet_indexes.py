@@ -0,0 +1,40 @@
+"""Add facet indexes
+
+Revision ID: d41f8a6b2c37
+Revises: c72d5e0a4b91
+Create Date: 2026-10-18 14:20:13.730415
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41f8a6b2c37'
+down_revision = 'c72d5e0a4b91'
+branch_labels = None
+depends_on = None
+
+
+INDICES = [
+    ('ix_coleta_coletor', 'coleta', ['coletor']),
+    ('ix_isolado_meio_cultura', 'isolado', ['meio_cultura']),
+    ('ix_isolado_origem_tipo', 'isolado', ['origem_tipo']),
+]
+
+
+def upgrade():
+    existentes = {
+        (tabela, indice['name'])
+        for tabela in {tabela for _, tabela, _ in INDICES}
+        for indice in sa.inspect(op.get_bind()).get_indexes(tabela)
+    }
+    for nome, tabela, colunas in INDICES:
+        # db.create_all() pode ter criado os índices antes da migração
+        if (tabela, nome) not in existentes:
+            op.create_index(nome, tabela, colunas, unique=False)
+
+
+def downgrade():
+    for nome, tabela, _ in reversed(INDICES):
+        op.drop_index(nome, table_name=tabela)
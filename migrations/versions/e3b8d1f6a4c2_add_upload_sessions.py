@@ -0,0 +1,49 @@
+"""Add sessao_upload and parte_upload for resumable uploads
+
+Revision ID: e3b8d1f6a4c2
+Revises: b5e1c9d3f7a2
+Create Date: 2026-10-18 20:05:41.207318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3b8d1f6a4c2'
+down_revision = 'b5e1c9d3f7a2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # db.create_all() pode ter criado as tabelas antes da migração
+    existentes = sa.inspect(op.get_bind()).get_table_names()
+    if 'sessao_upload' not in existentes:
+        op.create_table(
+            'sessao_upload',
+            sa.Column('id', sa.String(length=32), nullable=False),
+            sa.Column('nome_original', sa.String(length=255), nullable=False),
+            sa.Column('tamanho', sa.BigInteger(), nullable=False),
+            sa.Column('tamanho_parte', sa.Integer(), nullable=False),
+            sa.Column('sha256', sa.String(length=64), nullable=True),
+            sa.Column('data_criacao', sa.DateTime(), nullable=True),
+            sa.Column('data_atualizacao', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+        )
+    if 'parte_upload' not in existentes:
+        op.create_table(
+            'parte_upload',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('sessao_id', sa.String(length=32), nullable=False),
+            sa.Column('indice', sa.Integer(), nullable=False),
+            sa.Column('sha256', sa.String(length=64), nullable=False),
+            sa.ForeignKeyConstraint(['sessao_id'], ['sessao_upload.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('sessao_id', 'indice', name='uq_parte_upload_indice'),
+        )
+
+
+def downgrade():
+    op.drop_table('parte_upload')
+    op.drop_table('sessao_upload')
@@ -0,0 +1,44 @@
+"""Add EXIF columns and indexes to image tables
+
+Revision ID: f1c6a8e2d9b3
+Revises: e3b8d1f6a4c2
+Create Date: 2026-10-18 20:48:16.903527
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1c6a8e2d9b3'
+down_revision = 'e3b8d1f6a4c2'
+branch_labels = None
+depends_on = None
+
+TABELAS = ('imagem_coleta', 'imagem_isolado')
+
+
+def upgrade():
+    inspetor = sa.inspect(op.get_bind())
+    for tabela in TABELAS:
+        # db.create_all() pode ter criado as colunas antes da migração
+        if 'exif_lido' in {coluna['name'] for coluna in inspetor.get_columns(tabela)}:
+            continue
+        # Imagens existentes ficam com exif_lido = 0 até `flask extrair-exif`
+        op.add_column(tabela, sa.Column('exif_lido', sa.Boolean(), nullable=False, server_default=sa.false()))
+        op.add_column(tabela, sa.Column('exif_data_hora', sa.DateTime(), nullable=True))
+        op.add_column(tabela, sa.Column('exif_latitude', sa.Float(), nullable=True))
+        op.add_column(tabela, sa.Column('exif_longitude', sa.Float(), nullable=True))
+        op.add_column(tabela, sa.Column('exif_camera', sa.String(length=100), nullable=True))
+        op.create_index(f'ix_{tabela}_exif_data_hora', tabela, ['exif_data_hora'])
+        op.create_index(f'ix_{tabela}_exif_gps', tabela, ['id'],
+                        sqlite_where=sa.text('exif_latitude IS NOT NULL'))
+
+
+def downgrade():
+    for tabela in TABELAS:
+        op.drop_index(f'ix_{tabela}_exif_gps', table_name=tabela)
+        op.drop_index(f'ix_{tabela}_exif_data_hora', table_name=tabela)
+        # ALTER TABLE direto: o batch do SQLite recriaria a tabela sem os triggers
+        for coluna in ('exif_camera', 'exif_longitude', 'exif_latitude', 'exif_data_hora', 'exif_lido'):
+            op.execute(f'ALTER TABLE {tabela} DROP COLUMN {coluna}')
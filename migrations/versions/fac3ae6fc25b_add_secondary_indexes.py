@@ -0,0 +1,47 @@
+"""Add secondary indexes
+
+Revision ID: fac3ae6fc25b
+Revises: 5661a336e19d
+Create Date: 2026-10-18 10:47:05.913622
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'fac3ae6fc25b'
+down_revision = '5661a336e19d'
+branch_labels = None
+depends_on = None
+
+
+INDICES = [
+    ('ix_coleta_data_cadastro', 'coleta', ['data_cadastro', 'id']),
+    ('ix_coleta_substrato', 'coleta', ['substrato', 'data_cadastro', 'id']),
+    ('ix_isolado_data_cadastro', 'isolado', ['data_cadastro', 'id']),
+    ('ix_isolado_coleta_id', 'isolado', ['coleta_id']),
+    ('ix_repique_isolado_id', 'repique', ['isolado_id', 'data_repique']),
+    ('ix_experimento_data_cadastro', 'experimento', ['data_cadastro', 'id']),
+    ('ix_experimento_coleta_id', 'experimento', ['coleta_id']),
+    ('ix_experimento_isolado_id', 'experimento', ['isolado_id']),
+    ('ix_imagem_coleta_coleta_id', 'imagem_coleta', ['coleta_id', 'id']),
+    ('ix_imagem_isolado_isolado_id', 'imagem_isolado', ['isolado_id', 'id']),
+]
+
+
+def upgrade():
+    existentes = {
+        (tabela, indice['name'])
+        for tabela in {tabela for _, tabela, _ in INDICES}
+        for indice in sa.inspect(op.get_bind()).get_indexes(tabela)
+    }
+    for nome, tabela, colunas in INDICES:
+        # db.create_all() pode ter criado os índices antes da migração
+        if (tabela, nome) not in existentes:
+            op.create_index(nome, tabela, colunas, unique=False)
+
+
+def downgrade():
+    for nome, tabela, _ in reversed(INDICES):
+        op.drop_index(nome, table_name=tabela)
@@ -0,0 +1,72 @@
+"""
+Sistema de Bioprospecção de Cogumelos Nativos
+Pacote ZIP com as imagens de coletas ou isolados e um manifesto CSV,
+gerado em streaming (ver compactacao.zip_em_stream)
+"""
+
+import csv
+import io
+import os
+
+from werkzeug.utils import secure_filename
+
+from compactacao import ler_blocos
+from exportacao import ler_em_lotes
+
+MANIFESTO = 'manifesto.csv'
+
+# Colunas do manifesto; `arquivo` fica vazio quando a imagem não está em disco
+COLUNAS_MANIFESTO = ['arquivo', 'registro_id', 'registro', 'imagem_id', 'nome_original',
+                     'descricao', 'data_upload', 'sha256']
+
+
+def _nome_no_pacote(registro, imagem_id, nome_arquivo, nome_original):
+    """
+    <código do registro>/<id da imagem>_<nome original>: o id torna o nome
+    único mesmo com nomes originais repetidos (IMG_0001.jpg de duas câmeras)
+    """
+    extensao = os.path.splitext(nome_arquivo)[1].lower()
+    original = secure_filename(nome_original or '')
+    if os.path.splitext(original)[1].lower() != extensao:
+        original = f'{os.path.splitext(original)[0] or "imagem"}{extensao}'
+    return f'{secure_filename(registro) or "registro"}/{imagem_id}_{original}'
+
+
+def _caminho(pasta_uploads, nome_arquivo):
+    return os.path.join(pasta_uploads, *nome_arquivo.split('/'))
+
+
+def _manifesto(session, consulta, pasta_uploads):
+    texto = io.StringIO()
+    escritor = csv.writer(texto)
+    escritor.writerow(COLUNAS_MANIFESTO)
+    for lote in ler_em_lotes(session, consulta):
+        for imagem_id, registro_id, registro, nome_arquivo, nome_original, descricao, data_upload, sha256 in lote:
+            arquivo = ''
+            if os.path.isfile(_caminho(pasta_uploads, nome_arquivo)):
+                arquivo = _nome_no_pacote(registro, imagem_id, nome_arquivo, nome_original)
+            escritor.writerow([arquivo, registro_id, registro, imagem_id, nome_original or '',
+                               descricao or '', data_upload.isoformat() if data_upload else '', sha256 or ''])
+        yield texto.getvalue().encode()
+        texto.seek(0)
+        texto.truncate()
+    if texto.tell():
+        yield texto.getvalue().encode()
+
+
+def entradas_imagens(session, consulta, pasta_uploads):
+    """
+    Entradas do ZIP: o manifesto e depois cada imagem, lida do disco em
+    blocos. `consulta` retorna (imagem_id, registro_id, código do registro,
+    nome_arquivo, nome_original, descricao, data_upload, sha256).
+    Imagens sem arquivo em disco ficam só no manifesto.
+    """
+    yield MANIFESTO, _manifesto(session, consulta, pasta_uploads)
+    for lote in ler_em_lotes(session, consulta):
+        for imagem_id, _, registro, nome_arquivo, nome_original, *_ in lote:
+            try:
+                # Aberto antes de a entrada começar: arquivo ausente não deixa entrada pela metade
+                arquivo = open(_caminho(pasta_uploads, nome_arquivo), 'rb')
+            except OSError:
+                continue
+            yield _nome_no_pacote(registro, imagem_id, nome_arquivo, nome_original), ler_blocos(arquivo)
@@ -0,0 +1,106 @@
+"""
+Sistema de Bioprospecção de Cogumelos Nativos
+Paginação por cursor (keyset) ordenada por (data_cadastro, id)
+"""
+
+import base64
+import json
+import time
+from datetime import datetime
+
+from sqlalchemy import func, tuple_
+
+# Validade (s) dos totais em cache; escritas também limpam o cache
+TOTAL_TTL = 60
+
+_totais = {}
+
+
+class PaginaCursor:
+    """Página de resultados com cursores opacos para a anterior e a próxima"""
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None, total=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def codificar_cursor(direcao, data_cadastro, id):
+    dados = {'d': direcao, 't': data_cadastro.isoformat() if data_cadastro else None, 'i': id}
+    bruto = json.dumps(dados, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(bruto).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Retorna (direção, data_cadastro, id); ValueError se o cursor for inválido"""
+    try:
+        bruto = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        dados = json.loads(bruto)
+        direcao = dados['d']
+        data_cadastro = datetime.fromisoformat(dados['t']) if dados['t'] else None
+        id = int(dados['i'])
+    except (ValueError, TypeError, KeyError) as e:
+        raise ValueError('Cursor de paginação inválido') from e
+    if direcao not in ('depois', 'antes'):
+        raise ValueError('Cursor de paginação inválido')
+    return direcao, data_cadastro, id
+
+
+def paginar(query, modelo, cursor=None, por_pagina=20, total=None):
+    """
+    Pagina `query` (sem ORDER BY) do mais recente para o mais antigo por
+    (data_cadastro, id). O custo de qualquer página é o de um range scan no
+    índice, independente da profundidade.
+    """
+    chave = (modelo.data_cadastro, modelo.id)
+    direcao, data_cadastro, id = decodificar_cursor(cursor) if cursor else ('depois', None, None)
+
+    if direcao == 'depois':
+        if cursor:
+            query = query.filter(tuple_(*chave) < (data_cadastro, id))
+        linhas = query.order_by(chave[0].desc(), chave[1].desc()).limit(por_pagina + 1).all()
+        ha_mais = len(linhas) > por_pagina
+        linhas = linhas[:por_pagina]
+        tem_proxima, tem_anterior = ha_mais, cursor is not None
+    else:
+        query = query.filter(tuple_(*chave) > (data_cadastro, id))
+        linhas = query.order_by(chave[0].asc(), chave[1].asc()).limit(por_pagina + 1).all()
+        ha_mais = len(linhas) > por_pagina
+        linhas = linhas[:por_pagina]
+        linhas.reverse()
+        tem_proxima, tem_anterior = True, ha_mais
+
+    proximo = anterior = None
+    if linhas:
+        if tem_proxima:
+            proximo = codificar_cursor('depois', linhas[-1].data_cadastro, linhas[-1].id)
+        if tem_anterior:
+            anterior = codificar_cursor('antes', linhas[0].data_cadastro, linhas[0].id)
+    return PaginaCursor(linhas, proximo, anterior, total)
+
+
+def total_em_cache(chave, query, modelo):
+    """
+    COUNT(*) de `query` guardado por TOTAL_TTL segundos. Serve para exibir
+    totais aproximados sem contar a tabela a cada página.
+    """
+    agora = time.monotonic()
+    em_cache = _totais.get(chave)
+    if em_cache and agora - em_cache[1] < TOTAL_TTL:
+        return em_cache[0]
+    total = query.order_by(None).with_entities(func.count(modelo.id)).scalar()
+    _totais[chave] = (total, agora)
+    return total
+
+
+def invalidar_totais():
+    _totais.clear()
@@ -0,0 +1,64 @@
+"""
+Sistema de Bioprospecção de Cogumelos Nativos
+Verificação dos planos de consulta (EXPLAIN QUERY PLAN) das rotas mais usadas
+"""
+
+import re
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+# "SCAN coleta" sem índice é uma leitura completa da tabela. "SCAN ... USING
+# INDEX" percorre o índice na ordem pedida (e para no LIMIT); tabelas
+# virtuais (FTS5) e subconsultas materializadas têm plano próprio.
+_VARREDURA = re.compile(r'^SCAN (\w+)$')
+
+
+@contextmanager
+def capturar_consultas(engine):
+    """Registra (sql, parâmetros) de todo SELECT executado no bloco"""
+    consultas = []
+
+    def registrar(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            consultas.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', registrar)
+    try:
+        yield consultas
+    finally:
+        event.remove(engine, 'before_cursor_execute', registrar)
+
+
+def explicar(conexao, sql, parametros):
+    """Linhas de detalhe do EXPLAIN QUERY PLAN de uma consulta"""
+    resultado = conexao.exec_driver_sql(f'EXPLAIN QUERY PLAN {sql}', parametros)
+    return [linha[-1] for linha in resultado]
+
+
+def varreduras_completas(plano, tabelas):
+    """Tabelas de `tabelas` lidas por inteiro no plano"""
+    encontradas = []
+    for detalhe in plano:
+        casamento = _VARREDURA.match(detalhe.strip())
+        if casamento and casamento.group(1) in tabelas:
+            encontradas.append(casamento.group(1))
+    return encontradas
+
+
+def verificar(conexao, consultas, tabelas):
+    """
+    Retorna a lista de problemas [(sql, plano, tabelas varridas)] para as
+    consultas capturadas, ignorando repetições do mesmo SQL.
+    """
+    problemas = []
+    vistas = set()
+    for sql, parametros in consultas:
+        if sql in vistas:
+            continue
+        vistas.add(sql)
+        plano = explicar(conexao, sql, parametros)
+        varridas = varreduras_completas(plano, tabelas)
+        if varridas:
+            problemas.append((sql, plano, varridas))
+    return problemas
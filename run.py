@@ -5,6 +5,7 @@ Arquivo de execução simplificado
 """
 
 import os
+import subprocess
 import sys
 from app import app, db
 
@@ -41,6 +42,17 @@ def init_database():
         return False
     return True
 
+def start_worker():
+    """Inicia o processador de tarefas em segundo plano (miniaturas etc.)"""
+    # Com o reloader do modo debug este arquivo roda duas vezes; o
+    # trabalhador pertence apenas ao processo principal
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        return None
+    worker = subprocess.Popen([sys.executable, '-m', 'flask', '--app', 'app', 'processar-tarefas'],
+                              cwd=os.path.dirname(os.path.abspath(__file__)))
+    print(f"✓ Processador de tarefas iniciado (pid {worker.pid})")
+    return worker
+
 def main():
     """Função principal"""
     print("🍄 Sistema para Bioprospecção de Cogumelos Nativos")
@@ -57,6 +69,8 @@ def main():
     if not init_database():
         sys.exit(1)
     
+    worker = start_worker()
+    
     print("\n🚀 Iniciando o sistema...")
     print("📱 Acesse: http://localhost:5000")
     print("🛑 Pressione Ctrl+C para parar")
@@ -68,6 +82,10 @@ def main():
         print("\n👋 Sistema encerrado pelo usuário")
     except Exception as e:
         print(f"\n✗ Erro ao executar o sistema: {e}")
+    finally:
+        if worker is not None:
+            worker.terminate()
+            worker.wait()
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,182 @@
+"""
+Sistema de Bioprospecção de Cogumelos Nativos
+Fila de tarefas persistente (tabela no SQLite) executada em um pool de processos
+"""
+
+import threading
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, select, update
+
+from imagens import gerar_rendicoes
+from metadados_exif import extrair_exif
+
+PENDENTE = 'pendente'
+EXECUTANDO = 'executando'
+CONCLUIDA = 'concluida'
+FALHOU = 'falhou'
+
+ESTADOS = (PENDENTE, EXECUTANDO, CONCLUIDA, FALHOU)
+
+# Tipo -> função executada no processo filho como funcao(pastas, **parametros).
+# Precisa ser uma função de módulo (picklable) e não acessa o banco: o
+# retorno (JSON) é gravado pelo processo principal.
+TIPOS = {
+    'rendicoes': gerar_rendicoes,
+    'exif': extrair_exif,
+}
+
+
+def recuperar_expiradas(conexao, tabela, agora, timeout):
+    """
+    Tarefas "em execução" há mais de `timeout` segundos pertencem a um
+    trabalhador que morreu: voltam para a fila ou falham se esgotaram as
+    tentativas.
+    """
+    expiradas = and_(tabela.c.estado == EXECUTANDO,
+                     tabela.c.data_inicio < agora - timedelta(seconds=timeout))
+    conexao.execute(update(tabela)
+                    .where(expiradas, tabela.c.tentativas < tabela.c.max_tentativas)
+                    .values(estado=PENDENTE, disponivel_em=agora,
+                            erro='Tempo esgotado; trabalhador interrompido'))
+    conexao.execute(update(tabela)
+                    .where(expiradas)
+                    .values(estado=FALHOU, data_fim=agora,
+                            erro='Tempo esgotado; trabalhador interrompido'))
+
+
+def reservar(conexao, tabela, agora):
+    """Marca a próxima tarefa disponível como em execução e a retorna (ou None)"""
+    proxima = (select(tabela.c.id)
+               .where(tabela.c.estado == PENDENTE, tabela.c.disponivel_em <= agora)
+               .order_by(tabela.c.disponivel_em, tabela.c.id)
+               .limit(1)
+               .scalar_subquery())
+    return conexao.execute(
+        update(tabela)
+        .where(tabela.c.id == proxima)
+        .values(estado=EXECUTANDO, data_inicio=agora, tentativas=tabela.c.tentativas + 1)
+        .returning(tabela.c.id, tabela.c.tipo, tabela.c.parametros)
+    ).first()
+
+
+def concluir(conexao, tabela, id, resultado, agora):
+    conexao.execute(update(tabela).where(tabela.c.id == id)
+                    .values(estado=CONCLUIDA, resultado=resultado, erro=None, data_fim=agora))
+
+
+def falhar(conexao, tabela, id, erro, agora, atraso, definitiva=False):
+    """
+    Registra a falha. Enquanto houver tentativas, a tarefa volta para a fila
+    após `atraso` segundos, dobrando a cada nova falha.
+    """
+    tentativas, maximo = conexao.execute(
+        select(tabela.c.tentativas, tabela.c.max_tentativas).where(tabela.c.id == id)).one()
+    if definitiva or tentativas >= maximo:
+        valores = {'estado': FALHOU, 'data_fim': agora}
+    else:
+        espera = timedelta(seconds=atraso * 2 ** (tentativas - 1))
+        valores = {'estado': PENDENTE, 'disponivel_em': agora + espera}
+    conexao.execute(update(tabela).where(tabela.c.id == id).values(erro=erro, **valores))
+
+
+def _descrever_erro(erro):
+    return ''.join(traceback.format_exception(erro))[-4000:]
+
+
+class Trabalhador:
+    """
+    Consome a fila: reserva tarefas no banco, executa-as em um pool de
+    processos e grava o resultado. Vários trabalhadores podem dividir a mesma
+    fila; a reserva é um único UPDATE.
+    """
+
+    def __init__(self, engine, tabela, pastas, processos=1, intervalo=1.0,
+                 atraso=30, timeout=600, gravacoes=None):
+        self.engine = engine
+        self.tabela = tabela
+        self.pastas = pastas
+        # Tipo -> funcao(conexao, resultado, **parametros): grava o resultado
+        # no banco, no processo principal e na transação que conclui a tarefa
+        self.gravacoes = gravacoes or {}
+        self.processos = processos
+        self.intervalo = intervalo
+        self.atraso = atraso
+        self.timeout = timeout
+        self._parar = threading.Event()
+
+    def parar(self):
+        """Para de reservar tarefas; as que estão em execução são concluídas"""
+        self._parar.set()
+
+    def _reservar(self):
+        with self.engine.begin() as conexao:
+            return reservar(conexao, self.tabela, datetime.utcnow())
+
+    def _registrar(self, id, resultado=None, erro=None, definitiva=False, tarefa=None):
+        with self.engine.begin() as conexao:
+            if erro is None:
+                gravar = self.gravacoes.get(tarefa.tipo) if tarefa else None
+                if gravar:
+                    gravar(conexao, resultado, **(tarefa.parametros or {}))
+                concluir(conexao, self.tabela, id, resultado, datetime.utcnow())
+            else:
+                falhar(conexao, self.tabela, id, _descrever_erro(erro), datetime.utcnow(),
+                       self.atraso, definitiva)
+
+    def executar(self, ate_esvaziar=False):
+        """
+        Laço principal. Com `ate_esvaziar`, retorna quando não houver mais
+        tarefas disponíveis; caso contrário, roda até `parar()`.
+        Retorna o número de tarefas processadas.
+        """
+        pool = ProcessPoolExecutor(max_workers=self.processos)
+        em_execucao = {}
+        processadas = 0
+        try:
+            while em_execucao or not self._parar.is_set():
+                if not self._parar.is_set():
+                    with self.engine.begin() as conexao:
+                        recuperar_expiradas(conexao, self.tabela, datetime.utcnow(), self.timeout)
+                    while len(em_execucao) < self.processos:
+                        tarefa = self._reservar()
+                        if tarefa is None:
+                            break
+                        funcao = TIPOS.get(tarefa.tipo)
+                        if funcao is None:
+                            self._registrar(tarefa.id, erro=ValueError(f'Tipo de tarefa desconhecido: {tarefa.tipo}'),
+                                            definitiva=True)
+                            processadas += 1
+                            continue
+                        futuro = pool.submit(funcao, self.pastas, **(tarefa.parametros or {}))
+                        em_execucao[futuro] = tarefa
+
+                if not em_execucao:
+                    if ate_esvaziar:
+                        break
+                    self._parar.wait(self.intervalo)
+                    continue
+
+                prontas, _ = wait(em_execucao, timeout=self.intervalo, return_when=FIRST_COMPLETED)
+                pool_quebrado = False
+                for futuro in prontas:
+                    tarefa = em_execucao.pop(futuro)
+                    id = tarefa.id
+                    try:
+                        self._registrar(id, resultado=futuro.result(), tarefa=tarefa)
+                    except BrokenProcessPool as erro:
+                        # Um processo filho morreu (ex.: falta de memória)
+                        pool_quebrado = True
+                        self._registrar(id, erro=erro)
+                    except Exception as erro:
+                        self._registrar(id, erro=erro)
+                    processadas += 1
+                if pool_quebrado and not em_execucao:
+                    pool.shutdown(wait=False)
+                    pool = ProcessPoolExecutor(max_workers=self.processos)
+        finally:
+            pool.shutdown(wait=True)
+        return processadas
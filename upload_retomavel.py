@@ -0,0 +1,93 @@
+"""
+Sistema de Bioprospecção de Cogumelos Nativos
+Uploads retomáveis em partes (/api/uploads). O arquivo da sessão é criado
+em uploads/.tmp já com o tamanho final e cada parte é gravada na sua
+posição, em qualquer ordem e em paralelo. A conclusão confere o SHA-256 do
+arquivo inteiro e o move para o armazenamento por conteúdo.
+"""
+
+import hashlib
+import os
+import uuid
+
+from armazenamento import PASTA_TEMPORARIA, TAMANHO_BLOCO, armazenar_temporario
+
+# Menor parte aceita (só a última parte pode ser menor)
+TAMANHO_PARTE_MINIMO = 256 * 1024
+
+
+def novo_identificador():
+    return uuid.uuid4().hex
+
+
+def total_partes(tamanho, tamanho_parte):
+    return -(-tamanho // tamanho_parte)
+
+
+def tamanho_da_parte(tamanho, tamanho_parte, indice):
+    return min(tamanho_parte, tamanho - indice * tamanho_parte)
+
+
+def caminho_parcial(pasta_uploads, identificador):
+    return os.path.join(pasta_uploads, PASTA_TEMPORARIA, f'{identificador}.parcial')
+
+
+def criar_parcial(pasta_uploads, identificador, tamanho):
+    """Cria o arquivo da sessão com o tamanho final (esparso onde o sistema permite)"""
+    caminho = caminho_parcial(pasta_uploads, identificador)
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    with open(caminho, 'wb') as arquivo:
+        arquivo.truncate(tamanho)
+
+
+def gravar_parte(pasta_uploads, identificador, deslocamento, tamanho, stream, sha256_esperado):
+    """
+    Copia `tamanho` bytes do stream para o arquivo da sessão a partir de
+    `deslocamento`, calculando o SHA-256. ValueError se o tamanho ou o
+    SHA-256 não conferirem; FileNotFoundError se a sessão expirou.
+    """
+    hash_parte = hashlib.sha256()
+    restante = tamanho
+    with open(caminho_parcial(pasta_uploads, identificador), 'r+b') as arquivo:
+        arquivo.seek(deslocamento)
+        while restante:
+            bloco = stream.read(min(TAMANHO_BLOCO, restante))
+            if not bloco:
+                break
+            hash_parte.update(bloco)
+            arquivo.write(bloco)
+            restante -= len(bloco)
+        excedente = stream.read(1)
+    if restante or excedente:
+        raise ValueError(f'A parte deve ter {tamanho} bytes.')
+    if hash_parte.hexdigest() != sha256_esperado.lower():
+        raise ValueError('SHA-256 da parte não confere; envie a parte novamente.')
+    return hash_parte.hexdigest()
+
+
+def concluir_parcial(session, pasta_uploads, identificador, nome_original, sha256_esperado=None):
+    """
+    Confere o SHA-256 do arquivo completo (se informado na criação da sessão)
+    e o move para o armazenamento por conteúdo, registrando-o em
+    arquivo_upload na transação de `session`. Retorna o ArquivoSalvo.
+    """
+    caminho = caminho_parcial(pasta_uploads, identificador)
+    hash_arquivo = hashlib.sha256()
+    tamanho = 0
+    with open(caminho, 'rb') as arquivo:
+        while True:
+            bloco = arquivo.read(TAMANHO_BLOCO)
+            if not bloco:
+                break
+            hash_arquivo.update(bloco)
+            tamanho += len(bloco)
+    sha256 = hash_arquivo.hexdigest()
+    if sha256_esperado and sha256 != sha256_esperado.lower():
+        raise ValueError('SHA-256 do arquivo não confere com o informado na criação da sessão.')
+    return armazenar_temporario(session, caminho, sha256, tamanho, nome_original, pasta_uploads)
+
+
+def descartar_parcial(pasta_uploads, identificador):
+    caminho = caminho_parcial(pasta_uploads, identificador)
+    if os.path.exists(caminho):
+        os.remove(caminho)